@@ -0,0 +1,50 @@
+from scr.BigqueryToJson import BigQueryExporter
+from scr.ExportPlanner import ExportSpec, plan_exports, suggest_concurrency
+from datetime import datetime, timedelta
+
+
+# Daily exports of the uploader scripts (table and day column of their WHERE)
+specs = [
+    ExportSpec('amplitude', 'organic-reef-315010.indrive.amplitude_event_wo_dma', 'event_time',
+               extra_condition="(lower(json_extract_scalar(event_properties,'$.user_agent')) like '%indrive%' or json_extract_scalar(event_properties, '$.currentApp' ) ='miniApp_inDrive')"),
+    ExportSpec('backend_orders', 'organic-reef-315010.indrive.indrive__backend_orders', 'created_at'),
+    ExportSpec('delivered_orders', 'organic-reef-315010.indrive.indrive__backend_events_order_delivered', 'order_creation_time'),
+    ExportSpec('cancelled_orders', 'organic-reef-315010.indrive.indrive__backend_events_cancelled_orders', 'order_creation_time'),
+    ExportSpec('batches', 'organic-reef-315010.snp.batches', 'created_at'),
+    ExportSpec('operations', 'organic-reef-315010.snp.operations', 'created_at'),
+    ExportSpec('financial_raw_daily', 'organic-reef-315010.mart.mart_orders', 'created_at'),
+    ExportSpec('financial_raw_refunds', 'organic-reef-315010.staging.stg_lavka__refunds', 'created_at'),
+]
+
+start_date = '20251201'  # YYYYMMDD
+end_date = '20251207'    # YYYYMMDD
+bytes_budget = 200 * 1024 ** 3  # bytes the scheduler may have in flight at once
+
+
+if __name__ == '__main__':
+
+    dates = []
+    current_date = datetime.strptime(start_date, '%Y%m%d')
+    while current_date <= datetime.strptime(end_date, '%Y%m%d'):
+        dates.append(current_date.strftime('%Y%m%d'))
+        current_date += timedelta(days=1)
+
+    with BigQueryExporter() as exporter:
+        plans = plan_exports(exporter, specs, dates)
+
+    print(f"{'export':<24}{'date':<12}{'processed, MB':>16}{'partition, MB':>16}  status")
+    print("-" * 80)
+    for plan in plans:
+        processed = f"{plan.bytes_processed / 1024 ** 2:,.1f}" if plan.bytes_processed is not None else '?'
+        partition = f"{plan.partition_bytes / 1024 ** 2:,.1f}" if plan.partition_bytes is not None else '?'
+        status = {True: 'ok', False: 'NOT PRUNED', None: 'unknown'}[plan.prunes]
+        print(f"{plan.name:<24}{plan.dt:<12}{processed:>16}{partition:>16}  {status} {plan.note}")
+
+    flagged = {plan.name: plan for plan in plans if plan.prunes is False}
+    for name, plan in flagged.items():
+        suggested = f"{plan.suggested_bytes / 1024 ** 2:,.1f} MB" if plan.suggested_bytes is not None else '?'
+        print(f"\n{name}: use a range predicate ({suggested} per day):\n    {plan.suggested_condition}")
+
+    print("\nSuggested concurrent days per export:")
+    for name, concurrency in suggest_concurrency(plans, bytes_budget).items():
+        print(f"    {name}: {concurrency}")
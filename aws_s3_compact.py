@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from scr.S3Compaction import compact_prefixes
+
+
+
+# Entity and date range whose partition prefixes should be compacted
+s3_entity_path = 'partner_metrics/backend/warehouse_products_hourly'
+start_date = '20251101'  # YYYYMMDD
+end_date = '20251130'    # YYYYMMDD
+
+target_bytes = 256 * 1024 * 1024
+retire_grace = timedelta(0)  # >0 keeps retired parts this long (readers skip them by the manifest); run again afterwards to delete them
+
+prefixes = []
+current_date = datetime.strptime(start_date, '%Y%m%d')
+while current_date <= datetime.strptime(end_date, '%Y%m%d'):
+    prefixes.append(f'{s3_entity_path}/{current_date:%Y-%m-%d}/')
+    current_date += timedelta(days=1)
+
+print(f"Compacting {len(prefixes)} prefix(es) of {s3_entity_path}")
+print("-" * 50)
+
+for result in compact_prefixes(prefixes, target_bytes=target_bytes, retire_grace=retire_grace, max_workers=8):
+    if result.conflict:
+        print(f'--- {result.prefix}: parts changed during compaction, kept as they were')
+    elif result.skipped:
+        print(f'--- {result.prefix}: nothing to compact' + (f', deleted {len(result.deleted_parts)} retired' if result.deleted_parts else ''))
+    else:
+        print(f'--- {result.prefix}: {len(result.source_parts)} -> {len(result.compacted_parts)} part(s)')
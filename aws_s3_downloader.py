@@ -1,5 +1,6 @@
 
 from scr.AWSS3Loader import S3LogsToBigQueryLoader
+from scr.S3ListingIndex import use_listing_index
 from scr.BigqueryToJson import BigQueryImporter
 from datetime import datetime
 
@@ -21,6 +22,7 @@ if __name__ == '__main__':
         
         bq_table = f'{bq_schema_path}.{table_name}'  # BigQuery table to load into
 
+        use_listing_index()  # list the prefix once per run; own uploads and deletes are kept in the index
         loader = S3LogsToBigQueryLoader()
         partition_dt = datetime.strptime(start_date, '%Y-%m-%d')
         loader.load_to_bigquery(s3_prefix, bq_table, partition_dt=partition_dt)
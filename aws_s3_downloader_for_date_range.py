@@ -1,4 +1,5 @@
 from scr.AWSS3Loader import S3LogsToBigQueryLoader
+from scr.S3ListingIndex import use_listing_index
 from scr.BigqueryToJson import BigQueryImporter
 from datetime import datetime, timedelta
 
@@ -55,6 +56,7 @@ def process_single_date(date_str, s3_entity_path, bq_schema_path, table_name):
 
 
 if __name__ == '__main__':
+    use_listing_index()  # list each prefix once per run; own uploads and deletes are kept in the index
     with BigQueryImporter() as s3_importer:
         # Define date range - modify these dates as needed
         start_date = '2026-01-01'  # Start date in YYYY-MM-DD format
@@ -1,22 +1,14 @@
-from boto3.session import Session
 from botocore.exceptions import ClientError
 from config.cred.enviroment import Environment
+from scr.AWSS3Loader import s3_bucket
 
 
 
 env = Environment()
 bucket_name = env.aws_s3_bucket_name
-region_name = env.aws_s3_region_name
-ACCESS_KEY = env.aws_s3_access_key
-SECRET_KEY = env.aws_s3_secret_key
 
 
-session = Session(aws_access_key_id=ACCESS_KEY,
-                aws_secret_access_key=SECRET_KEY,
-                region_name = region_name)
-
-s3 = session.resource('s3')
-your_bucket = s3.Bucket(bucket_name)
+your_bucket = s3_bucket(bucket_name)  # shared pooled client, see scr/AWSS3Loader.get_s3_client
 
 def download_s3_file(bucket_obj, key: str, local_filename: str):
     """Downloads a file from S3."""
@@ -1,20 +1,17 @@
-from boto3.session import Session
 from config.cred.enviroment import Environment
+from scr.AWSS3Loader import s3_bucket
+from scr.S3ListingIndex import use_listing_index
 
 
 
 env = Environment()
 bucket_name = env.aws_s3_bucket_name
-region_name = env.aws_s3_region_name
-ACCESS_KEY = env.aws_s3_access_key
-SECRET_KEY = env.aws_s3_secret_key
 
 
-session = Session(aws_access_key_id=ACCESS_KEY,
-                aws_secret_access_key=SECRET_KEY,
-                region_name = region_name)
-s3 = session.resource('s3')
-your_bucket = s3.Bucket(bucket_name)
+your_bucket = s3_bucket(bucket_name)  # shared pooled client, see scr/AWSS3Loader.get_s3_client
+
+# Keep listings in an in-memory index for this run
+listing_index = use_listing_index()
 
 # Define the specific path you want to list objects from
 # target_path = "partner_metrics/backend_events/delivered_orders/2025-11-1"
@@ -24,5 +21,5 @@ print(f"Listing objects in path: {target_path}")
 print("-" * 50)
 
 # List objects with the specified prefix (path)
-for s3_file in your_bucket.objects.filter(Prefix=target_path):
+for s3_file in listing_index.list_objects(your_bucket, target_path):
     print(f'--- {s3_file.key}')
@@ -0,0 +1,45 @@
+from config.cred.enviroment import Environment
+from scr.AWSS3Loader import list_parts_in_key_range, s3_bucket
+from scr.SidecarIndex import SidecarIndexNotFound, lookup, fetch_rows, fetch_rows_in_range
+
+
+
+env = Environment()
+bucket_name = env.aws_s3_bucket_name
+
+
+your_bucket = s3_bucket(bucket_name)  # shared pooled client, see scr/AWSS3Loader.get_s3_client
+
+# Partition to search and the key value to find (needs a sidecar index, see aws_uploader__backend_orders.py)
+target_path = "partner_metrics/backend/orders/2025-11-17/"
+key_column = "order_id"
+key_value = "123456"
+
+# Or a range of the split key: only parts whose key-min/key-max metadata overlaps it are downloaded
+range_column = None  # e.g. "created_at"
+range_min = "2025-11-17T05:00:00+00:00"
+range_max = "2025-11-17T05:59:59+00:00"
+
+if range_column:
+    print(f"Looking up {range_min} <= {range_column} <= {range_max} in path: {target_path}")
+    print("-" * 50)
+    for s3_key in list_parts_in_key_range(your_bucket, target_path, range_column, range_min, range_max):
+        rows = fetch_rows_in_range(your_bucket, s3_key, range_column, range_min, range_max)
+        print(f'--- {s3_key} ({rows.num_rows} rows)')
+        print(rows.to_pandas().to_string())
+else:
+    print(f"Looking up {key_column}={key_value} in path: {target_path}")
+    print("-" * 50)
+
+    try:
+        matches = lookup(your_bucket, target_path, key_column, key_value)
+    except SidecarIndexNotFound as e:
+        print(e)
+        matches = []
+    if not matches:
+        print("Not found in this partition")
+
+    for s3_key, row_group in matches:
+        print(f'--- {s3_key} (row group {row_group})')
+        rows = fetch_rows(your_bucket, s3_key, row_group, key_column, key_value)
+        print(rows.to_pandas().to_string())
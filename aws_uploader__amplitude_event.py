@@ -1,8 +1,17 @@
-from scr.AWSS3Loader import S3Uploader
 from scr.BigqueryToJson import BigQueryExporter
+from scr.ExportPipeline import run_export_pipeline
+from scr.ExportSinks import S3Sink
 from datetime import datetime, timezone
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
+from scr.BigqueryExportData import BigQueryExportDataEngine
+from scr.QueryTemplates import bound_parameters
+from scr.S3StreamUpload import stream_export_to_s3
+
+# 'python': BigQuery -> Arrow -> Parquet in this process
+# 'export_data': BigQuery writes Parquet itself (EXPORT DATA via GCS), objects are copied to S3
+# 'stream': one .parquet.gz object, uploaded (multipart) while rows are still read, no local file
+export_engine = 'python'
  
 pa_schema = None
 pa_schema = pa.schema([
@@ -65,45 +74,58 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.indrive.amplitude_event_wo_dma'
         s3_entity_path = 'partner_metrics/amplitude'
-        where_condition = f"(lower(json_extract_scalar(event_properties,'$.user_agent')) like '%indrive%' or json_extract_scalar(event_properties, '$.currentApp' ) ='miniApp_inDrive') AND timestamp_trunc(event_time, day) = '{exporter.dt}'"
+        where_condition = "(lower(json_extract_scalar(event_properties,'$.user_agent')) like '%indrive%' or json_extract_scalar(event_properties, '$.currentApp' ) ='miniApp_inDrive') AND timestamp_trunc(event_time, day) = TIMESTAMP(@dt)"
         
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition)
+        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition, params={'dt': exporter.dt})
         print(f"Generated query:\n{query}")
         
-        if not pa_schema:  
-            pa_schema = get_pyarrow_schema_from_bq(table_id=bq_table_addres)  
-            
-        print('===== Used schema:', pa_schema, sep='\n')
-
-        parquet_gz_paths = exporter.export_to_parquet_gzip(
-            query,
-            schema=pa_schema,
-            bq_table_addres=bq_table_addres,
-            max_parquet_size_bytes=5 * 1024 * 1024,  # 5 MB limit before gzip
-        )
-        ##############################
+        if export_engine == 'export_data':
+            upl_to_aws = BigQueryExportDataEngine()
+            upl_to_aws.temp_dir = exporter.temp_dir
+            rez = upl_to_aws.run(
+                query,
+                entity_path=s3_entity_path,
+                dt_partition=datetime.strptime(str(exporter.raw_dt), '%Y%m%d'),
+                dt_now=datetime.now(timezone.utc),
+                query_parameters=bound_parameters(query),
+                schema=pa_schema,  # same published types as the python engine
+            )
+            print('All uploads completed successfully!' if rez else 'Some uploads failed!')
 
-        if parquet_gz_paths:
-            if isinstance(parquet_gz_paths, str):
-                parquet_gz_paths = [parquet_gz_paths]
-
-            dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
-            dt_now_utc = datetime.now(timezone.utc)
+        else:
+            if not pa_schema:  
+                pa_schema = get_pyarrow_schema_from_bq(table_id=bq_table_addres)  
+            
+            print('===== Used schema:', pa_schema, sep='\n')
 
-            overall_success = True
-            for idx, gz_path in enumerate(parquet_gz_paths):
-                clear_path = idx == 0  # clear path only before first upload
-                upl_to_aws = S3Uploader(
+            if export_engine == 'stream':
+                s3_key = stream_export_to_s3(
+                    exporter,
+                    query,
                     entity_path=s3_entity_path,
-                    dt_now=dt_now_utc,
-                    dt_partition=dt_partition_utc,
-                    gzip_path=gz_path,
-                    clear_path_before_upload=clear_path,
+                    dt_partition=datetime.strptime(str(exporter.raw_dt), '%Y%m%d'),
+                    dt_now=datetime.now(timezone.utc),
+                    schema=pa_schema,
                 )
+                print(f'Successfully uploaded {s3_key}!')
 
-                rez = upl_to_aws.run()
-                print(f'File {idx + 1}/{len(parquet_gz_paths)} upload {"succeeded" if rez else "failed"}')
-                overall_success = overall_success and rez
+            else:
+                dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
+                dt_now_utc = datetime.now(timezone.utc)
+                max_parquet_size_bytes = 5 * 1024 * 1024  # 5 MB limit before gzip
+                plan = exporter.plan_export(query, max_parquet_size_bytes=max_parquet_size_bytes)
 
-            print('All uploads completed successfully!' if overall_success else 'Some uploads failed!')
+                # Part N uploads while part N+1 is gzipped and part N+2 is still read from BigQuery
+                rez = run_export_pipeline(
+                    exporter,
+                    query,
+                    sinks=[S3Sink(entity_path=s3_entity_path, part_checksums=exporter.part_checksums, sync_path=True)],
+                    dt_partition=dt_partition_utc,
+                    dt_now=dt_now_utc,
+                    bq_table_addres=bq_table_addres,
+                    schema=pa_schema,
+                    max_parquet_size_bytes=max_parquet_size_bytes,
+                    upload_workers=plan.max_workers,
+                )
+                print('All uploads completed successfully!' if rez else 'Some uploads failed!')
@@ -43,10 +43,10 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.indrive.indrive__backend_events_order_delivered'
         s3_entity_path = 'partner_metrics/backend_events/delivered_orders'
-        where_condition = f"timestamp_trunc(order_creation_time, day) = '{exporter.dt}'"
+        where_condition = "timestamp_trunc(order_creation_time, day) = TIMESTAMP(@dt)"
 
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition)
+        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition, params={'dt': exporter.dt})
         print(f"Generated query:\n{query}")
         
         if not pa_schema:  
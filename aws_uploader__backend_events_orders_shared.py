@@ -0,0 +1,54 @@
+from scr.AWSS3Loader import S3Uploader
+from scr.BigqueryToJson import BigQueryExporter
+from scr.MultiEntityExport import EntityOutput, export_entities
+from datetime import datetime, timezone
+from aws_uploader__backend_events_order_delivered import pa_schema as delivered_schema
+from aws_uploader__backend_events_cancelled_orders import pa_schema as cancelled_schema
+
+
+# Delivered and cancelled orders of one day in a single BigQuery job (replaces running both scripts)
+if __name__ == '__main__':
+
+    with BigQueryExporter() as exporter:
+        
+        exporter.raw_dt = '20251117'
+        exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')
+        where_condition = "timestamp_trunc(order_creation_time, day) = TIMESTAMP(@dt)"
+
+        outputs = [
+            EntityOutput(
+                name='delivered',
+                query=exporter.build_query(bq_table_addres='organic-reef-315010.indrive.indrive__backend_events_order_delivered',
+                                           where_condition=where_condition,
+                                           params={'dt': exporter.dt}),
+                s3_entity_path='partner_metrics/backend_events/delivered_orders',
+                schema=delivered_schema,
+            ),
+            EntityOutput(
+                name='cancelled',
+                query=exporter.build_query(bq_table_addres='organic-reef-315010.indrive.indrive__backend_events_cancelled_orders',
+                                           where_condition=where_condition,
+                                           params={'dt': exporter.dt}),
+                s3_entity_path='partner_metrics/backend_events/cancelled_orders',
+                schema=cancelled_schema,
+            ),
+        ]
+
+        parquet_gz_paths = export_entities(exporter, outputs)
+        ##############################
+
+        dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
+        dt_now_utc = datetime.now(timezone.utc)
+        for output in outputs:
+            parquet_gz_path = parquet_gz_paths[output.name]
+            if not parquet_gz_path:
+                print(f'{output.name}: No data exported')
+                continue
+            upl_to_aws = S3Uploader(entity_path=output.s3_entity_path, 
+                                    dt_now=dt_now_utc, 
+                                    dt_partition=dt_partition_utc,
+                                    gzip_path=parquet_gz_path)
+            
+            rez = upl_to_aws.run()
+            print(f'{output.name}: Successfully uploaded!' if rez else f'{output.name}: Upload failed!')
+            # The files will be automatically cleaned up when the context manager exits
@@ -28,10 +28,10 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.snp.operations'
         s3_entity_path = 'partner_metrics/backend/operations'
-        where_condition = f"timestamp_trunc(created_at, day) = '{exporter.dt}'"
+        where_condition = "timestamp_trunc(created_at, day) = TIMESTAMP(@dt)"
 
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition)
+        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition, params={'dt': exporter.dt})
         print(f"Generated query:\n{query}")
         
         if not pa_schema:  
@@ -1,5 +1,5 @@
-from scr.AWSS3Loader import S3Uploader
 from scr.BigqueryToJson import BigQueryExporter
+from scr.ExportSinks import S3Sink, LocalDirectorySink, tee_export
 from datetime import datetime, timezone
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
@@ -84,28 +84,39 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.indrive.indrive__backend_orders'
         s3_entity_path = 'partner_metrics/backend/orders'
-        where_condition = f"timestamp_trunc(created_at, day) = '{exporter.dt}'"
+        archive_dir = None  # e.g. 'archive/' to also keep a local copy of every export
+        index_keys = ['order_id']  # sidecar index for "which file has order X" lookups (aws_s3_lookup_key.py)
+        where_condition = "timestamp_trunc(created_at, day) = TIMESTAMP(@dt)"
 
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition)
+        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition, params={'dt': exporter.dt})
         print(f"Generated query:\n{query}")
         
         if not pa_schema:  
             pa_schema = get_pyarrow_schema_from_bq(table_id=bq_table_addres)  
             print('===== Generate schema:', pa_schema, sep='\n')
 
-        parquet_gz_path = exporter.export_to_parquet_gzip(query, schema=pa_schema, bq_table_addres=bq_table_addres)
+        parquet_gz_path = exporter.export_to_parquet_gzip(
+            query,
+            schema=pa_schema,
+            bq_table_addres=bq_table_addres,
+            max_parquet_size_bytes=64 * 1024 * 1024,
+            split_key='created_at',  # parts cover disjoint created_at ranges, min/max go to object metadata
+        )
         # parquet_gz_path = 'temp/bigquery_export_vbdgm_f5/export_organic-reef-315010.indrive_dev.indrive__backend_events_order_delivered_20251014_161731.parquet.gz'
         ##############################
 
         if parquet_gz_path:
             dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
             dt_now_utc = datetime.now(timezone.utc)
-            upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
-                                    dt_now=dt_now_utc, 
-                                    dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
-            
-            rez = upl_to_aws.run()
-            print('Successfully uploaded!' if rez else 'Upload failed!')
+            # The sink replaces the partition's sidecar index once every part is uploaded
+            s3_sink = S3Sink(entity_path=s3_entity_path, part_metadata=exporter.part_metadata, part_checksums=exporter.part_checksums,
+                             index_keys=index_keys)
+            sinks = [s3_sink]
+            if archive_dir:
+                sinks.append(LocalDirectorySink(root_dir=archive_dir, entity_path=s3_entity_path))
+
+            # One export, one compression; every sink gets the same file concurrently
+            rez = tee_export(parquet_gz_path, sinks, dt_partition=dt_partition_utc, dt_now=dt_now_utc)
+            print('Successfully uploaded!' if all(rez.values()) else f'Upload failed! {rez}')
             # The file will be automatically cleaned up when the context manager exits
@@ -1,8 +1,9 @@
-from scr.AWSS3Loader import S3Uploader
 from scr.BigqueryToJson import BigQueryExporter
+from scr.ExportSinks import S3Sink, tee_export
 from datetime import datetime, timezone
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
+from scr.WatermarkStore import shared_watermark_store
  
 pa_schema = None
 pa_schema = pa.schema([
@@ -41,9 +42,34 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.indrive_dev.indrive_backend__warehouse_products__hourly'
         s3_entity_path = 'partner_metrics/backend/warehouse_products_hourly'
+        partition_by_hour = False  # True: entity/YYYY-MM-DD/hour=HH/... by catalog_updated_at (Hive layout)
         
+        # True: export only rows newer than the last successful run (delta parts, shared watermark);
+        # False: export the whole table every run and replace the partition
+        use_watermark = True
+        # Must grow as rows land and be non-NULL: a row written later with an older value, or with
+        # NULL, is never exported (query_max fails the run on NULLs instead of skipping them)
+        watermark_column = 'catalog_updated_at'
+
+        where_condition = 'TRUE'
+        params = None
+        watermarks = None
+        last_watermark = new_watermark = None
+        if use_watermark:
+            # Shared by every host running this job, kept in our state bucket (not the partner bucket)
+            watermarks = shared_watermark_store()
+            # The upper bound is fixed before the export, so rows arriving meanwhile are picked up next hour
+            last_watermark = watermarks.get(s3_entity_path)
+            new_watermark = exporter.query_max(bq_table_addres, watermark_column, require_not_null=True)
+            where_condition = f"{watermark_column} <= TIMESTAMP(@watermark_to)"
+            params = {'watermark_to': new_watermark}
+            if last_watermark is not None:
+                where_condition += f" AND {watermark_column} > TIMESTAMP(@watermark_from)"
+                params['watermark_from'] = last_watermark
+            print(f"Watermark: {last_watermark} -> {new_watermark}")
+
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres)
+        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition, params=params)
         print(f"Generated query:\n{query}")
         
         if not pa_schema:  
@@ -51,19 +77,31 @@ if __name__ == '__main__':
             
         print('===== Used schema:', pa_schema, sep='\n')
 
-        parquet_gz_path = exporter.export_to_parquet_gzip(query, schema=pa_schema, bq_table_addres=bq_table_addres)
+        if use_watermark and (new_watermark is None or new_watermark == last_watermark):
+            print('No new rows since the last run')
+            parquet_gz_path = None
+        elif partition_by_hour:
+            parquet_gz_path = exporter.export_to_partitioned_parquet_gzip(
+                query,
+                partition_by=['hour'],
+                hour_from='catalog_updated_at',
+                schema=pa_schema,
+                bq_table_addres=bq_table_addres,
+            )
+        else:
+            parquet_gz_path = exporter.export_to_parquet_gzip(query, schema=pa_schema, bq_table_addres=bq_table_addres)
         # parquet_gz_path = 'temp/bigquery_export_vbdgm_f5/export_organic-reef-315010.indrive_dev.indrive__backend_events_order_delivered_20251014_161731.parquet.gz'
         ##############################
 
         if parquet_gz_path:
             dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
             dt_now_utc = datetime.now(timezone.utc)
-            upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
-                                    dt_now=dt_now_utc, 
-                                    dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path,
-                                    clear_path_before_upload=False)
-            
-            rez = upl_to_aws.run()
-            print('Successfully uploaded!' if rez else 'Upload failed!')
+            s3_sink = S3Sink(entity_path=s3_entity_path,
+                             clear_path_before_upload=not use_watermark,  # delta parts accumulate
+                             part_sub_paths=exporter.part_sub_paths)
+
+            rez = tee_export(parquet_gz_path, [s3_sink], dt_partition=dt_partition_utc, dt_now=dt_now_utc)
+            if all(rez.values()) and watermarks is not None:
+                watermarks.set(s3_entity_path, new_watermark)
+            print('Successfully uploaded!' if all(rez.values()) else 'Upload failed!')
             # The file will be automatically cleaned up when the context manager exits
@@ -1,9 +1,12 @@
-from scr.AWSS3Loader import S3Uploader
 from scr.BigqueryToJson import BigQueryExporter
 from datetime import datetime, timezone
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
+from scr.SnapshotDiff import publish_snapshot
  
+# Reruns that produce byte-identical files reuse the object already in S3 ('upload' always uploads)
+on_identical = 'rename'
+
 pa_schema = None
 pa_schema = pa.schema([
     pa.field("address", pa.string()),
@@ -44,6 +47,9 @@ if __name__ == '__main__':
         
         bq_table_addres = 'organic-reef-315010.indrive.indrive__catalogs_warehouses'
         s3_entity_path = 'partner_metrics/catalogs/warehouses'
+        # Deltas are opt-in and off here: full snapshot every day. Set to 'partner_metrics/catalogs/warehouses_delta' once consumers
+        # read deltas, then only inserted/updated/deleted rows are published between weekly snapshots
+        s3_delta_entity_path = None
         # where_condition = f"timestamp_trunc(order_creation_time, day) = '{exporter.dt}'"
 
         # Build query using schema
@@ -55,18 +61,20 @@ if __name__ == '__main__':
             
         print('===== Used schema:', pa_schema, sep='\n')
 
-        parquet_gz_path = exporter.export_to_parquet_gzip(query, schema=pa_schema, bq_table_addres=bq_table_addres)
-        # parquet_gz_path = 'temp/bigquery_export_vbdgm_f5/export_organic-reef-315010.indrive_dev.indrive__backend_events_order_delivered_20251014_161731.parquet.gz'
-        ##############################
+        table = exporter.to_arrow(query, schema=pa_schema)
+        dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
+        dt_now_utc = datetime.now(timezone.utc)
 
-        if parquet_gz_path:
-            dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
-            dt_now_utc = datetime.now(timezone.utc)
-            upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
-                                    dt_now=dt_now_utc, 
-                                    dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
-            
-            rez = upl_to_aws.run()
-            print('Successfully uploaded!' if rez else 'Upload failed!')
-            # The file will be automatically cleaned up when the context manager exits
+        rez = publish_snapshot(
+            exporter,
+            table,
+            bq_table_addres=bq_table_addres,
+            entity_path=s3_entity_path,
+            dt_partition=dt_partition_utc,
+            dt_now=dt_now_utc,
+            key_column='id',
+            delta_entity_path=s3_delta_entity_path,
+            on_identical=on_identical,
+        )
+        print('Successfully uploaded!' if rez else 'Upload failed!')
+        # The file will be automatically cleaned up when the context manager exits
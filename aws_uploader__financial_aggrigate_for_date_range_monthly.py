@@ -1,11 +1,24 @@
-from scr.AWSS3Loader import S3Uploader
+from scr.AWSS3Loader import S3Uploader, partition_source_metadata, s3_bucket, s3_partition_prefix
 from scr.BigqueryToJson import BigQueryExporter
+from scr.FinancialRollup import RollupStore, rollup_month_from_daily
 from datetime import datetime, timezone, timedelta
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
 import time
 import copy
 
+# Skip months whose source partitions did not change since the last upload (False forces a re-export)
+skip_unchanged = True
+
+# Replace a partition's old files only after the new ones are uploaded, so it is never empty
+sync_path = True
+
+# Build the month from daily partial states (state/financial_rollup) instead of scanning it again
+rollup_from_daily = True
+
+# Reruns that produce byte-identical files reuse the object already in S3 ('upload' always uploads)
+on_identical = 'rename'
+
 pa_schema = None
 pa_schema = pa.schema([
     pa.field("platform", pa.string()),
@@ -36,7 +49,7 @@ SELECT
 FROM
   `@bq_table_addres@` AS mart_orders
 
-WHERE TIMESTAMP_TRUNC(mart_orders.created_at, month) = TIMESTAMP('@dt@')
+WHERE TIMESTAMP_TRUNC(mart_orders.created_at, month) = TIMESTAMP(@dt)
   AND mart_orders.status <> 8
 
   group by mart_orders.platform
@@ -49,7 +62,7 @@ SELECT
 """
 
 
-def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
+def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=None):
     """Process data for a single date"""
     global query
     current_query = copy.deepcopy(query)
@@ -57,13 +70,36 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
     with BigQueryExporter() as exporter:
         exporter.raw_dt = raw_dt
         exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')    
+
+        source_state = BigQueryExporter.partition_state(partitions, str(raw_dt)[:6]) if partitions is not None else None
+        if source_state is not None:
+            if source_state['source-rows'] == '0':
+                print(f'Month {raw_dt}: Source partitions are empty, skipped')
+                return True
+            s3_prefix = s3_partition_prefix(s3_entity_path, datetime.strptime(str(exporter.raw_dt), '%Y%m%d'))
+            if partition_source_metadata(s3_bucket(), s3_prefix) == source_state:
+                print(f'Month {raw_dt}: Source partitions unchanged since the last upload, skipped')
+                return True
         
-        # Build query using schema
-        current_query = current_query.replace("@dt@", exporter.dt)
-        current_query = current_query.replace("@bq_table_addres@", bq_table_addres)
-        print(f"Processing date {raw_dt} - Generated query:\n{current_query}")
-        
-        parquet_gz_path = exporter.export_to_parquet_gzip(current_query, schema=pa_schema, bq_table_addres=bq_table_addres)
+        if rollup_from_daily:
+            # Merge stored daily partial states; only missing or changed days hit BigQuery
+            table = rollup_month_from_daily(exporter, bq_table_addres,
+                                            month_dt=datetime.strptime(str(exporter.raw_dt), '%Y%m%d'),
+                                            store=RollupStore(),
+                                            partitions=partitions,
+                                            until=datetime.now(timezone.utc).replace(tzinfo=None))
+            parquet_gz_path = exporter.table_to_parquet_gzip(table.cast(pa_schema), bq_table_addres) if table is not None else None
+        else:
+            # Build query using schema
+            current_query = exporter.render_query(current_query,
+                                                  params={'dt': exporter.dt},
+                                                  identifiers={'bq_table_addres': bq_table_addres})
+            print(f"Processing date {raw_dt} - Generated query:\n{current_query}")
+            
+            parquet_gz_path = exporter.export_to_parquet_gzip(current_query, 
+                                                              schema=pa_schema, 
+                                                              bq_table_addres=bq_table_addres,
+                                                              numeric_mode='float64')  # NUMERIC -> float64, the type pa_schema declares
         ##############################
 
         if parquet_gz_path:
@@ -72,7 +108,11 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
             upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
                                     dt_now=dt_now_utc, 
                                     dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
+                                    gzip_path=parquet_gz_path,
+                                    metadata=source_state,
+                                    sync_path=sync_path,
+                                    checksum_sha256=exporter.part_checksums.get(parquet_gz_path),
+                                    on_identical=on_identical)
             
             rez = upl_to_aws.run()
             print(f'Date {raw_dt}: Successfully uploaded!' if rez else f'Date {raw_dt}: Upload failed!')
@@ -137,13 +177,19 @@ if __name__ == '__main__':
     print(f"Processing months from {start_date} to {end_date}")
     print(f"Total months to process: {len(date_list)}")
     
+    # Partition state of the source table, loaded once for the whole range
+    partitions = None
+    if skip_unchanged or rollup_from_daily:
+        with BigQueryExporter() as exporter:
+            partitions = exporter.get_partitions(bq_table_addres, partition_column='created_at')
+
     # Process each month
     success_count = 0
     unsuccess_date_dt = {}
     for raw_dt in date_list:
         print(f"\n--- Processing date: {raw_dt} ---")
         try:
-            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema)
+            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=partitions)
             
             # time.sleep(2)
             if success:
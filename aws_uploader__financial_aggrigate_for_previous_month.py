@@ -1,11 +1,18 @@
 from scr.AWSS3Loader import S3Uploader
 from scr.BigqueryToJson import BigQueryExporter
+from scr.FinancialRollup import RollupStore, rollup_month_from_daily
 from datetime import datetime, timezone, timedelta
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
 import time
 import copy
 
+# Build the month from daily partial states (state/financial_rollup) instead of scanning it again
+rollup_from_daily = True
+
+# Reruns that produce byte-identical files reuse the object already in S3 ('upload' always uploads)
+on_identical = 'rename'
+
 pa_schema = None
 pa_schema = pa.schema([
     pa.field("platform", pa.string()),
@@ -36,7 +43,7 @@ SELECT
 FROM
   `@bq_table_addres@` AS mart_orders
 
-WHERE TIMESTAMP_TRUNC(mart_orders.created_at, month) = TIMESTAMP('@dt@')
+WHERE TIMESTAMP_TRUNC(mart_orders.created_at, month) = TIMESTAMP(@dt)
   AND mart_orders.status <> 8
 
   group by mart_orders.platform
@@ -49,7 +56,7 @@ SELECT
 """
 
 
-def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
+def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=None):
     """Process data for a single date"""
     global query
     current_query = copy.deepcopy(query)
@@ -58,12 +65,25 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
         exporter.raw_dt = raw_dt
         exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')    
         
-        # Build query using schema
-        current_query = current_query.replace("@dt@", exporter.dt)
-        current_query = current_query.replace("@bq_table_addres@", bq_table_addres)
-        print(f"Processing date {raw_dt} - Generated query:\n{current_query}")
-        
-        parquet_gz_path = exporter.export_to_parquet_gzip(current_query, schema=pa_schema, bq_table_addres=bq_table_addres)
+        if rollup_from_daily:
+            # Merge stored daily partial states; only missing or changed days hit BigQuery
+            table = rollup_month_from_daily(exporter, bq_table_addres,
+                                            month_dt=datetime.strptime(str(exporter.raw_dt), '%Y%m%d'),
+                                            store=RollupStore(),
+                                            partitions=partitions,
+                                            until=datetime.now(timezone.utc).replace(tzinfo=None))
+            parquet_gz_path = exporter.table_to_parquet_gzip(table.cast(pa_schema), bq_table_addres) if table is not None else None
+        else:
+            # Build query using schema
+            current_query = exporter.render_query(current_query,
+                                                  params={'dt': exporter.dt},
+                                                  identifiers={'bq_table_addres': bq_table_addres})
+            print(f"Processing date {raw_dt} - Generated query:\n{current_query}")
+            
+            parquet_gz_path = exporter.export_to_parquet_gzip(current_query, 
+                                                              schema=pa_schema, 
+                                                              bq_table_addres=bq_table_addres,
+                                                              numeric_mode='float64')  # NUMERIC -> float64, the type pa_schema declares
         ##############################
 
         if parquet_gz_path:
@@ -72,7 +92,9 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
             upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
                                     dt_now=dt_now_utc, 
                                     dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
+                                    gzip_path=parquet_gz_path,
+                                    checksum_sha256=exporter.part_checksums.get(parquet_gz_path),
+                                    on_identical=on_identical)
             
             rez = upl_to_aws.run()
             print(f'Date {raw_dt}: Successfully uploaded!' if rez else f'Date {raw_dt}: Upload failed!')
@@ -113,9 +135,15 @@ if __name__ == '__main__':
     current_month_dt = get_current_month_start(start_date)
     print(f"Processing only current month: {current_month_dt}")
     
+    # Partition state of the source table; days changed since their rollup state was built are re-queried
+    partitions = None
+    if rollup_from_daily:
+        with BigQueryExporter() as exporter:
+            partitions = exporter.get_partitions(bq_table_addres, partition_column='created_at')
+
     # Process current month
     try:
-        success = process_single_date(current_month_dt, bq_table_addres, s3_entity_path, pa_schema)
+        success = process_single_date(current_month_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=partitions)
     except Exception as e:
         print(f"Error processing current month: {e}")
         success = False
@@ -1,4 +1,4 @@
-from scr.AWSS3Loader import S3Uploader
+from scr.AWSS3Loader import S3Uploader, partition_source_metadata, s3_bucket, s3_partition_prefix
 from scr.BigqueryToJson import BigQueryExporter
 from datetime import datetime, timezone, timedelta
 import pyarrow as pa
@@ -6,6 +6,15 @@ from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
 import time
 import copy
 
+# Skip days whose source partition did not change since the last upload (False forces a re-export)
+skip_unchanged = True
+
+# Replace a partition's old files only after the new ones are uploaded, so it is never empty
+sync_path = True
+
+# Reruns that produce byte-identical files reuse the object already in S3 ('upload' always uploads)
+on_identical = 'rename'
+
 pa_schema = None
 pa_schema = pa.schema([
     pa.field("created_at", pa.string()),
@@ -34,11 +43,11 @@ SELECT
     uuid
 FROM
   `@bq_table_addres@` AS refunds
-WHERE TIMESTAMP_TRUNC(created_at, DAY) = TIMESTAMP('@dt@')
+WHERE TIMESTAMP_TRUNC(created_at, DAY) = TIMESTAMP(@dt)
 """
 
 
-def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
+def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=None):
     """Process data for a single date"""
     global query
     current_query = copy.deepcopy(query)
@@ -46,10 +55,21 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
     with BigQueryExporter() as exporter:
         exporter.raw_dt = raw_dt
         exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')    
+
+        source_state = BigQueryExporter.partition_state(partitions, raw_dt) if partitions is not None else None
+        if source_state is not None:
+            if source_state['source-rows'] == '0':
+                print(f'Date {raw_dt}: Source partition is empty, skipped')
+                return True
+            s3_prefix = s3_partition_prefix(s3_entity_path, datetime.strptime(str(exporter.raw_dt), '%Y%m%d'))
+            if partition_source_metadata(s3_bucket(), s3_prefix) == source_state:
+                print(f'Date {raw_dt}: Source partition unchanged since the last upload, skipped')
+                return True
         
         # Build query using schema
-        current_query = current_query.replace("@dt@", exporter.dt)
-        current_query = current_query.replace("@bq_table_addres@", bq_table_addres)
+        current_query = exporter.render_query(current_query,
+                                              params={'dt': exporter.dt},
+                                              identifiers={'bq_table_addres': bq_table_addres})
         print(f"Processing date {raw_dt} - Generated query:\n{current_query}")
         
         parquet_gz_path = exporter.export_to_parquet_gzip(current_query, schema=pa_schema, bq_table_addres=bq_table_addres)
@@ -61,7 +81,11 @@ def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
             upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
                                     dt_now=dt_now_utc, 
                                     dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
+                                    gzip_path=parquet_gz_path,
+                                    metadata=source_state,
+                                    sync_path=sync_path,
+                                    checksum_sha256=exporter.part_checksums.get(parquet_gz_path),
+                                    on_identical=on_identical)
             
             rez = upl_to_aws.run()
             print(f'Date {raw_dt}: Successfully uploaded!' if rez else f'Date {raw_dt}: Upload failed!')
@@ -119,13 +143,19 @@ if __name__ == '__main__':
     print(f"Processing dates from {start_date} to {end_date}")
     print(f"Total dates to process: {len(date_list)}")
     
+    # Partition state of the source table, loaded once for the whole range
+    partitions = None
+    if skip_unchanged:
+        with BigQueryExporter() as exporter:
+            partitions = exporter.get_partitions(bq_table_addres, partition_column='created_at')
+
     # Process each date
     success_count = 0
     unsuccess_date_dt = {}
     for raw_dt in date_list:
         print(f"\n--- Processing date: {raw_dt} ---")
         try:
-            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema)
+            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, partitions=partitions)
             
             # time.sleep(2)
             if success:
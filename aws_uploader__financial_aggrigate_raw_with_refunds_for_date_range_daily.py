@@ -0,0 +1,84 @@
+from scr.AWSS3Loader import S3Uploader
+from scr.BigqueryToJson import BigQueryExporter
+from scr.MultiEntityExport import EntityOutput, export_entities
+from datetime import datetime, timezone, timedelta
+import aws_uploader__financial_aggrigate_raw_for_date_range_daily as raw_daily
+import aws_uploader__financial_aggrigate_raw_refunds_for_date_range_daily as raw_refunds
+
+
+# Per entity: (source table, S3 path, query template and schema of the single-entity script)
+entities = {
+    'raw_daily': ('organic-reef-315010.mart.mart_orders',
+                  'partner_metrics/financial_aggregate/raw_daily',
+                  raw_daily.query, raw_daily.pa_schema),
+    'raw_refunds': ('organic-reef-315010.staging.stg_lavka__refunds',
+                    'partner_metrics/financial_aggregate/raw_refunds',
+                    raw_refunds.query, raw_refunds.pa_schema),
+}
+
+
+def process_single_date(raw_dt):
+    """Export raw orders and refunds of one date in a single BigQuery job"""
+    with BigQueryExporter() as exporter:
+        exporter.raw_dt = raw_dt
+        exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')    
+
+        outputs = [
+            EntityOutput(
+                name=name,
+                query=exporter.render_query(query,
+                                            params={'dt': exporter.dt},
+                                            identifiers={'bq_table_addres': bq_table_addres}),
+                s3_entity_path=s3_entity_path,
+                schema=pa_schema,
+            )
+            for name, (bq_table_addres, s3_entity_path, query, pa_schema) in entities.items()
+        ]
+
+        parquet_gz_paths = export_entities(exporter, outputs)
+        ##############################
+
+        dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
+        dt_now_utc = datetime.now(timezone.utc)
+        rez = True
+        for output in outputs:
+            parquet_gz_path = parquet_gz_paths[output.name]
+            if not parquet_gz_path:
+                print(f'Date {raw_dt} {output.name}: No data exported')
+                continue
+            upl_to_aws = S3Uploader(entity_path=output.s3_entity_path, 
+                                    dt_now=dt_now_utc, 
+                                    dt_partition=dt_partition_utc,
+                                    gzip_path=parquet_gz_path)
+            ok = upl_to_aws.run()
+            print(f'Date {raw_dt} {output.name}: Successfully uploaded!' if ok else f'Date {raw_dt} {output.name}: Upload failed!')
+            rez = rez and ok
+        return rez
+
+
+if __name__ == '__main__':
+
+    start_date = '20260422'    # Start date in YYYYMMDD format
+    end_date = '20260422'    # End date in YYYYMMDD format
+
+    date_list = raw_daily.generate_date_range(start_date, end_date)
+    print(f"Processing dates from {start_date} to {end_date}")
+    print(f"Total dates to process: {len(date_list)}")
+    
+    # Process each date
+    success_count = 0
+    unsuccess_date_dt = {}
+    for raw_dt in date_list:
+        print(f"\n--- Processing date: {raw_dt} ---")
+        try:
+            if process_single_date(raw_dt):
+                success_count += 1
+        except Exception as e:
+            unsuccess_date_dt[str(raw_dt)] = str(e)
+            print(f"Error processing date {raw_dt}: {e}")
+    
+    print(f"\n=== Summary ===")
+    print(f"Successfully processed: {success_count}/{len(date_list)} dates")
+    if unsuccess_date_dt:
+        print(f"Unsuccessfully processed: {unsuccess_date_dt}")
+        raise RuntimeError(f"Some dates failed to process: {unsuccess_date_dt.keys()}")
@@ -1,9 +1,36 @@
-from scr.AWSS3Loader import S3Uploader
+from scr.AWSS3Loader import S3Uploader, partition_source_metadata, s3_bucket, s3_partition_prefix
 from scr.BigqueryToJson import BigQueryExporter
 from datetime import datetime, timezone, timedelta
 import pyarrow as pa
 from scr.BigqueryShcemaToPyarrow import get_pyarrow_schema_from_bq
+from scr.WatermarkStore import shared_watermark_store
 import time
+import uuid
+
+# Delta mode: export only rows ingested since the last run of each day. Watermarks live in
+# our state bucket (Environment.aws_s3_state_bucket_name) so every host sees the same ones
+delta_mode = False
+# Re-export whole days and reset their watermark (merges the delta parts)
+consolidate = False
+# Must grow as rows land (rows are selected by ingestion_column > watermark)
+ingestion_column = 'server_upload_time'
+
+# Skip days whose source partition did not change since the last upload (False forces a re-export)
+skip_unchanged = True
+
+# Replace a partition's old files only after the new ones are uploaded, so it is never empty
+sync_path = True
+
+# Apply the JSON filter once for the days to export into an expiring, day-partitioned staging table.
+# Every run gets its own table (range and run id in the name), so concurrent runs never replace each other's
+use_staging_table = True
+staging_dataset = 'organic-reef-315010.indrive_dev'
+staging_expiration = timedelta(days=1)
+
+# Large days are split into parts of this size (before gzip) and uploaded concurrently
+max_parquet_size_bytes = 5 * 1024 * 1024
+
+indrive_filter = "(lower(json_extract_scalar(event_properties,'$.user_agent')) like '%indrive%' or json_extract_scalar(event_properties, '$.currentApp' ) ='miniApp_inDrive')"
 
 pa_schema = None
 pa_schema = pa.schema([
@@ -59,30 +86,137 @@ pa_schema = pa.schema([
 
 
 
-def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema):
-    """Process data for a single date"""
+def unchanged_reason(raw_dt, s3_entity_path, source_state):
+    """Why a day can be skipped (empty or unchanged source partition), or None if it has to be exported."""
+    if source_state is None:
+        return None
+    if source_state['source-rows'] == '0':
+        return 'Source partition is empty'
+    s3_prefix = s3_partition_prefix(s3_entity_path, datetime.strptime(str(raw_dt), '%Y%m%d'))
+    if partition_source_metadata(s3_bucket(), s3_prefix) == source_state:
+        return 'Source partition unchanged since the last upload'
+    return None
+
+
+def day_ranges(raw_dts):
+    """Consecutive runs of 'YYYYMMDD' days as (first, last) 'YYYY-MM-DD' pairs."""
+    days = sorted(datetime.strptime(raw_dt, '%Y%m%d') for raw_dt in raw_dts)
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')) for first, last in ranges]
+
+
+def materialize_staging(raw_dts, bq_table_addres, run_id):
+    """
+    Filter the source once for the given days into a staging table of this run.
+
+    Only the days still to export are scanned; days are bound as query parameters.
+
+    Returns:
+        str: Staging table full path
+    """
+    first, last = min(raw_dts), max(raw_dts)
+    staging_table_addres = f"{staging_dataset}.amplitude_event_wo_dma__indrive_{first}_{last}_{run_id}"
+    conditions, params = [], {}
+    for i, (start_dt, end_dt) in enumerate(day_ranges(raw_dts)):
+        conditions.append(f"timestamp_trunc(event_time, day) BETWEEN TIMESTAMP(@start_dt_{i}) AND TIMESTAMP(@end_dt_{i})")
+        params[f'start_dt_{i}'] = start_dt
+        params[f'end_dt_{i}'] = end_dt
+    with BigQueryExporter() as exporter:
+        return exporter.materialize_staging_table(
+            bq_table_addres=bq_table_addres,
+            staging_table_addres=staging_table_addres,
+            where_condition=f"{indrive_filter} AND ({' OR '.join(conditions)})",
+            partition_by='TIMESTAMP_TRUNC(event_time, DAY)',
+            expiration=staging_expiration,
+            params=params,
+        )
+
+
+def process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, watermarks=None, consolidate=False, partitions=None,
+                        staging_table_addres=None, check_unchanged=True):
+    """
+    Process data for a single date.
+
+    With a WatermarkStore the day is exported as a delta: only rows whose
+    ingestion_column is above the watermark of the last successful export of
+    that day are uploaded, as an additional part without clearing the prefix.
+    consolidate=True re-exports the whole day (clearing the prefix) and resets
+    the watermark, merging the delta parts back into one.
+
+    With staging_table_addres the day is read from the pre-filtered staging
+    table instead of applying the JSON filter to the source partition.
+    check_unchanged=False when the caller has already skipped empty and unchanged days.
+    """
     with BigQueryExporter() as exporter:
         exporter.raw_dt = raw_dt
         exporter.dt = datetime.strptime(str(exporter.raw_dt), '%Y%m%d').strftime('%Y-%m-%d')    
+
+        source_state = BigQueryExporter.partition_state(partitions, raw_dt) if partitions is not None and not consolidate else None
+        reason = unchanged_reason(raw_dt, s3_entity_path, source_state) if check_unchanged else None
+        if reason:
+            print(f'Date {raw_dt}: {reason}, skipped')
+            return True
         
-        where_condition = f"(lower(json_extract_scalar(event_properties,'$.user_agent')) like '%indrive%' or json_extract_scalar(event_properties, '$.currentApp' ) ='miniApp_inDrive') AND timestamp_trunc(event_time, day) = '{exporter.dt}'"
+        export_table_addres = staging_table_addres or bq_table_addres
+        where_condition = "timestamp_trunc(event_time, day) = TIMESTAMP(@dt)"
+        params = {'dt': exporter.dt}
+        if not staging_table_addres:
+            where_condition = f"{indrive_filter} AND {where_condition}"
+
+        clear_path_before_upload = True
+        new_watermark = None
+        if watermarks is not None:
+            # Upper bound taken before the export, so rows arriving meanwhile go to the next delta
+            # Rows with a NULL ingestion_column would never be selected by the watermark bounds
+            new_watermark = exporter.query_max(export_table_addres, ingestion_column, where_condition, params=params,
+                                               require_not_null=True)
+            last_watermark = None if consolidate else watermarks.get(s3_entity_path, partition=exporter.dt)
+            if new_watermark is None or new_watermark == last_watermark:
+                print(f'Date {raw_dt}: No new rows since watermark {last_watermark}')
+                return True
+            where_condition += f" AND {ingestion_column} <= TIMESTAMP(@watermark_to)"
+            params['watermark_to'] = new_watermark
+            if last_watermark is not None:
+                where_condition += f" AND {ingestion_column} > TIMESTAMP(@watermark_from)"
+                params['watermark_from'] = last_watermark
+                clear_path_before_upload = False
     
         # Build query using schema
-        query = exporter.build_query(bq_table_addres=bq_table_addres, where_condition=where_condition)
+        query = exporter.build_query(bq_table_addres=export_table_addres, where_condition=where_condition, params=params)
         print(f"Processing date {raw_dt} - Generated query:\n{query}")
         
-        parquet_gz_path = exporter.export_to_parquet_gzip(query, schema=pa_schema, bq_table_addres=bq_table_addres)
+        parquet_gz_paths = exporter.export_to_parquet_gzip(
+            query,
+            schema=pa_schema,
+            bq_table_addres=bq_table_addres,
+            max_parquet_size_bytes=max_parquet_size_bytes,
+        )
         ##############################
 
-        if parquet_gz_path:
+        if parquet_gz_paths:
+            gz_paths = [parquet_gz_paths] if isinstance(parquet_gz_paths, str) else parquet_gz_paths
             dt_partition_utc = datetime.strptime(str(exporter.raw_dt), '%Y%m%d')
             dt_now_utc = datetime.now(timezone.utc)
-            upl_to_aws = S3Uploader(entity_path=s3_entity_path, 
-                                    dt_now=dt_now_utc, 
-                                    dt_partition=dt_partition_utc,
-                                    gzip_path=parquet_gz_path)
-            
-            rez = upl_to_aws.run()
+            # Prefix cleared once, then all parts of the day go up at the same time
+            results = S3Uploader.upload_many(gz_paths,
+                                             entity_path=s3_entity_path,
+                                             dt_partition=dt_partition_utc,
+                                             dt_now=dt_now_utc,
+                                             clear_path_before_upload=clear_path_before_upload,
+                                             sync_path=sync_path,
+                                             part_checksums=exporter.part_checksums,
+                                             part_metadata={p: source_state for p in gz_paths} if source_state else None)
+            for result in results:
+                print(f"Date {raw_dt}: {result.s3_key} {'uploaded' if result.success else 'FAILED'}")
+
+            rez = all(result.success for result in results)
+            if rez and new_watermark is not None:
+                watermarks.set(s3_entity_path, new_watermark, partition=exporter.dt)
             print(f'Date {raw_dt}: Successfully uploaded!' if rez else f'Date {raw_dt}: Upload failed!')
             return rez
         else:
@@ -122,12 +256,36 @@ if __name__ == '__main__':
     print(f"Processing dates from {start_date} to {end_date}")
     print(f"Total dates to process: {len(date_list)}")
     
-    # Process each date
+    watermarks = shared_watermark_store() if delta_mode or consolidate else None
+
+    # Partition state of the source table, loaded once for the whole range
+    partitions = None
+    if skip_unchanged:
+        with BigQueryExporter() as exporter:
+            partitions = exporter.get_partitions(bq_table_addres, partition_column='event_time')
+
+    # Skip checks first, so the staging table only scans the days that are exported
     success_count = 0
+    pending = []
     for raw_dt in date_list:
+        source_state = BigQueryExporter.partition_state(partitions, raw_dt) if partitions is not None and not consolidate else None
+        reason = unchanged_reason(raw_dt, s3_entity_path, source_state)
+        if reason:
+            print(f'Date {raw_dt}: {reason}, skipped')
+            success_count += 1
+        else:
+            pending.append(raw_dt)
+
+    staging_table_addres = None
+    if use_staging_table and pending:
+        staging_table_addres = materialize_staging(pending, bq_table_addres, run_id=uuid.uuid4().hex[:8])
+
+    # Process each date
+    for raw_dt in pending:
         print(f"\n--- Processing date: {raw_dt} ---")
         try:
-            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema)
+            success = process_single_date(raw_dt, bq_table_addres, s3_entity_path, pa_schema, watermarks, consolidate, partitions=partitions,
+                                          staging_table_addres=staging_table_addres, check_unchanged=False)
             
             time.sleep(2)
             if success:
@@ -1,16 +1,24 @@
+import base64
+import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
 import uuid
 import gzip
 import pandas as pd
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
 from boto3.session import Session
+from s3transfer.utils import ChunksizeAdjuster
 
 from config.cred.enviroment import Environment
+from scr.S3ListingIndex import get_listing_index
 import os
 import json
 import tempfile
@@ -26,6 +34,251 @@ class S3Config:
     secret_key: str
     bucket_name: str
     region_name: str
+    endpoint_url: Optional[str] = None  # e.g. a local S3 stand-in; None means AWS
+
+
+def s3_partition_prefix(entity_path: str, dt_partition: datetime) -> str:
+    """S3 prefix of one partition: entity/YYYY-MM-DD/ (partition date in UTC)."""
+    return f'{entity_path}/{dt_partition:%Y-%m-%d}/'
+
+
+def s3_object_name(hash_string: str, dt_now: datetime) -> str:
+    """S3 object name inside a partition: {str8_hash}_HH:MM:SS.parquet.gz (upload time in UTC)."""
+    return f'{hash_string}_{dt_now:%H:%M:%S}.parquet.gz'
+
+
+def s3_object_key(s3_prefix: str, dt_now: datetime) -> str:
+    """Key of a new object under a prefix, with a fresh random hash (see s3_object_name)."""
+    return f'{s3_prefix}{s3_object_name(str(uuid.uuid4())[:8], dt_now)}'
+
+
+# Default size of the shared connection pool; override with aws_s3_max_pool_connections in Environment
+S3_MAX_POOL_CONNECTIONS = 32
+
+_s3_pool_lock = threading.Lock()
+# One resource (and so one client and connection pool) per connection settings
+_s3_resources: Dict[tuple, object] = {}
+
+
+def s3_config_from_env(env=None) -> S3Config:
+    """S3Config of the configured bucket and credentials."""
+    env = env or Environment()
+    return S3Config(
+        access_key=env.aws_s3_access_key,
+        secret_key=env.aws_s3_secret_key,
+        bucket_name=env.aws_s3_bucket_name,
+        region_name=env.aws_s3_region_name,
+        endpoint_url=getattr(env, 'aws_s3_endpoint_url', None),
+    )
+
+
+def get_s3_resource(config: Optional[S3Config] = None, max_pool_connections: Optional[int] = None):
+    """
+    Process-wide S3 resource for one set of connection settings, created on first use.
+
+    The resource is built once and its client is the shared one (get_s3_client): boto3
+    clients are thread-safe, so all uploaders, loaders and threads share one credential
+    resolution and one keep-alive connection pool. The resource itself is only used as
+    a factory; Bucket/Object objects are created per use and not shared between threads.
+
+    Args:
+        config: Credentials, region and endpoint; defaults to the ones in Environment
+            (the bucket name does not matter here)
+        max_pool_connections: Pool size; only the first call for these settings decides it
+    """
+    env = Environment()
+    config = config or s3_config_from_env(env)
+    key = (config.access_key, config.secret_key, config.region_name, config.endpoint_url)
+    with _s3_pool_lock:
+        resource = _s3_resources.get(key)
+        if resource is None:
+            pool_size = (
+                max_pool_connections
+                or getattr(env, 'aws_s3_max_pool_connections', None)
+                or S3_MAX_POOL_CONNECTIONS
+            )
+            session = Session(
+                aws_access_key_id=config.access_key,
+                aws_secret_access_key=config.secret_key,
+                region_name=config.region_name,
+            )
+            resource = session.resource(
+                's3',
+                endpoint_url=config.endpoint_url,
+                config=Config(max_pool_connections=int(pool_size), tcp_keepalive=True),
+            )
+            _s3_resources[key] = resource
+        return resource
+
+
+def get_s3_client(config: Optional[S3Config] = None, max_pool_connections: Optional[int] = None):
+    """Process-wide S3 client (and connection pool) for one set of connection settings, see get_s3_resource."""
+    return get_s3_resource(config, max_pool_connections).meta.client
+
+
+# Files up to this size are sent with one PutObject carrying their full SHA256;
+# larger ones go multipart through the transfer manager with per-part checksums
+S3_SINGLE_PUT_MAX_BYTES = 100 * 1024 * 1024
+# Part size of those multipart uploads (the transfer manager only raises it past 10,000 parts)
+S3_MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+
+
+# Object metadata holding the SHA256 of the object's content, for skipping identical re-uploads
+CONTENT_HASH_METADATA = 'content-sha256'
+
+# Written by scr.S3Compaction next to compacted parts; lists the current parts and the retired ones
+COMPACTION_MANIFEST_NAME = '_compaction_manifest.json'
+
+# What S3Uploader does when the partition already has an object with the same content:
+# 'upload' uploads anyway, 'keep' keeps the existing object, 'rename' copies it to the new name server-side
+IDENTICAL_MODES = ('upload', 'keep', 'rename')
+
+# Guards the claimed_objects sets of S3Uploader
+_claim_lock = threading.Lock()
+
+
+def sha256_b64(data: bytes) -> str:
+    """Base64 SHA256 digest, the format of the x-amz-checksum-sha256 header."""
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def composite_sha256_b64(part_checksums: List[str]) -> str:
+    """S3's checksum of a multipart object: SHA256 of the part digests, suffixed with the part count."""
+    part_digests = b''.join(base64.b64decode(checksum) for checksum in part_checksums)
+    return f"{sha256_b64(part_digests)}-{len(part_checksums)}"
+
+
+def checksums_match(expected: str, actual: str) -> bool:
+    """Compare two x-amz-checksum-sha256 values; some endpoints drop the -<parts> suffix of composite ones."""
+    return expected.split('-')[0] == actual.split('-')[0]
+
+
+def file_composite_sha256_b64(path: str | Path, chunksize: int) -> str:
+    """Checksum S3 reports for a file uploaded multipart in parts of chunksize bytes (see composite_sha256_b64)."""
+    with open(path, 'rb') as f:
+        return composite_sha256_b64([sha256_b64(chunk) for chunk in iter(lambda: f.read(chunksize), b'')])
+
+
+def file_sha256_b64(path: str | Path) -> str:
+    """Base64 SHA256 digest of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode()
+
+
+def s3_bucket(bucket_name: Optional[str] = None):
+    """boto3 Bucket resource for the configured (or the given) bucket."""
+    return get_s3_resource().Bucket(bucket_name or Environment().aws_s3_bucket_name)
+
+
+def retired_part_keys(bucket, keys: List[str]) -> set:
+    """
+    Parts that a compaction has replaced but not deleted yet, from the manifests among keys.
+
+    Readers that list a prefix skip these, so a partition is not read twice while
+    compacted and retired parts coexist (see scr.S3Compaction.compact_prefix).
+    """
+    retired = set()
+    for key in keys:
+        if not key.endswith(COMPACTION_MANIFEST_NAME):
+            continue
+        try:
+            manifest = json.loads(bucket.Object(key).get()['Body'].read())
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                continue
+            raise
+        retired.update(manifest.get('retired', []))
+    return retired
+
+
+def partition_source_metadata(bucket, s3_prefix: str) -> Optional[Dict[str, str]]:
+    """
+    Source partition state recorded with the parts of a prefix at their last upload.
+
+    Every part of an upload carries the same state, so only the newest part is read
+    (one listing and one HEAD). Parts retired by a compaction are ignored.
+
+    Returns:
+        Dict with 'source-rows' and 'source-last-modified', or None if the newest part does not carry them
+    """
+    listing = list(bucket.objects.filter(Prefix=s3_prefix))
+    retired = retired_part_keys(bucket, [obj.key for obj in listing])
+    parts = [obj for obj in listing if obj.key.endswith('.parquet.gz') and obj.key not in retired]
+    if not parts:
+        return None
+    newest = max(parts, key=lambda obj: obj.last_modified)
+    metadata = bucket.meta.client.head_object(Bucket=bucket.name, Key=newest.key)['Metadata']
+    if 'source-last-modified' not in metadata:
+        return None
+    return {k: metadata[k] for k in ('source-rows', 'source-last-modified') if k in metadata}
+
+
+def key_range_value(value: str):
+    """Parse a key-min/key-max value so numbers and timestamps compare by value, not as text."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    # Timestamps without an offset are UTC, like every partition date here
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def list_parts_in_key_range(
+    bucket,
+    s3_prefix: str,
+    key: str,
+    key_min: str,
+    key_max: str,
+    max_workers: int = 8,
+) -> List[str]:
+    """
+    List the parts under a prefix that can hold rows with key_min <= key <= key_max.
+
+    Parts split on this key (split_key of BigQueryExporter.export_to_parquet) carry its
+    min/max in their object metadata; other parts cannot be pruned and are always returned.
+    S3 only returns metadata on HEAD, so the parts are HEADed concurrently over the shared pool.
+
+    Args:
+        bucket: boto3 Bucket resource
+        s3_prefix: Partition prefix, e.g. 'partner_metrics/backend/orders/2025-11-17/'
+        key: Column the range is on, e.g. 'created_at'
+        key_min: Lower bound (ISO timestamp, number or string)
+        key_max: Upper bound
+        max_workers: HEAD requests in flight
+    Returns:
+        List of matching object keys
+    """
+    low, high = key_range_value(key_min), key_range_value(key_max)
+    client = bucket.meta.client
+
+    def overlaps(part_key: str) -> bool:
+        metadata = client.head_object(Bucket=bucket.name, Key=part_key)['Metadata']
+        if metadata.get('split-key') != key or 'key-min' not in metadata or 'key-max' not in metadata:
+            return True
+        if metadata['key-min'] == '':
+            # Only null keys in this part
+            return False
+        part_min, part_max = key_range_value(metadata['key-min']), key_range_value(metadata['key-max'])
+        try:
+            return not (part_max < low or part_min > high)
+        except TypeError:
+            return True
+
+    keys = [obj.key for obj in bucket.objects.filter(Prefix=s3_prefix)]
+    retired = retired_part_keys(bucket, keys)
+    part_keys = [key for key in keys if key.endswith('.parquet.gz') and key not in retired]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        keep = list(pool.map(overlaps, part_keys))
+    matching = [part_key for part_key, ok in zip(part_keys, keep) if ok]
+    logging.getLogger(__name__).info(f"{s3_prefix}: {len(matching)}/{len(part_keys)} part(s) overlap {key} in [{key_min}, {key_max}]")
+    return matching
 
 
 class S3UploaderError(Exception):
@@ -43,6 +296,15 @@ class S3UploadError(S3UploaderError):
     pass
 
 
+@dataclass
+class PartUploadResult:
+    """Outcome of one part uploaded by S3Uploader.upload_many."""
+    gzip_path: str
+    s3_key: str
+    success: bool
+    error: Optional[str] = None
+
+
 class S3Uploader():
     """Handles the process of converting, compressing, and uploading files to S3."""
 
@@ -50,9 +312,17 @@ class S3Uploader():
         self,
         entity_path: str,
         dt_partition: datetime,
-        gzip_path: str,
+        gzip_path: Optional[str] = None,
         dt_now: Optional[datetime] = None,
         clear_path_before_upload: bool = True,
+        bucket_name: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        sub_path: Optional[str] = None,
+        sync_path: bool = False,
+        checksum_sha256: Optional[str] = None,
+        on_identical: str = 'upload',
+        existing_objects: Optional[Dict[str, int]] = None,
+        claimed_objects: Optional[set] = None,
     ):
 
         """
@@ -60,17 +330,46 @@ class S3Uploader():
 
         Args:
             entity_path: The entity path for file
+            gzip_path: File to upload; None for an uploader that only lists, clears or syncs
+                the partition (list_s3_path, clear_s3_path, sync_s3_path).
             dt_now: datetime for the S3 path part. Defaults to current time in UTC.
             dt_partition: datetime of the bq table partition. In UTC.
+            bucket_name: Upload to this bucket instead of the configured one.
+            metadata: S3 user metadata stored with the object (e.g. key-min/key-max of the part).
+            sub_path: Sub-directory inside the partition, e.g. Hive 'hour=05'.
+            sync_path: With clear_path_before_upload, replace the partition's old objects only
+                after the new one is uploaded, so the partition is never empty (see sync_s3_path).
+            checksum_sha256: Base64 SHA256 of the file if already known (BigQueryExporter.part_checksums);
+                computed from the file otherwise.
+            on_identical: One of IDENTICAL_MODES. With 'keep' or 'rename' an object in the partition
+                with the same content (and, for 'keep', the same metadata) is reused instead of
+                uploading the file again. The old objects are then needed for the comparison, so
+                clear_path_before_upload works like sync_path.
+            existing_objects: Listing of the partition (key -> size) already taken by the caller.
+            claimed_objects: Keys already reused by the other uploaders sharing existing_objects
+                (upload_many passes one set to all parts), so two identical parts never keep or
+                rename the same object. An object removed by another run in the meantime is
+                noticed by the failing copy and the file is uploaded instead.
         """
         self._setup_logging()
         self._load_config()
+        if bucket_name:
+            self.config.bucket_name = bucket_name
         self.entity_path = entity_path
         self.dt_now = dt_now or datetime.now(timezone.utc)
         self.dt_partition = dt_partition
         self.hash_string = self._generate_hash(8)
-        self.gzip_path =  Path(f"{gzip_path}")
+        self.gzip_path = Path(gzip_path) if gzip_path else None
         self.clear_path_before_upload = clear_path_before_upload
+        self.metadata = metadata or {}
+        self.sub_path = sub_path
+        self.sync_path = sync_path
+        self.checksum_sha256 = checksum_sha256
+        if on_identical not in IDENTICAL_MODES:
+            raise ValueError(f"on_identical must be one of {IDENTICAL_MODES}, got {on_identical!r}")
+        self.on_identical = on_identical
+        self.existing_objects = existing_objects
+        self.claimed_objects = claimed_objects if claimed_objects is not None else set()
         self._setup_paths()
         self._setup_s3_client()
 
@@ -84,30 +383,20 @@ class S3Uploader():
 
     def _load_config(self) -> None:
         """Load S3 configuration from environment."""
-        env = Environment()
-        self.config = S3Config(
-            access_key=env.aws_s3_access_key,
-            secret_key=env.aws_s3_secret_key,
-            bucket_name=env.aws_s3_bucket_name,
-            region_name=env.aws_s3_region_name
-        )
+        self.config = s3_config_from_env()
 
     def _setup_paths(self) -> None:
         """Initialize file paths."""
-        self.s3_parent_path_file_key = f'{self.entity_path}/{self.dt_partition:%Y-%m-%d}/'
+        self.s3_parent_path_file_key = s3_partition_prefix(self.entity_path, self.dt_partition)
         # self.s3_full_file_key = f'partner_metrics/amplitude_v2/2025-09-24/{self.hash_string}_{self.dt_now:%H:%M:%S}.parquet.gz'
+        sub_path = f'{self.sub_path.strip("/")}/' if self.sub_path else ''
         self.s3_full_file_key = (
-            self.s3_parent_path_file_key + f'{self.hash_string}_{self.dt_now:%H:%M:%S}.parquet.gz'
+            self.s3_parent_path_file_key + sub_path + s3_object_name(self.hash_string, self.dt_now)
         )
 
     def _setup_s3_client(self) -> None:
-        """Set up S3 client."""
-        session = Session(
-            aws_access_key_id=self.config.access_key,
-            aws_secret_access_key=self.config.secret_key,
-            region_name=self.config.region_name
-        )
-        self.s3 = session.resource('s3')
+        """Set up S3 client (the process-wide pooled one for self.config)."""
+        self.s3 = get_s3_resource(self.config)
         self.bucket = self.s3.Bucket(self.config.bucket_name)
 
 
@@ -117,7 +406,65 @@ class S3Uploader():
         return str(uuid.uuid4())[:n]
 
 
-    def _clear_s3_path(self, s3_path: str) -> None:
+    def list_s3_objects(self, s3_path: str) -> Dict[str, int]:
+        """
+        List the objects under an S3 path as key -> size.
+
+        Uses the listing index (scr.S3ListingIndex) when it is turned on, one paginated
+        listing otherwise.
+        """
+        if not s3_path.endswith('/'):
+            s3_path += '/'
+        try:
+            index = get_listing_index()
+            if index is not None:
+                return {obj.key: obj.size for obj in index.list_objects(self.bucket, s3_path)}
+            return {obj.key: obj.size for obj in self.bucket.objects.filter(Prefix=s3_path)}
+        except ClientError as e:
+            self.logger.error(f"Failed to list S3 path {s3_path}: {e}")
+            raise S3UploaderError(f"Failed to list S3 path {s3_path}: {e}")
+
+    def list_s3_path(self, s3_path: str) -> List[str]:
+        """List the keys under an S3 path (one paginated listing)."""
+        return list(self.list_s3_objects(s3_path))
+
+    def _delete_s3_keys(self, keys: List[str]) -> None:
+        """
+        Delete keys in batches (S3 allows up to 1000 objects per delete request).
+
+        Raises:
+            S3UploaderError: If a delete request fails.
+        """
+        batch_size = 1000
+        try:
+            for i in range(0, len(keys), batch_size):
+                batch = [{'Key': key} for key in keys[i:i + batch_size]]
+                response = self.bucket.delete_objects(Delete={'Objects': batch})
+
+                # Log any errors from the delete operation
+                if 'Errors' in response:
+                    for error in response['Errors']:
+                        self.logger.error(f"Failed to delete {error['Key']}: {error['Message']}")
+                self._record_delete([deleted['Key'] for deleted in response.get('Deleted', [])])
+
+                self.logger.info(f"Deleted batch of {len(batch)} objects")
+        except ClientError as e:
+            self.logger.error(f"Failed to delete S3 objects: {e}")
+            raise S3UploaderError(f"Failed to delete S3 objects: {e}")
+
+    def record_upload(self, key: str, size: int, etag: Optional[str] = None) -> None:
+        """Add an uploaded object to the listing index, if it is turned on."""
+        index = get_listing_index()
+        if index is not None:
+            index.record_upload(self.config.bucket_name, key, size, etag)
+
+    def _record_delete(self, keys: List[str]) -> None:
+        """Drop deleted objects from the listing index, if it is turned on."""
+        index = get_listing_index()
+        if index is not None and keys:
+            index.record_delete(self.config.bucket_name, keys)
+
+    def clear_s3_path(self, s3_path: str) -> None:
         """
         Delete all files from the specified S3 path.
         
@@ -133,38 +480,41 @@ class S3Uploader():
         self.logger.info(f"Clearing S3 path: s3://{self.config.bucket_name}/{s3_path}")
         
         try:
-            # List all objects in the path
-            objects_to_delete = []
-            for obj in self.bucket.objects.filter(Prefix=s3_path):
-                objects_to_delete.append({'Key': obj.key})
-                self.logger.debug(f"Found object to delete: {obj.key}")
-            
+            objects_to_delete = self.list_s3_path(s3_path)
             if not objects_to_delete:
                 self.logger.info(f"No files found in path: {s3_path}")
                 return
-            
-            # Delete all objects in batches (S3 allows up to 1000 objects per delete request)
-            batch_size = 1000
-            for i in range(0, len(objects_to_delete), batch_size):
-                batch = objects_to_delete[i:i + batch_size]
-                response = self.bucket.delete_objects(Delete={'Objects': batch})
-                
-                # Log any errors from the delete operation
-                if 'Errors' in response:
-                    for error in response['Errors']:
-                        self.logger.error(f"Failed to delete {error['Key']}: {error['Message']}")
-                
-                self.logger.info(f"Deleted batch of {len(batch)} objects from {s3_path}")
-            
+            self._delete_s3_keys(objects_to_delete)
             self.logger.info(f"Successfully cleared S3 path: {s3_path}")
-            
-        except ClientError as e:
-            self.logger.error(f"Failed to clear S3 path {s3_path}: {e}")
-            raise S3UploaderError(f"Failed to clear S3 path {s3_path}: {e}")
+
+        except S3UploaderError:
+            raise
         except Exception as e:
             self.logger.error(f"Unexpected error while clearing S3 path {s3_path}: {e}")
             raise S3UploaderError(f"Unexpected error while clearing S3 path {s3_path}: {e}")
 
+    def sync_s3_path(self, s3_path: str, stale_keys: List[str], new_keys: List[str]) -> List[str]:
+        """
+        Finish a sync upload: delete the keys listed before the upload that are not new.
+
+        Sync replaces clear-then-upload. The path is listed once before the upload
+        (stale_keys), the new objects are uploaded next to the old ones, and the old
+        ones are removed with batch deletes afterwards, so readers never see an
+        empty partition. Until then they may see old and new objects together.
+
+        Args:
+            s3_path: The S3 path being replaced, for logging
+            stale_keys: list_s3_path result taken before the upload
+            new_keys: Keys written by this upload
+        Returns:
+            The deleted keys
+        """
+        new = set(new_keys)
+        to_delete = [key for key in stale_keys if key not in new]
+        if to_delete:
+            self._delete_s3_keys(to_delete)
+        self.logger.info(f"Synced S3 path {s3_path}: {len(new)} new object(s), {len(to_delete)} stale object(s) deleted")
+        return to_delete
 
     def verify_s3_upload(self, key: str) -> bool:
         """
@@ -189,6 +539,128 @@ class S3Uploader():
                 raise S3UploadError(f"Failed to verify S3 file: {str(e)}")
 
 
+    def _content_checksum(self) -> str:
+        """Base64 SHA256 of the file, computed once."""
+        if self.checksum_sha256 is None:
+            self.checksum_sha256 = file_sha256_b64(self.gzip_path)
+        return self.checksum_sha256
+
+    def _find_identical(self, existing_objects: Dict[str, int]) -> Optional[str]:
+        """
+        Key of an object in the target directory with the same content as the file.
+
+        Only objects of the same size are candidates (from the listing); their content
+        hash is read from the metadata with one HEAD each. The returned key is claimed,
+        so no other uploader sharing claimed_objects reuses it.
+        """
+        size = self.gzip_path.stat().st_size
+        directory = self.s3_full_file_key.rsplit('/', 1)[0]
+        for key, object_size in existing_objects.items():
+            if object_size != size or not key.endswith('.parquet.gz') or key.rsplit('/', 1)[0] != directory:
+                continue
+            try:
+                metadata = self.s3.meta.client.head_object(Bucket=self.config.bucket_name, Key=key)['Metadata']
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                    continue  # removed since the listing
+                raise
+            if metadata.get(CONTENT_HASH_METADATA) != self._content_checksum():
+                continue
+            if self.on_identical == 'keep' and {k: v for k, v in metadata.items() if k != CONTENT_HASH_METADATA} != self.metadata:
+                continue
+            with _claim_lock:
+                if key in self.claimed_objects:
+                    continue
+                self.claimed_objects.add(key)
+            return key
+        return None
+
+    def _reuse_identical(self, key: str) -> bool:
+        """
+        Keep an identical object, or copy it to the new name server-side (no data is uploaded).
+
+        Returns:
+            bool: False if the object is gone by now (the file has to be uploaded)
+        """
+        if self.on_identical == 'keep':
+            self.logger.info(f"Identical content already in S3, kept {key} instead of uploading {self.gzip_path}")
+            self.s3_full_file_key = key
+            return True
+        client = self.s3.meta.client
+        try:
+            response = client.copy_object(
+                Bucket=self.config.bucket_name,
+                Key=self.s3_full_file_key,
+                CopySource={'Bucket': self.config.bucket_name, 'Key': key},
+                Metadata={**self.metadata, CONTENT_HASH_METADATA: self._content_checksum()},
+                MetadataDirective='REPLACE',
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                self.logger.warning(f"Identical object {key} was removed in the meantime, uploading {self.gzip_path}")
+                return False
+            raise
+        self.record_upload(self.s3_full_file_key, self.gzip_path.stat().st_size, response['CopyObjectResult'].get('ETag'))
+        client.delete_object(Bucket=self.config.bucket_name, Key=key)
+        self._record_delete([key])
+        self.logger.info(f"Identical content already in S3, renamed {key} to {self.s3_full_file_key} instead of uploading")
+        return True
+
+    def _put_with_checksum(self) -> bool:
+        """
+        Upload the file with a SHA256 checksum that S3 checks against the received bytes.
+
+        Files up to S3_SINGLE_PUT_MAX_BYTES go in one PutObject with the whole-file
+        checksum, which S3 echoes back; larger files are uploaded multipart, each part
+        is checked by S3 on arrival and the object's composite checksum is read back
+        with one HEAD and compared with the one computed from the file.
+
+        Returns:
+            bool: True if S3 confirmed the checksum
+        """
+        checksum = self._content_checksum()
+        metadata = {**self.metadata, CONTENT_HASH_METADATA: checksum}
+        size = self.gzip_path.stat().st_size
+        if size > S3_SINGLE_PUT_MAX_BYTES:
+            chunksize = ChunksizeAdjuster().adjust_chunksize(S3_MULTIPART_CHUNKSIZE, size)
+            self.bucket.upload_file(
+                Key=self.s3_full_file_key,
+                Filename=str(self.gzip_path),
+                ExtraArgs={'ChecksumAlgorithm': 'SHA256', 'Metadata': metadata},
+                Config=TransferConfig(multipart_threshold=1, multipart_chunksize=chunksize),
+            )
+            head = self.s3.meta.client.head_object(
+                Bucket=self.config.bucket_name, Key=self.s3_full_file_key, ChecksumMode='ENABLED'
+            )
+            self.record_upload(self.s3_full_file_key, size, head.get('ETag'))
+            if 'ChecksumSHA256' not in head:
+                # S3-compatible endpoints without checksum support: the HEAD was the existence check
+                return True
+            expected = file_composite_sha256_b64(self.gzip_path, chunksize)
+            if not checksums_match(expected, head['ChecksumSHA256']):
+                self.logger.error(f"Checksum mismatch for {self.s3_full_file_key}: expected {expected}, S3 has {head['ChecksumSHA256']}")
+                self._delete_s3_keys([self.s3_full_file_key])
+                return False
+            return True
+
+        with open(self.gzip_path, 'rb') as body:
+            response = self.s3.meta.client.put_object(
+                Bucket=self.config.bucket_name,
+                Key=self.s3_full_file_key,
+                Body=body,
+                Metadata=metadata,
+                ChecksumAlgorithm='SHA256',
+                ChecksumSHA256=checksum,
+            )
+        self.record_upload(self.s3_full_file_key, size, response.get('ETag'))
+        if 'ChecksumSHA256' not in response:
+            # S3-compatible endpoints without checksum support: fall back to an existence check
+            return self.verify_s3_upload(self.s3_full_file_key)
+        if response['ChecksumSHA256'] != checksum:
+            self.logger.error(f"Checksum mismatch for {self.s3_full_file_key}: sent {checksum}, S3 has {response['ChecksumSHA256']}")
+            return False
+        return True
+
     def upload_file(self) -> bool:
         """
         Upload the gzipped file to S3.
@@ -201,20 +673,32 @@ class S3Uploader():
 
         self.logger.info(f"Uploading {self.gzip_path} to S3")
         try:
-            # Clear the S3 path before uploading if requested
-            if self.clear_path_before_upload:
+            existing_objects = self.existing_objects
+            if existing_objects is None and (self.on_identical != 'upload' or (self.clear_path_before_upload and self.sync_path)):
+                existing_objects = self.list_s3_objects(self.s3_parent_path_file_key)
+
+            stale_keys = None
+            # Clear the S3 path before uploading if requested (sync: only list it, delete after the upload)
+            if self.clear_path_before_upload and existing_objects is not None:
+                stale_keys = list(existing_objects)
+            elif self.clear_path_before_upload:
                 s3_path_to_clear = self.s3_parent_path_file_key
                 self.logger.info(f"Clearing S3 path before upload: {s3_path_to_clear}")
-                self._clear_s3_path(s3_path_to_clear)
+                self.clear_s3_path(s3_path_to_clear)
 
-            self.bucket.upload_file(
-                Key=self.s3_full_file_key,
-                Filename=str(self.gzip_path)
-            )
+            identical_key = self._find_identical(existing_objects) if self.on_identical != 'upload' else None
+            if identical_key is not None and self._reuse_identical(identical_key):
+                if stale_keys is not None:
+                    stale_keys = [key for key in stale_keys if key != identical_key]
+                uploaded = True
+            else:
+                # S3 rejects the upload if the bytes do not match the checksum, so no HEAD is needed afterwards
+                uploaded = self._put_with_checksum()
 
-            # Verify the upload
-            if self.verify_s3_upload(self.s3_full_file_key):
+            if uploaded:
                 self.logger.info(f"Successfully uploaded and verified {self.s3_full_file_key}")
+                if stale_keys is not None:
+                    self.sync_s3_path(self.s3_parent_path_file_key, stale_keys, [self.s3_full_file_key])
                 return True
             else:
                 self.logger.error("Upload verification failed")
@@ -240,6 +724,110 @@ class S3Uploader():
             self.logger.error(f"Upload process failed: {str(e)}")
             raise
 
+    @classmethod
+    def upload_many(
+        cls,
+        gzip_paths: str | List[str],
+        entity_path: str,
+        dt_partition: datetime,
+        dt_now: Optional[datetime] = None,
+        clear_path_before_upload: bool = True,
+        bucket_name: Optional[str] = None,
+        part_metadata: Optional[Dict[str, Dict[str, str]]] = None,
+        part_sub_paths: Optional[Dict[str, str]] = None,
+        max_workers: int = 8,
+        sync_path: bool = False,
+        part_checksums: Optional[Dict[str, str]] = None,
+        on_identical: str = 'upload',
+    ) -> List[PartUploadResult]:
+        """
+        Upload all parts of one partition concurrently.
+
+        The partition prefix is cleared once, then every part is uploaded by its own
+        S3Uploader on a thread pool (all sharing the pooled client), so a multi-part day
+        takes about as long as its bytes need rather than parts x request latency.
+
+        Args:
+            gzip_paths: Path or list of paths returned by export_to_parquet_gzip
+            entity_path: The entity path for the files
+            dt_partition: datetime of the bq table partition. In UTC.
+            dt_now: Upload time used in the object names; defaults to now (UTC)
+            clear_path_before_upload: Clear the partition prefix once before the first part
+            bucket_name: Upload to this bucket instead of the configured one
+            part_metadata: S3 object metadata per local path (BigQueryExporter.part_metadata)
+            part_sub_paths: Hive sub-directory per local path (BigQueryExporter.part_sub_paths)
+            max_workers: Parts uploaded at the same time
+            sync_path: Instead of clearing first, list the prefix once and delete the old
+                objects only after every part is uploaded (see sync_s3_path); if a part
+                fails the old objects are kept
+            part_checksums: Base64 SHA256 per local path (BigQueryExporter.part_checksums)
+            on_identical: Reuse objects with the same content, see S3Uploader; the prefix is
+                then listed once for all parts and cleared like with sync_path
+        Returns:
+            List of PartUploadResult in the order of gzip_paths; a failed part does not
+            stop the others
+
+        Raises:
+            S3UploaderError: If clearing (or listing) the prefix fails (nothing is uploaded then)
+        """
+        if isinstance(gzip_paths, str):
+            gzip_paths = [gzip_paths]
+        dt_now = dt_now or datetime.now(timezone.utc)
+        part_metadata = part_metadata or {}
+        part_sub_paths = part_sub_paths or {}
+        part_checksums = part_checksums or {}
+
+        def uploader(gzip_path: str) -> 'S3Uploader':
+            return cls(
+                entity_path=entity_path,
+                dt_partition=dt_partition,
+                gzip_path=gzip_path,
+                dt_now=dt_now,
+                clear_path_before_upload=False,
+                bucket_name=bucket_name,
+                metadata=part_metadata.get(gzip_path),
+                sub_path=part_sub_paths.get(gzip_path),
+                checksum_sha256=part_checksums.get(gzip_path),
+                on_identical=on_identical,
+                existing_objects=existing_objects,
+                claimed_objects=claimed_objects,
+            )
+
+        existing_objects = None
+        claimed_objects = set()
+        first = uploader(None)
+        stale_keys = None
+        if on_identical != 'upload' or (clear_path_before_upload and sync_path):
+            existing_objects = first.list_s3_objects(first.s3_parent_path_file_key)
+        if clear_path_before_upload and existing_objects is not None:
+            stale_keys = list(existing_objects)
+        elif clear_path_before_upload:
+            first.clear_s3_path(first.s3_parent_path_file_key)
+
+        def upload(gzip_path: str) -> PartUploadResult:
+            part = uploader(gzip_path)
+            try:
+                success = part.run()
+                # Read the key after the upload: 'keep' points it at the reused object
+                return PartUploadResult(str(gzip_path), part.s3_full_file_key, success)
+            except S3UploaderError as e:
+                return PartUploadResult(str(gzip_path), part.s3_full_file_key, False, str(e))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(gzip_paths)))) as pool:
+            results = list(pool.map(upload, gzip_paths))
+
+        logger = logging.getLogger(__name__)
+        for result in results:
+            if not result.success:
+                logger.error(f"Part {result.gzip_path} -> {result.s3_key} failed: {result.error or 'not verified'}")
+        if stale_keys is not None:
+            if all(r.success for r in results):
+                first.sync_s3_path(first.s3_parent_path_file_key, stale_keys, [r.s3_key for r in results])
+            else:
+                logger.warning(f"Kept {len(stale_keys)} old object(s) in {first.s3_parent_path_file_key}: not every part was uploaded")
+        logger.info(f"Uploaded {sum(r.success for r in results)}/{len(results)} part(s) to {entity_path}")
+        return results
+
 
 class NaNEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -268,20 +856,13 @@ class S3LogsToBigQueryLoader:
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.env = Environment()
-        self.bucket_name = self.env.aws_s3_bucket_name
-        self.access_key = self.env.aws_s3_access_key
-        self.secret_key = self.env.aws_s3_secret_key
-        self.region_name = self.env.aws_s3_region_name
+        self.config = s3_config_from_env(self.env)
+        self.bucket_name = self.config.bucket_name
         self.bq_client = self.env.bq_client
         self._setup_s3()
 
     def _setup_s3(self):
-        session = Session(
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key,
-            region_name=self.region_name
-        )
-        self.s3 = session.resource('s3')
+        self.s3 = get_s3_resource(self.config)
         self.bucket = self.s3.Bucket(self.bucket_name)
 
     def load_to_bigquery(self, s3_prefix: str, bq_table: str, partition_dt: datetime):
@@ -293,9 +874,14 @@ class S3LogsToBigQueryLoader:
         partitioned_table = f"{bq_table}${partition_date}"
         
         self.logger.info(f"Listing files in s3://{self.bucket_name}/{s3_prefix} with suffix .log.gz or .parquet.gz")
+        index = get_listing_index()
+        # The partition is replaced by this load, so list it in full even if this run has listed it before
+        listing = index.list_objects(self.bucket, s3_prefix, refresh=True) if index is not None else self.bucket.objects.filter(Prefix=s3_prefix)
+        keys = [obj.key for obj in listing]
+        retired = retired_part_keys(self.bucket, keys)
         s3_files = [
-            obj.key for obj in self.bucket.objects.filter(Prefix=s3_prefix)
-            if obj.key.endswith('.log.gz') or obj.key.endswith('.parquet.gz')
+            key for key in keys
+            if (key.endswith('.log.gz') or key.endswith('.parquet.gz')) and key not in retired
         ]
         if not s3_files:
             self.logger.warning(f"No .log.gz or .parquet.gz files found in s3://{self.bucket_name}/{s3_prefix}")
@@ -0,0 +1,268 @@
+import gzip
+import logging
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import bigquery, storage
+
+from config.cred.enviroment import Environment
+from scr.AWSS3Loader import S3Uploader, S3UploaderError
+from scr.BigqueryToJson import align_table_to_schema, sanitize_schema
+
+
+@dataclass
+class GCSConfig:
+    """Configuration of the intermediate GCS-compatible bucket used by EXPORT DATA."""
+    bucket_name: str
+    prefix: str = 'bq_export_data'
+    endpoint_url: Optional[str] = None  # e.g. fake-gcs-server; None means Google Cloud Storage
+
+
+class ExportDataError(Exception):
+    """Raised when the server-side export or the GCS -> S3 transfer fails."""
+    pass
+
+
+class BigQueryExportDataEngine():
+    """
+    Server-side export: BigQuery writes Parquet with EXPORT DATA, Python only moves bytes.
+
+    The Parquet parts land in an intermediate GCS bucket and are then gzipped and
+    uploaded in parallel to the same S3 key layout S3Uploader uses
+    (entity/YYYY-MM-DD/{str8_hash}_HH:MM:SS.parquet.gz).
+
+    BigQuery writes its own Parquet types, so parts are cast to the entity schema on
+    the way through when one is given; the published schema then does not depend on
+    the engine.
+    """
+
+    def __init__(
+        self,
+        gcs_config: Optional[GCSConfig] = None,
+        max_workers: int = 4,
+        delete_intermediate: bool = True,
+        gcs_client: Optional[storage.Client] = None,
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            gcs_config: Intermediate bucket settings. Defaults to Environment().gcs_export_bucket_name.
+            max_workers: Number of objects transferred to S3 in parallel
+            delete_intermediate: Delete the GCS objects after a successful transfer
+            gcs_client: storage.Client to use; built from gcs_config and Environment otherwise
+        """
+        self._setup_logging()
+        self.env = Environment()
+        self.client = self.env.bq_client
+        self.gcs_config = gcs_config or self._load_gcs_config()
+        self.max_workers = max_workers
+        self.delete_intermediate = delete_intermediate
+        self.temp_dir = None
+        self._setup_gcs_client(gcs_client)
+
+    def _setup_logging(self) -> None:
+        """Configure logging for the engine."""
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        self.logger = logging.getLogger(__name__)
+
+    def _load_gcs_config(self) -> GCSConfig:
+        """Load intermediate bucket configuration from environment."""
+        bucket_name = getattr(self.env, 'gcs_export_bucket_name', None)
+        if not bucket_name:
+            raise ExportDataError("gcs_export_bucket_name is not configured in Environment")
+        return GCSConfig(
+            bucket_name=bucket_name,
+            endpoint_url=getattr(self.env, 'gcs_endpoint_url', None),
+        )
+
+    def _setup_gcs_client(self, gcs_client: Optional[storage.Client] = None) -> None:
+        """
+        Set up GCS client: anonymous against a local stand-in, otherwise with
+        Environment().gcs_credentials or, if not configured, application default credentials.
+        """
+        if gcs_client is not None:
+            self.gcs = gcs_client
+        elif self.gcs_config.endpoint_url:
+            self.gcs = storage.Client(
+                project=self.client.project,
+                credentials=AnonymousCredentials(),
+                client_options={'api_endpoint': self.gcs_config.endpoint_url},
+            )
+        else:
+            self.gcs = storage.Client(
+                project=self.client.project,
+                credentials=getattr(self.env, 'gcs_credentials', None),
+            )
+        self.gcs_bucket = self.gcs.bucket(self.gcs_config.bucket_name)
+
+    def build_export_statement(self, query: str, gcs_prefix: str, compression: str = 'SNAPPY') -> str:
+        """
+        Wrap a query into an EXPORT DATA statement writing Parquet to gcs_prefix.
+
+        Args:
+            query: SQL SELECT to export
+            gcs_prefix: Object prefix inside the intermediate bucket
+            compression: Parquet codec used by BigQuery
+        Returns:
+            str: EXPORT DATA statement
+        """
+        uri = f"gs://{self.gcs_config.bucket_name}/{gcs_prefix}*.parquet"
+        return f"""
+        EXPORT DATA OPTIONS(
+            uri='{uri}',
+            format='PARQUET',
+            compression='{compression}',
+            overwrite=true
+        ) AS
+        {query}
+        """
+
+    def export(self, query: str, run_id: Optional[str] = None, query_parameters: Optional[List] = None) -> str:
+        """
+        Run EXPORT DATA for a query.
+
+        Args:
+            query: SQL SELECT to export
+            run_id: Unique folder name for this run; generated if omitted
+            query_parameters: bigquery.ScalarQueryParameter list for @name references in query
+        Returns:
+            str: GCS prefix holding the exported Parquet objects
+        """
+        run_id = run_id or f"{datetime.now(timezone.utc):%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+        gcs_prefix = f"{self.gcs_config.prefix}/{run_id}/"
+        statement = self.build_export_statement(query, gcs_prefix)
+        self.logger.info(f"Running EXPORT DATA to gs://{self.gcs_config.bucket_name}/{gcs_prefix}")
+        try:
+            job_config = bigquery.QueryJobConfig(query_parameters=query_parameters or [])
+            self.client.query(statement, job_config=job_config).result()
+        except Exception as e:
+            self.logger.error(f"EXPORT DATA failed: {e}")
+            raise ExportDataError(f"EXPORT DATA failed: {e}")
+        return gcs_prefix
+
+    def _download_gzipped(self, blob, gz_path: Path, schema: Optional[pa.Schema] = None) -> Path:
+        """
+        Stream one GCS object into a local .parquet.gz without holding it in memory.
+
+        With a (sanitized) schema the Parquet is rewritten batch by batch, cast to it;
+        otherwise its bytes are copied as they are.
+        """
+        with blob.open('rb') as src, open(gz_path, 'wb') as raw:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as dst:
+                if schema is None:
+                    shutil.copyfileobj(src, dst, 8 * 1024 * 1024)
+                    return gz_path
+                parquet_file = pq.ParquetFile(src)
+                with pq.ParquetWriter(dst, schema, compression='snappy') as writer:
+                    for batch in parquet_file.iter_batches():
+                        writer.write_table(align_table_to_schema(pa.Table.from_batches([batch]), schema))
+        return gz_path
+
+    def transfer_to_s3(
+        self,
+        gcs_prefix: str,
+        entity_path: str,
+        dt_partition: datetime,
+        dt_now: Optional[datetime] = None,
+        clear_path_before_upload: bool = True,
+        schema: Optional[pa.Schema] = None,
+        bucket_name: Optional[str] = None,
+    ) -> bool:
+        """
+        Copy every Parquet object under gcs_prefix to the S3 partition in parallel.
+
+        The partition's old objects are deleted only after every part is uploaded
+        (S3Uploader.upload_many with sync_path), so a failed transfer keeps them.
+
+        Args:
+            gcs_prefix: Object prefix returned by export()
+            entity_path: S3 entity path, as for S3Uploader
+            dt_partition: Partition date (UTC)
+            dt_now: Upload time used in the object names; defaults to now (UTC)
+            clear_path_before_upload: Replace the objects already in the S3 partition
+            schema: Entity schema the parts are cast to (BigQuery's own Parquet types otherwise)
+            bucket_name: Upload to this bucket instead of the configured one
+        Returns:
+            bool: True if every part was uploaded and verified
+        """
+        dt_now = dt_now or datetime.now(timezone.utc)
+        blobs = [b for b in self.gcs.list_blobs(self.gcs_config.bucket_name, prefix=gcs_prefix)
+                 if b.name.endswith('.parquet')]
+        self.logger.info(f"Found {len(blobs)} exported object(s) under gs://{self.gcs_config.bucket_name}/{gcs_prefix}")
+        if not blobs:
+            return False
+
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.mkdtemp(prefix='bq_export_data_')
+        temp_dir = Path(self.temp_dir)
+        gz_paths = [temp_dir / f"{Path(b.name).name}.gz" for b in blobs]
+        if schema is not None:
+            schema = sanitize_schema(schema)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(lambda idx: self._download_gzipped(blobs[idx], gz_paths[idx], schema), range(len(blobs))))
+
+            results = S3Uploader.upload_many(
+                [str(p) for p in gz_paths],
+                entity_path=entity_path,
+                dt_partition=dt_partition,
+                dt_now=dt_now,
+                clear_path_before_upload=clear_path_before_upload,
+                bucket_name=bucket_name,
+                max_workers=self.max_workers,
+                sync_path=True,
+            )
+        except S3UploaderError as e:
+            self.logger.error(f"GCS -> S3 transfer failed: {e}")
+            raise ExportDataError(f"GCS -> S3 transfer failed: {e}")
+
+        success = all(r.success for r in results)
+        if success and self.delete_intermediate:
+            for blob in blobs:
+                blob.delete()
+            self.logger.info(f"Deleted {len(blobs)} intermediate object(s) from GCS")
+        self.logger.info(f"Transferred {sum(r.success for r in results)}/{len(blobs)} part(s) to S3 entity {entity_path}")
+        return success
+
+    def run(
+        self,
+        query: str,
+        entity_path: str,
+        dt_partition: datetime,
+        dt_now: Optional[datetime] = None,
+        clear_path_before_upload: bool = True,
+        query_parameters: Optional[List] = None,
+        schema: Optional[pa.Schema] = None,
+    ) -> bool:
+        """
+        Export a query with EXPORT DATA and transfer the result to S3.
+
+        Args:
+            schema: Entity schema the parts are cast to, see transfer_to_s3
+
+        Returns:
+            bool: True if all steps completed successfully
+        """
+        gcs_prefix = self.export(query, query_parameters=query_parameters)
+        return self.transfer_to_s3(
+            gcs_prefix,
+            entity_path=entity_path,
+            dt_partition=dt_partition,
+            dt_now=dt_now,
+            clear_path_before_upload=clear_path_before_upload,
+            schema=schema,
+        )
@@ -1,6 +1,13 @@
-from typing import Iterable, Optional
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
 from config.cred.enviroment import Environment
 import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# How NUMERIC/BIGNUMERIC query results are stored in the output parquet:
+# 'decimal' keeps decimal128/256, the other modes convert whole columns and fail if a value would change.
+NUMERIC_MODES = ("decimal", "scaled_int64", "float64")
 
 
 def _map_bq_type_to_pa(bq_type: str, precision: Optional[int] = None, scale: Optional[int] = None) -> pa.DataType:
@@ -99,4 +106,90 @@ def get_pyarrow_schema_from_bq(table_id: str) -> pa.Schema | None:
         raise RuntimeError("google-cloud-bigquery is not installed; provide a client explicitly")
     else:
         table = client.get_table(table_id)
-        return bq_schema_to_pyarrow(table.schema) 
\ No newline at end of file
+        return bq_schema_to_pyarrow(table.schema) 
+
+class NumericPrecisionError(ValueError):
+    """Raised when a decimal column chosen for float64/scaled_int64 would lose precision."""
+    pass
+
+
+def _narrow_decimal_column(column, numeric_mode: str, numeric_scale: int):
+    """
+    Convert one decimal column to the type of numeric_mode, or raise if any value would change.
+
+    The exactness check is vectorized: the converted column is cast back to the
+    decimal type and compared with the original (pc.equal). float64 goes through the
+    decimal text, so every value becomes the nearest double (12.34 stays 12.34).
+
+    Raises:
+        NumericPrecisionError: If a value does not survive the round trip
+    """
+    try:
+        if numeric_mode == "float64":
+            narrowed = pc.cast(pc.cast(column, pa.string()), pa.float64())
+            round_trip = pc.cast(narrowed, column.type, safe=True)
+        else:
+            # 18 digits at the target scale always fit into int64 once scaled
+            rescaled = pc.cast(column, pa.decimal128(18, numeric_scale), safe=True)
+            factor = pa.scalar(Decimal(10) ** numeric_scale, pa.decimal128(numeric_scale + 1, 0))
+            narrowed = pc.cast(pc.multiply(rescaled, factor), pa.int64(), safe=True)
+            round_trip = pc.cast(pc.divide(pc.cast(narrowed, pa.decimal128(19, 0)), factor), column.type, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise NumericPrecisionError(f"values do not fit {numeric_mode} exactly: {e}")
+    # all() is null for empty or all-null columns, nothing to lose there
+    if pc.all(pc.equal(round_trip, column)).as_py() is False:
+        raise NumericPrecisionError(f"values do not fit {numeric_mode} exactly")
+    return narrowed
+
+
+def narrow_decimal_columns(
+    table: pa.Table,
+    numeric_mode: str = "decimal",
+    numeric_scale: int = 2,
+    decimal_columns: Iterable[str] = (),
+) -> Tuple[pa.Table, Dict[str, pa.DataType]]:
+    """
+    Store decimal columns as scaled int64 or float64, checking that every value stays exact.
+
+    The type of each column is decided up front: columns in decimal_columns stay
+    decimal, every other decimal column gets the type of numeric_mode on every run,
+    so the published schema never changes from one day to the next. A converted
+    column whose values would change fails the export instead of being rounded;
+    money columns that need more digits belong in decimal_columns.
+
+    Args:
+        table: pyarrow.Table with query results
+        numeric_mode: One of NUMERIC_MODES
+        numeric_scale: Fractional digits kept by 'scaled_int64' (value * 10**scale)
+        decimal_columns: Decimal columns kept as decimal
+    Returns:
+        Tuple of (table, {column name: resulting pyarrow type}) for every decimal column
+
+    Raises:
+        ValueError: Unknown numeric_mode
+        NumericPrecisionError: A converted column would lose precision
+    """
+    if numeric_mode not in NUMERIC_MODES:
+        raise ValueError(f"numeric_mode must be one of {NUMERIC_MODES}, got {numeric_mode!r}")
+
+    resolved: Dict[str, pa.DataType] = {}
+    if numeric_mode == "decimal":
+        return table, resolved
+
+    decimal_columns = set(decimal_columns)
+    for idx, field in enumerate(table.schema):
+        if not pa.types.is_decimal(field.type):
+            continue
+        if field.name in decimal_columns:
+            resolved[field.name] = field.type
+            continue
+        try:
+            narrowed = _narrow_decimal_column(table.column(idx), numeric_mode, numeric_scale)
+        except NumericPrecisionError as e:
+            raise NumericPrecisionError(f"Column {field.name}: {e}; list it in decimal_columns to keep it exact")
+        new_field = pa.field(field.name, narrowed.type, nullable=field.nullable)
+        if numeric_mode == "scaled_int64":
+            new_field = new_field.with_metadata({b"numeric_scale": str(numeric_scale).encode()})
+        table = table.set_column(idx, new_field, narrowed)
+        resolved[field.name] = narrowed.type
+    return table, resolved
@@ -1,15 +1,25 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import tempfile
 from config.cred.enviroment import Environment
-from typing import Optional, List
+from typing import Any, Dict, Iterator, Optional, List, Tuple
+from dataclasses import dataclass
 from pathlib import Path
+import base64
 import gzip
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pds
 import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+from scr.BigqueryShcemaToPyarrow import narrow_decimal_columns
+from scr.QueryTemplates import bound_parameters, normalize_sql, parameters_key, render
 
 
 class DateTimeEncoder(json.JSONEncoder):
@@ -20,13 +30,124 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
     
 
+# Export paths available in BigQueryExporter.export_to_parquet
+EXPORT_MODES = ('in_memory', 'streaming')
+
+
+class SchemaAlignmentError(ValueError):
+    """Raised when query results cannot be cast to the target schema."""
+    pass
+
+
+@dataclass
+class ExportPlan:
+    """Export mode, part size and parallelism chosen from the size of the query result."""
+    mode: str
+    estimated_bytes: Optional[int]  # logical bytes of the result table
+    max_parquet_size_bytes: Optional[int]
+    max_workers: int
+    reason: str
+
+
+class _HashingWriter():
+    """File wrapper that feeds every written byte into a hash."""
+
+    def __init__(self, fileobj, digest):
+        self.fileobj = fileobj
+        self.digest = digest
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self) -> None:
+        self.fileobj.flush()
+
+
+logger = logging.getLogger(__name__)
+
+
+def sanitize_schema(schema: pa.Schema) -> pa.Schema:
+    """Replace unsupported target types (null, list<null>) with compatible types (string)."""
+    logger.debug("Sanitizing schema to replace unsupported null types")
+    new_fields = []
+    for f in schema:
+        target_type = f.type
+        if pa.types.is_null(target_type):
+            target_type = pa.string()
+            logger.debug(f"Replaced null type with string for field: {f.name}")
+        elif pa.types.is_list(target_type) and pa.types.is_null(target_type.value_type):
+            target_type = pa.list_(pa.string())
+            logger.debug(f"Replaced list<null> with list<string> for field: {f.name}")
+        new_fields.append(pa.field(f.name, target_type, nullable=True, metadata=f.metadata))
+    return pa.schema(new_fields)
+
+
+def align_table_to_schema(table: pa.Table, schema: pa.Schema, strict: bool = False) -> pa.Table:
+    """
+    Add missing columns, reorder and cast a table to an already sanitized schema.
+
+    A column that cannot be cast is logged as a warning and left with its query type,
+    unless strict is set.
+
+    Args:
+        table: Query result
+        schema: Target schema, see sanitize_schema
+        strict: Raise instead of warning when a column cannot be cast
+
+    Raises:
+        SchemaAlignmentError: If strict and a column cannot be cast to its target type
+    """
+    # Add missing columns as typed null arrays
+    for field in schema:
+        if field.name not in table.column_names:
+            col = pa.array([None] * table.num_rows, type=field.type)
+            table = table.append_column(field.name, col)
+            logger.debug(f"Added missing column: {field.name}")
+    # Reorder and cast
+    table = table.select([f.name for f in schema])
+    try:
+        table = table.cast(schema, safe=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        mismatched = [
+            f"{f.name}: {table.schema.field(f.name).type} -> {f.type}"
+            for f in schema if table.schema.field(f.name).type != f.type
+        ]
+        message = f"Cannot cast query result to schema ({', '.join(mismatched)}): {e}"
+        if strict:
+            logger.error(f"Schema alignment failed: {message}")
+            raise SchemaAlignmentError(message)
+        logger.warning(f"Schema alignment warning: {message}")
+        return table
+    logger.debug("Schema alignment completed successfully")
+    return table
+
+
 # class BigQueryExporter(BQLoader):
 class BigQueryExporter():
+    # Thresholds used by plan_export
+    IN_MEMORY_MAX_BYTES = 512 * 1024 * 1024
+    LARGE_EXPORT_PART_BYTES = 256 * 1024 * 1024
+    MAX_UPLOAD_WORKERS = 8
+
     def __init__(self):
         # super().__init__(name=None)
         self.client = Environment().bq_client
         self.env = Environment()
         self.temp_dir = None
+        self.last_plan: Optional[ExportPlan] = None
+        # Per-part S3 object metadata (e.g. key ranges), keyed by local .parquet / .parquet.gz path
+        self.part_metadata: Dict[str, Dict[str, str]] = {}
+        # Hive sub-directory of each part (e.g. 'hour=05'), keyed by local .parquet.gz path
+        self.part_sub_paths: Dict[str, str] = {}
+        # Base64 SHA256 of each .parquet.gz, computed while compressing (sent as the S3 upload checksum)
+        self.part_checksums: Dict[str, str] = {}
+        # cache_hit / bytes billed / slot time of every query job run by this exporter
+        self.job_stats: List[Dict[str, Any]] = []
+        # Raise SchemaAlignmentError when a column does not cast to the target schema, instead of a warning
+        self.strict_schema = False
+        # Jobs already run by estimate_result_bytes, keyed by (normalized query text, parameters); the export reads their result
+        self._finished_jobs: Dict[Tuple[str, Tuple], bigquery.QueryJob] = {}
         self._setup_logging()
         '''
         self.dt, self.dt_raw -> UTC from AirFlow bash comand parameters
@@ -53,7 +174,14 @@ class BigQueryExporter():
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Clean up temporary directory when exiting context."""
-        pass
+        if self.job_stats:
+            cached = sum(1 for stats in self.job_stats if stats['cache_hit'])
+            billed = sum(stats['total_bytes_billed'] or 0 for stats in self.job_stats)
+            slot_ms = sum(stats['slot_millis'] or 0 for stats in self.job_stats)
+            self.logger.info(
+                f"Query jobs: {len(self.job_stats)} ({cached} served from cache), "
+                f"{billed:,} bytes billed, {slot_ms / 1000:.1f} slot seconds"
+            )
         # if self.temp_dir and os.path.exists(self.temp_dir):
         #     shutil.rmtree(self.temp_dir)
 
@@ -77,13 +205,39 @@ class BigQueryExporter():
             self.logger.error(f"Error getting table schema: {str(e)}")
             raise
 
-    def build_query(self, bq_table_addres: str, where_condition: str = 'TRUE') -> str:
+    def render_query(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        identifiers: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Fill a query template (see scr.QueryTemplates.render).
+
+        Args:
+            sql: Template with @name@ identifier placeholders and @name parameter references
+            params: Values bound as BigQuery query parameters
+            identifiers: Table/column names substituted into the text
+
+        Returns:
+            RenderedQuery: Normalized query text carrying its parameters; pass it to any export method as is
+        """
+        query, _ = render(sql, params=params, identifiers=identifiers)
+        return query
+
+    def build_query(
+        self,
+        bq_table_addres: str,
+        where_condition: str = 'TRUE',
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
         """
         Build SQL query using table schema.
 
         Args:
             bq_table_addres: BigQuery table full path
-            where_condition: A condition for filter data in the table
+            where_condition: A condition for filter data in the table; may reference @name parameters
+            params: Values for the @name parameters of where_condition
 
         Returns:
             str: SQL query string
@@ -96,42 +250,476 @@ class BigQueryExporter():
         FROM `{bq_table_addres}`
         WHERE {where_condition} 
         """
-        self.logger.info(f"Built query with {len(columns)} columns and condition: {where_condition}")
-        return query
+        self.logger.info(f"Built query with {len(columns)} columns and condition: {where_condition} {params or ''}")
+        return self.render_query(query, params=params)
+
+    def _job_config(self, query: str, **kwargs) -> bigquery.QueryJobConfig:
+        """Job config carrying the parameters bound to this query (see render_query)."""
+        return bigquery.QueryJobConfig(query_parameters=bound_parameters(query), **kwargs)
+
+    @staticmethod
+    def _job_key(query: str) -> Tuple[str, Tuple]:
+        """Key of a query job: the normalized text and the values bound to it."""
+        return normalize_sql(query), parameters_key(bound_parameters(query))
+
+    def _query_job(self, query: str) -> bigquery.QueryJob:
+        """Run a query with its bound parameters, wait for it and record its job statistics."""
+        job = self.client.query(normalize_sql(query), job_config=self._job_config(query))
+        job.result()
+        stats = {
+            'job_id': job.job_id,
+            'cache_hit': bool(job.cache_hit),
+            'total_bytes_billed': job.total_bytes_billed,
+            'total_bytes_processed': job.total_bytes_processed,
+            'slot_millis': job.slot_millis,
+        }
+        self.job_stats.append(stats)
+        self.logger.info(
+            f"Query job {job.job_id}: cache_hit={stats['cache_hit']}, "
+            f"bytes billed={stats['total_bytes_billed'] or 0:,}, slot ms={stats['slot_millis'] or 0:,}"
+        )
+        return job
+
+    def run_query(self, query: str):
+        """
+        Run a query with its bound parameters, wait for it and record its job statistics.
+
+        A job already run for the same text and parameters by estimate_result_bytes is not
+        run again; its result is read instead.
+
+        Returns:
+            google.cloud.bigquery.table.RowIterator
+        """
+        job = self._finished_jobs.pop(self._job_key(query), None) or self._query_job(query)
+        return job.result()
+
+    def query_max(
+        self,
+        bq_table_addres: str,
+        column: str,
+        where_condition: str = 'TRUE',
+        params: Optional[Dict[str, Any]] = None,
+        require_not_null: bool = False,
+    ) -> Optional[str]:
+        """
+        Get the maximum of a column as a string usable in a query literal.
+
+        Args:
+            bq_table_addres: BigQuery table full path
+            column: Column to aggregate (e.g. an ingestion timestamp)
+            where_condition: A condition for filter data in the table
+            params: Values for the @name parameters of where_condition
+            require_not_null: Raise if a matching row has NULL in column, e.g. for a watermark
+                column: `column <= @watermark_to` never selects such a row
+
+        Returns:
+            str: CAST(MAX(column) AS STRING), or None if no rows match
+
+        Raises:
+            ValueError: If require_not_null and column is NULL in a matching row
+        """
+        query = f"""
+        SELECT CAST(MAX(`{column}`) AS STRING) AS max_value, COUNTIF(`{column}` IS NULL) AS null_count
+        FROM `{bq_table_addres}`
+        WHERE {where_condition}
+        """
+        rows = list(self.run_query(self.render_query(query, params=params)))
+        max_value = rows[0].max_value if rows else None
+        null_count = (rows[0].null_count or 0) if rows else 0
+        self.logger.info(f"MAX({column}) for condition {where_condition}: {max_value} ({null_count} NULL)")
+        if require_not_null and null_count:
+            raise ValueError(
+                f"{null_count} row(s) of {bq_table_addres} have NULL {column} for condition {where_condition}; "
+                f"they would never pass a watermark filter on {column}"
+            )
+        return max_value
+
+    def materialize_staging_table(
+        self,
+        bq_table_addres: str,
+        staging_table_addres: str,
+        where_condition: str,
+        partition_by: str,
+        expiration: timedelta = timedelta(days=1),
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Create (or replace) a filtered, partitioned copy of a table that expires automatically.
+
+        Expensive predicates (e.g. JSON parsing) run once for a whole date range;
+        per-day exports then read single pruned partitions of the staging table.
+
+        Args:
+            bq_table_addres: Source table full path
+            staging_table_addres: Staging table full path
+            where_condition: Filter applied once while copying
+            partition_by: Partition expression, e.g. 'TIMESTAMP_TRUNC(event_time, DAY)'
+            expiration: Lifetime of the staging table
+            params: Values for the @name parameters of where_condition
+
+        Returns:
+            str: staging_table_addres
+        """
+        expiration_hours = max(1, int(expiration.total_seconds() // 3600))
+        query = f"""
+        CREATE OR REPLACE TABLE `{staging_table_addres}`
+        PARTITION BY {partition_by}
+        OPTIONS (expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL {expiration_hours} HOUR))
+        AS
+        SELECT *
+        FROM `{bq_table_addres}`
+        WHERE {where_condition}
+        """
+        self.logger.info(f"Materializing staging table {staging_table_addres} (expires in {expiration_hours}h) {params or ''}")
+        self.run_query(self.render_query(query, params=params))
+        self.logger.info(f"Staging table ready: {staging_table_addres}")
+        return staging_table_addres
+
+    def get_partitions(self, bq_table_addres: str, partition_column: Optional[str] = None) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Load row count and last modification time of every partition of a table.
+
+        One INFORMATION_SCHEMA.PARTITIONS query per table; nothing is scanned.
+
+        Args:
+            bq_table_addres: BigQuery table full path (project.dataset.table)
+            partition_column: Column the export selects days by (e.g. 'created_at'). The partition
+                state only tells whether those days changed if the table is partitioned on it.
+
+        Returns:
+            Dict of partition_id -> {'source-rows': ..., 'source-last-modified': ...}
+            (keys usable as S3 object metadata), or None if the table is not partitioned
+            on partition_column (nothing can be skipped then)
+        """
+        if partition_column is not None:
+            partitioning = self.client.get_table(bq_table_addres).time_partitioning
+            partition_field = partitioning.field if partitioning else None
+            if partition_field != partition_column:
+                self.logger.warning(
+                    f"{bq_table_addres} is partitioned on {partition_field or 'ingestion time'}, not {partition_column}: "
+                    f"partition state cannot tell unchanged days"
+                )
+                return None
+        project_dataset, table_name = bq_table_addres.replace('`', '').rsplit('.', 1)
+        query = f"""
+        SELECT partition_id, total_rows, CAST(last_modified_time AS STRING) AS last_modified
+        FROM `{project_dataset}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name = @table_name
+        """
+        query = self.render_query(query, params={'table_name': table_name})
+        partitions = {
+            row.partition_id: {
+                'source-rows': str(row.total_rows or 0),
+                'source-last-modified': row.last_modified or '',
+            }
+            for row in self.run_query(query)
+        }
+        self.logger.info(f"Loaded {len(partitions)} partition(s) of {bq_table_addres}")
+        return partitions
+
+    def get_partition_bytes(self, bq_table_addres: str) -> Dict[str, int]:
+        """
+        Logical size of every partition of a table (INFORMATION_SCHEMA.PARTITIONS).
+
+        Returns:
+            Dict of partition_id -> total_logical_bytes
+        """
+        project_dataset, table_name = bq_table_addres.replace('`', '').rsplit('.', 1)
+        query = f"""
+        SELECT partition_id, total_logical_bytes
+        FROM `{project_dataset}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name = @table_name
+        """
+        query = self.render_query(query, params={'table_name': table_name})
+        return {row.partition_id: int(row.total_logical_bytes or 0) for row in self.run_query(query)}
+
+    @staticmethod
+    def partition_state(partitions: Dict[str, Dict[str, str]], period: str) -> Optional[Dict[str, str]]:
+        """
+        Combined state of the partitions covering a period.
+
+        Args:
+            partitions: Result of get_partitions
+            period: 'YYYYMMDD' for a day or 'YYYYMM' for a month
+
+        Returns:
+            Dict with 'source-rows' (sum) and 'source-last-modified' (max);
+            'source-rows' is '0' if the table is partitioned and has no data for the period.
+            None if the state is unknown (rows still in the streaming buffer).
+        """
+        if '__UNPARTITIONED__' in partitions:
+            return None
+        matching = [state for pid, state in partitions.items() if pid.startswith(period)]
+        if not matching:
+            # Coarser partitioning (e.g. a day of a monthly partitioned table) or no partitioning at all
+            matching = [state for pid, state in partitions.items() if period.startswith(pid) or pid == '__NULL__']
+        if not matching:
+            return {'source-rows': '0', 'source-last-modified': ''}
+        return {
+            'source-rows': str(sum(int(state['source-rows']) for state in matching)),
+            'source-last-modified': max(state['source-last-modified'] for state in matching),
+        }
 
     # Option 1: Direct BigQuery → Arrow → Parquet helpers
-    def to_arrow(self, query: str) -> pa.Table:
-        """Execute query and return a PyArrow Table (uses BQ Storage API if available)."""
+    def to_arrow(self, query: str, schema: Optional[pa.Schema] = None) -> pa.Table:
+        """Execute query and return a PyArrow Table (uses BQ Storage API if available), aligned to schema if given."""
         self.logger.info("Executing BigQuery query and converting to Arrow table")
         try:
-            job = self.client.query(query)
-            result = job.result()
-            table = result.to_arrow()
+            table = self.run_query(query).to_arrow()
             self.logger.info(f"Successfully converted query result to Arrow table with {table.num_rows} rows and {table.num_columns} columns")
-            return table
         except Exception as e:
             self.logger.error(f"Failed to convert query result to Arrow table: {str(e)}")
             raise
+        if schema is not None:
+            table = self._align_table_to_schema(table, self._sanitize_schema(schema))
+        return table
 
     def _sanitize_schema(self, schema: pa.Schema) -> pa.Schema:
         """Replace unsupported target types (null, list<null>) with compatible types (string)."""
-        self.logger.debug("Sanitizing schema to replace unsupported null types")
-        new_fields = []
-        for f in schema:
-            target_type = f.type
-            try:
-                if pa.types.is_null(target_type):
-                    target_type = pa.string()
-                    self.logger.debug(f"Replaced null type with string for field: {f.name}")
-                elif pa.types.is_list(target_type):
-                    value_type = target_type.value_type
-                    if pa.types.is_null(value_type):
-                        target_type = pa.list_(pa.string())
-                        self.logger.debug(f"Replaced list<null> with list<string> for field: {f.name}")
-            except Exception:
-                pass
-            new_fields.append(pa.field(f.name, target_type, nullable=True))
-        return pa.schema(new_fields)
+        return sanitize_schema(schema)
+
+    def _apply_numeric_mode(
+        self,
+        table: pa.Table,
+        schema: Optional[pa.Schema],
+        numeric_mode: str,
+        numeric_scale: int,
+        decimal_columns: Optional[List[str]] = None,
+    ) -> tuple[pa.Table, Optional[pa.Schema]]:
+        """
+        Narrow decimal columns and make the target schema follow the converted ones.
+
+        The conversion of a column is fixed by numeric_mode and decimal_columns, never by
+        the day's values, so a schema declaring NUMERIC columns as decimal (e.g. from
+        get_pyarrow_schema_from_bq) gets the same converted types on every run.
+
+        Raises:
+            NumericPrecisionError: If a converted column would lose precision
+            ValueError: If numeric_mode='scaled_int64' meets a column the schema declares as
+                a non-decimal, non-integer type
+        """
+        keep_decimal = set(decimal_columns or [])
+        table, resolved = narrow_decimal_columns(
+            table,
+            numeric_mode=numeric_mode,
+            numeric_scale=numeric_scale,
+            decimal_columns=keep_decimal,
+        )
+        converted = {}
+        for name, resolved_type in resolved.items():
+            self.logger.info("Numeric column %s stored as %s (numeric_mode=%s)", name, resolved_type, numeric_mode)
+            if schema is None or name not in schema.names or name in keep_decimal:
+                continue
+            declared = schema.field(name).type
+            if pa.types.is_decimal(declared):
+                converted[name] = table.schema.field(name)
+            elif numeric_mode == 'scaled_int64' and not pa.types.is_integer(declared):
+                raise ValueError(f"Column {name} is stored as scaled_int64 but the schema declares {declared}")
+        if converted:
+            schema = pa.schema([converted.get(f.name, f) for f in schema])
+        return table, schema
+
+    def _align_table_to_schema(self, table: pa.Table, schema: pa.Schema) -> pa.Table:
+        """Add missing columns, reorder and cast a table to an already sanitized schema (see align_table_to_schema)."""
+        return align_table_to_schema(table, schema, strict=self.strict_schema)
+
+    def _base_prefix(self, bq_table_addres: Optional[str]) -> Path:
+        """Temp-dir path prefix for the files of one export."""
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_table_name = (bq_table_addres or "query").replace("`", "").replace(".", "_")
+        return Path(self.temp_dir) / f"export_{safe_table_name}_{ts}"
+
+    @staticmethod
+    def _part_path(base_prefix: Path, idx: int) -> Path:
+        """Path of the idx-th parquet part for a multi-file export."""
+        return base_prefix.parent / f"{base_prefix.name}_part{idx:02d}.parquet"
+
+    def estimate_query_bytes(self, query: str) -> Optional[int]:
+        """
+        Bytes a query would scan, from a BigQuery dry run (free, nothing is executed).
+
+        This is the cost of the query, not the size of its result; see estimate_result_bytes.
+
+        Args:
+            query: SQL text
+
+        Returns:
+            int: Bytes the query would process, or None if the dry run failed
+        """
+        try:
+            job_config = self._job_config(query, dry_run=True, use_query_cache=False)
+            job = self.client.query(normalize_sql(query), job_config=job_config)
+            return job.total_bytes_processed
+        except Exception as e:
+            self.logger.warning(f"Dry run failed, query size is unknown: {e}")
+            return None
+
+    def estimate_result_bytes(self, query: str) -> Optional[int]:
+        """
+        Size of a query's result: the query is run and the size of its result table read.
+
+        The job is kept, so the export that follows (run_query with the same text and
+        parameters) reads this result instead of running the query again.
+
+        Args:
+            query: SQL text
+
+        Returns:
+            int: Logical bytes of the result table, or None if the size is unknown
+        """
+        try:
+            job = self._query_job(query)
+        except Exception as e:
+            self.logger.warning(f"Query failed, result size is unknown: {e}")
+            return None
+        self._finished_jobs[self._job_key(query)] = job
+        if job.destination is None:
+            return None
+        try:
+            return self.client.get_table(job.destination).num_bytes
+        except Exception as e:
+            self.logger.warning(f"Could not read the result table of job {job.job_id}: {e}")
+            return None
+
+    def plan_export(self, query: str, max_parquet_size_bytes: Optional[int] = None) -> ExportPlan:
+        """
+        Choose export mode, part size and parallelism from the size of the query result.
+
+        The query is run once here (estimate_result_bytes); the export reads its result.
+
+        Args:
+            query: SQL text
+            max_parquet_size_bytes: Part size requested by the caller; kept if set
+
+        Returns:
+            ExportPlan: The chosen plan, also stored in self.last_plan and logged
+        """
+        estimated_bytes = self.estimate_result_bytes(query)
+
+        if estimated_bytes is None:
+            mode = 'streaming'
+            reason = "size unknown, streaming keeps memory bounded"
+        elif estimated_bytes <= self.IN_MEMORY_MAX_BYTES:
+            mode = 'in_memory'
+            reason = f"result {estimated_bytes / (1024 * 1024):.1f} MB <= in-memory limit"
+        else:
+            mode = 'streaming'
+            reason = f"result {estimated_bytes / (1024 * 1024):.1f} MB > in-memory limit"
+
+        part_size = max_parquet_size_bytes
+        if part_size is None and estimated_bytes and estimated_bytes > self.LARGE_EXPORT_PART_BYTES:
+            part_size = self.LARGE_EXPORT_PART_BYTES
+
+        parts = 1
+        if part_size and estimated_bytes:
+            parts = max(1, -(-estimated_bytes // part_size))
+        max_workers = min(self.MAX_UPLOAD_WORKERS, parts)
+
+        plan = ExportPlan(
+            mode=mode,
+            estimated_bytes=estimated_bytes,
+            max_parquet_size_bytes=part_size,
+            max_workers=max_workers,
+            reason=reason,
+        )
+        self.last_plan = plan
+        self.logger.info(
+            "Export plan: mode=%s, estimated_bytes=%s, part_size=%s, max_workers=%s (%s)",
+            plan.mode,
+            plan.estimated_bytes,
+            plan.max_parquet_size_bytes,
+            plan.max_workers,
+            plan.reason,
+        )
+        return plan
+
+    def iter_parquet_parts(
+        self,
+        query: str,
+        base_prefix: Path,
+        schema: Optional[pa.Schema] = None,
+        compression: str = 'snappy',
+        use_compliant_nested_type: bool = True,
+        max_parquet_size_bytes: Optional[int] = None,
+    ) -> Iterator[Path]:
+        """
+        Write query results batch by batch and yield every parquet part once it is closed.
+
+        Only one record batch is held in memory. Parts roll over at max_parquet_size_bytes
+        of in-memory batch size, the same measure _split_table_by_size uses. Parts are
+        always named <base_prefix>_partNN.parquet.
+        """
+        self.logger.info("Executing BigQuery query and streaming record batches to parquet")
+        result = self.run_query(query)
+        if schema is not None:
+            schema = self._sanitize_schema(schema)
+
+        part_idx = 0
+        writer = None
+        current_size = 0
+        total_rows = 0
+        try:
+            for batch in result.to_arrow_iterable():
+                chunk = pa.Table.from_batches([batch])
+                if schema is not None:
+                    chunk = self._align_table_to_schema(chunk, schema)
+                chunk_size = chunk.nbytes
+                if writer is not None and max_parquet_size_bytes and current_size + chunk_size > max_parquet_size_bytes:
+                    writer.close()
+                    writer = None
+                    yield self._part_path(base_prefix, part_idx)
+                if writer is None:
+                    part_idx += 1
+                    writer = pq.ParquetWriter(
+                        str(self._part_path(base_prefix, part_idx)),
+                        chunk.schema,
+                        compression=compression,
+                        use_compliant_nested_type=use_compliant_nested_type,
+                    )
+                    current_size = 0
+                writer.write_table(chunk)
+                current_size += chunk_size
+                total_rows += chunk.num_rows
+            if writer is not None:
+                writer.close()
+                writer = None
+                yield self._part_path(base_prefix, part_idx)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if part_idx == 0:
+            # Empty result: still produce one (empty) file like the in-memory path does
+            part_idx = 1
+            empty = (schema or pa.schema([])).empty_table()
+            self._write_table_to_parquet(empty, self._part_path(base_prefix, part_idx), compression, use_compliant_nested_type)
+            yield self._part_path(base_prefix, part_idx)
+
+        self.logger.info(f"Streamed {total_rows} rows into {part_idx} parquet file(s)")
+
+    def _export_streaming(
+        self,
+        query: str,
+        base_prefix: Path,
+        schema: Optional[pa.Schema] = None,
+        compression: str = 'snappy',
+        use_compliant_nested_type: bool = True,
+        max_parquet_size_bytes: Optional[int] = None,
+    ) -> List[Path]:
+        """Streaming export to files, named like the in-memory path (single file has no _partNN)."""
+        parquet_paths = list(self.iter_parquet_parts(
+            query,
+            base_prefix,
+            schema=schema,
+            compression=compression,
+            use_compliant_nested_type=use_compliant_nested_type,
+            max_parquet_size_bytes=max_parquet_size_bytes,
+        ))
+        if len(parquet_paths) == 1:
+            single_path = base_prefix.with_suffix(".parquet")
+            parquet_paths[0].rename(single_path)
+            parquet_paths[0] = single_path
+        return parquet_paths
 
     def _split_table_by_size(self, table: pa.Table, max_bytes: int) -> List[pa.Table]:
         """Split a table into multiple tables so each is roughly <= max_bytes."""
@@ -179,6 +767,58 @@ class BigQueryExporter():
         )
         return tables
 
+    def _split_table_by_key(self, table: pa.Table, split_key: str, max_bytes: Optional[int]) -> List[pa.Table]:
+        """
+        Sort a table by split_key and cut it into parts covering disjoint key ranges.
+
+        Parts are roughly <= max_bytes; a cut never separates rows with the same key,
+        so part ranges do not overlap. Null keys sort last and end up in the last part.
+        """
+        table = table.sort_by([(split_key, 'ascending')])
+        if not max_bytes or table.nbytes <= max_bytes or table.num_rows == 0:
+            return [table]
+
+        keys = table.column(split_key)
+        rows_per_part = max(1, int(table.num_rows * max_bytes / table.nbytes))
+        tables: List[pa.Table] = []
+        start = 0
+        while start < table.num_rows:
+            cut = min(start + rows_per_part, table.num_rows)
+            last_key = keys[cut - 1]
+            if cut < table.num_rows:
+                if last_key.is_valid:
+                    # Move the cut past every row equal to the last key (keys are sorted)
+                    cut = max(cut, pc.sum(pc.less_equal(keys, last_key)).as_py() or 0)
+                else:
+                    cut = table.num_rows
+            tables.append(table.slice(start, cut - start))
+            start = cut
+
+        self.logger.info(
+            "Split table of size %.2f MB into %d key-range chunk(s) by %s with max %.2f MB each.",
+            table.nbytes / (1024 * 1024),
+            len(tables),
+            split_key,
+            max_bytes / (1024 * 1024),
+        )
+        return tables
+
+    @staticmethod
+    def _key_range_metadata(table: pa.Table, split_key: str) -> Dict[str, str]:
+        """S3 object metadata with the min/max of split_key in one part."""
+        min_max = pc.min_max(table.column(split_key)).as_py()
+
+        def to_str(value) -> str:
+            if value is None:
+                return ''
+            return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+        return {
+            'split-key': split_key,
+            'key-min': to_str(min_max['min']),
+            'key-max': to_str(min_max['max']),
+        }
+
     def _write_table_to_parquet(
         self,
         table: pa.Table,
@@ -203,6 +843,11 @@ class BigQueryExporter():
         compression: str = 'snappy',
         use_compliant_nested_type: bool = True,
         max_parquet_size_bytes: Optional[int] = None,
+        numeric_mode: str = 'decimal',
+        numeric_scale: int = 2,
+        mode: str = 'in_memory',
+        split_key: Optional[str] = None,
+        decimal_columns: Optional[List[str]] = None,
     ) -> str | List[str]:
         """
         Execute query and write a Parquet file in the exporter temp dir.
@@ -216,77 +861,135 @@ class BigQueryExporter():
                                        If True (default), uses legacy format with "<element>" for list items.
                                        Set explicitly to ensure consistency across exports.
             max_parquet_size_bytes: Split output into multiple files so each parquet is roughly below this size.
+            numeric_mode: 'decimal' (default) keeps NUMERIC columns as decimal; 'scaled_int64' or 'float64'
+                          store every NUMERIC column in the faster type and fail if a value would
+                          change; decimal columns of the schema follow the converted type.
+            numeric_scale: Fractional digits kept by numeric_mode='scaled_int64'.
+            mode: 'in_memory' (default) loads the whole result with to_arrow, 'streaming' writes record
+                  batches as they arrive, 'auto' picks one from the size of the result (see plan_export).
+            split_key: Sort by this column and cut parts on key ranges instead of arbitrary batches.
+                       Each part's min/max is kept in self.part_metadata for the S3 object metadata.
+            decimal_columns: NUMERIC columns kept exact as decimal whatever numeric_mode is.
         Returns:
             Absolute path to the written .parquet file, or list of paths if multiple files are produced.
         """
+        if mode == 'auto':
+            plan = self.plan_export(query, max_parquet_size_bytes=max_parquet_size_bytes)
+            mode = plan.mode
+            max_parquet_size_bytes = plan.max_parquet_size_bytes
+        if mode not in EXPORT_MODES:
+            raise ValueError(f"mode must be one of {EXPORT_MODES + ('auto',)}, got {mode!r}")
+
         self.logger.info(
-            "Starting Parquet export with compression=%s, use_compliant_nested_type=%s, max_size=%s",
+            "Starting Parquet export with mode=%s, compression=%s, use_compliant_nested_type=%s, max_size=%s",
+            mode,
             compression,
             use_compliant_nested_type,
             max_parquet_size_bytes,
         )
-        table = self.to_arrow(query)
-
-        if schema is not None:
-            self.logger.info("Applying schema alignment and type casting")
-            # Sanitize schema to avoid null target types
-            schema = self._sanitize_schema(schema)
-            try:
-                # Add missing columns as typed null arrays
-                for field in schema:
-                    if field.name not in table.column_names:
-                        col = pa.array([None] * table.num_rows, type=field.type)
-                        table = table.append_column(field.name, col)
-                        self.logger.debug(f"Added missing column: {field.name}")
-                # Reorder and cast
-                table = table.select([f.name for f in schema])
-                table = table.cast(schema, safe=False)
-                self.logger.info("Schema alignment completed successfully")
-            except Exception as e:
-                self.logger.warning(f"Schema alignment warning: {e}")
 
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_table_name = (bq_table_addres or "query").replace("`", "").replace(".", "_")
-        base_prefix = Path(self.temp_dir) / f"export_{safe_table_name}_{ts}"
+        base_prefix = self._base_prefix(bq_table_addres)
 
-        tables_to_write: List[pa.Table]
-        if max_parquet_size_bytes:
-            tables_to_write = self._split_table_by_size(table, max_parquet_size_bytes)
+        if mode == 'streaming':
+            if split_key:
+                self.logger.warning("split_key=%s needs a sorted result; streaming export ignores it", split_key)
+            if numeric_mode != 'decimal':
+                self.logger.warning(
+                    "numeric_mode=%s is not applied by the streaming export; decimals follow the schema only",
+                    numeric_mode,
+                )
+            parquet_paths = self._export_streaming(
+                query,
+                base_prefix,
+                schema=schema,
+                compression=compression,
+                use_compliant_nested_type=use_compliant_nested_type,
+                max_parquet_size_bytes=max_parquet_size_bytes,
+            )
         else:
-            tables_to_write = [table]
+            table = self.to_arrow(query)
+
+            if numeric_mode != 'decimal':
+                table, schema = self._apply_numeric_mode(table, schema, numeric_mode, numeric_scale, decimal_columns)
 
-        parquet_paths: List[Path] = []
-        for idx, chunk_table in enumerate(tables_to_write, start=1):
-            if len(tables_to_write) == 1:
-                parquet_path = base_prefix.with_suffix(".parquet")
+            if schema is not None:
+                self.logger.info("Applying schema alignment and type casting")
+                table = self._align_table_to_schema(table, self._sanitize_schema(schema))
+
+            tables_to_write: List[pa.Table]
+            if split_key:
+                tables_to_write = self._split_table_by_key(table, split_key, max_parquet_size_bytes)
+            elif max_parquet_size_bytes:
+                tables_to_write = self._split_table_by_size(table, max_parquet_size_bytes)
             else:
-                parquet_path = base_prefix.parent / f"{base_prefix.name}_part{idx:02d}.parquet"
-            try:
-                self._write_table_to_parquet(
-                    chunk_table,
-                    parquet_path,
-                    compression=compression,
-                    use_compliant_nested_type=use_compliant_nested_type,
-                )
-            except Exception as e:
-                self.logger.warning(
-                    "Could not set nested type format (%s), using default write_table for %s",
-                    e,
-                    parquet_path,
-                )
-                pq.write_table(chunk_table, str(parquet_path), compression=compression)
-            parquet_paths.append(parquet_path)
+                tables_to_write = [table]
+
+            parquet_paths = []
+            for idx, chunk_table in enumerate(tables_to_write, start=1):
+                if len(tables_to_write) == 1:
+                    parquet_path = base_prefix.with_suffix(".parquet")
+                else:
+                    parquet_path = self._part_path(base_prefix, idx)
+                try:
+                    self._write_table_to_parquet(
+                        chunk_table,
+                        parquet_path,
+                        compression=compression,
+                        use_compliant_nested_type=use_compliant_nested_type,
+                    )
+                except Exception as e:
+                    self.logger.warning(
+                        "Could not set nested type format (%s), using default write_table for %s",
+                        e,
+                        parquet_path,
+                    )
+                    pq.write_table(chunk_table, str(parquet_path), compression=compression)
+                if split_key:
+                    self.part_metadata[str(parquet_path)] = self._key_range_metadata(chunk_table, split_key)
+                parquet_paths.append(parquet_path)
 
         # Log schema from first file for reference
         if parquet_paths:
-            curent_file = pq.read_table(parquet_paths[0])
-            print("===File schema===", curent_file.schema, sep='\n')
+            print("===File schema===", pq.read_schema(parquet_paths[0]), sep='\n')
         self.logger.info("Parquet file(s) written successfully: %s", [str(p) for p in parquet_paths])
 
         if len(parquet_paths) == 1:
             return str(parquet_paths[0])
         return [str(p) for p in parquet_paths]
 
+    def gzip_file(self, parquet_path: str | Path) -> str:
+        """
+        Compress one Parquet file to <parquet_path>.gz next to it.
+
+        Args:
+            parquet_path: Path to the .parquet file
+        Returns:
+            str: Path to the .parquet.gz file
+        """
+        gz_path = f"{parquet_path}.gz"
+        self.logger.info(f"Compressing Parquet file to: {gz_path}")
+
+        digest = hashlib.sha256()
+        with open(parquet_path, 'rb') as src, open(gz_path, 'wb') as raw:
+            # No file name and mtime in the gzip header: the same data always gives the same bytes
+            # (and the same checksum), so identical re-exports can be recognised in S3
+            with gzip.GzipFile(filename='', mode='wb', fileobj=_HashingWriter(raw, digest), mtime=0) as dst:
+                dst.writelines(src)
+        self.part_checksums[gz_path] = base64.b64encode(digest.digest()).decode()
+
+        # Get file sizes for logging
+        parquet_size = os.path.getsize(parquet_path)
+        gz_size = os.path.getsize(gz_path)
+        compression_ratio = (1 - gz_size / parquet_size) * 100 if parquet_size > 0 else 0
+
+        self.logger.info(
+            f"Compression completed - Original: {parquet_size:,} bytes, Compressed: {gz_size:,} bytes, Ratio: {compression_ratio:.1f}%"
+        )
+        self.logger.info(f"Parquet.gz file ready: {gz_path}")
+        if str(parquet_path) in self.part_metadata:
+            self.part_metadata[gz_path] = self.part_metadata[str(parquet_path)]
+        return gz_path
+
     def export_to_parquet_gzip(
         self,
         query: str,
@@ -295,6 +998,11 @@ class BigQueryExporter():
         compression: str = 'snappy',
         use_compliant_nested_type: bool = True,
         max_parquet_size_bytes: Optional[int] = None,
+        numeric_mode: str = 'decimal',
+        numeric_scale: int = 2,
+        mode: str = 'in_memory',
+        split_key: Optional[str] = None,
+        decimal_columns: Optional[List[str]] = None,
     ) -> str | List[str]:
         """
         Execute query and write a gzipped Parquet file (.parquet.gz) in the exporter temp dir.
@@ -307,6 +1015,11 @@ class BigQueryExporter():
             use_compliant_nested_type: If False, uses new format with "<item>" for list items.
                                        If True (default), uses legacy format with "<element>" for list items.
             max_parquet_size_bytes: Split parquet output before gzipping if provided.
+            numeric_mode: Storage of NUMERIC columns, see export_to_parquet.
+            numeric_scale: Fractional digits kept by numeric_mode='scaled_int64'.
+            mode: 'in_memory', 'streaming' or 'auto', see export_to_parquet.
+            split_key: Cut parts on ranges of this column, see export_to_parquet.
+            decimal_columns: NUMERIC columns kept as decimal, see export_to_parquet.
         Returns:
             Path (or list of paths) to the .parquet.gz file(s).
         """
@@ -321,30 +1034,18 @@ class BigQueryExporter():
                 compression=compression,
                 use_compliant_nested_type=use_compliant_nested_type,
                 max_parquet_size_bytes=max_parquet_size_bytes,
+                numeric_mode=numeric_mode,
+                numeric_scale=numeric_scale,
+                mode=mode,
+                split_key=split_key,
+                decimal_columns=decimal_columns,
             )
             if isinstance(parquet_paths, str):
                 parquet_paths = [parquet_paths]
             self.logger.info(f"Parquet file(s) created: {parquet_paths}")
             
             # Create gzipped version
-            gz_paths: List[str] = []
-            for parquet_path in parquet_paths:
-                gz_path = f"{parquet_path}.gz"
-                self.logger.info(f"Compressing Parquet file to: {gz_path}")
-                
-                with open(parquet_path, 'rb') as src, gzip.open(gz_path, 'wb') as dst:
-                    dst.writelines(src)
-                
-                # Get file sizes for logging
-                parquet_size = os.path.getsize(parquet_path)
-                gz_size = os.path.getsize(gz_path)
-                compression_ratio = (1 - gz_size / parquet_size) * 100 if parquet_size > 0 else 0
-                
-                self.logger.info(
-                    f"Compression completed - Original: {parquet_size:,} bytes, Compressed: {gz_size:,} bytes, Ratio: {compression_ratio:.1f}%"
-                )
-                self.logger.info(f"Parquet.gz file ready: {gz_path}")
-                gz_paths.append(gz_path)
+            gz_paths: List[str] = [self.gzip_file(parquet_path) for parquet_path in parquet_paths]
             
             if len(gz_paths) == 1:
                 return gz_paths[0]
@@ -354,6 +1055,97 @@ class BigQueryExporter():
             self.logger.error(f"Failed to create Parquet.gz file: {str(e)}")
             raise
 
+    def table_to_parquet_gzip(
+        self,
+        table: pa.Table,
+        bq_table_addres: Optional[str] = None,
+        compression: str = 'snappy',
+        use_compliant_nested_type: bool = True,
+    ) -> str:
+        """
+        Write an Arrow table that is already in memory to a .parquet.gz file in the exporter temp dir.
+
+        Args:
+            table: Table to write (e.g. a computed delta or rollup)
+            bq_table_addres: Optional basename for parquet
+            compression: Parquet compression, default 'snappy'
+            use_compliant_nested_type: Nested list format, see export_to_parquet
+        Returns:
+            Path to the .parquet.gz file.
+        """
+        parquet_path = self._base_prefix(bq_table_addres).with_suffix(".parquet")
+        self._write_table_to_parquet(table, parquet_path, compression, use_compliant_nested_type)
+        self.logger.info(f"Parquet file written: {parquet_path} ({table.num_rows} rows)")
+        return self.gzip_file(parquet_path)
+
+    def export_to_partitioned_parquet_gzip(
+        self,
+        query: str,
+        partition_by: List[str],
+        bq_table_addres: Optional[str] = None,
+        schema: Optional[pa.Schema] = None,
+        compression: str = 'snappy',
+        use_compliant_nested_type: bool = True,
+        hour_from: Optional[str] = None,
+        max_rows_per_file: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Execute query and write a Hive-partitioned dataset (e.g. hour=HH/, platform=X/) of .parquet.gz parts.
+
+        Files are written by pyarrow.dataset.write_dataset with its multithreaded writer and
+        gzipped in parallel. The Hive sub-directory of every part is kept in self.part_sub_paths
+        so sinks can upload it to entity/YYYY-MM-DD/<sub-directory>/.
+
+        Args:
+            query: SQL query to execute
+            partition_by: Columns used as Hive partition keys; they are stored in the path, not in the files
+            bq_table_addres: Optional basename for the local dataset directory
+            schema: Optional pyarrow.Schema to align/cast before write
+            compression: Parquet compression, default 'snappy'
+            use_compliant_nested_type: Nested list format, see export_to_parquet
+            hour_from: Add an 'hour' column (two digits, UTC) derived from this timestamp column
+            max_rows_per_file: Optional row limit per file inside each partition directory
+        Returns:
+            List of paths to the .parquet.gz parts.
+        """
+        self.logger.info(f"Starting partitioned Parquet.gz export by {partition_by} for table: {bq_table_addres}")
+        table = self.to_arrow(query)
+        if schema is not None:
+            table = self._align_table_to_schema(table, self._sanitize_schema(schema))
+        if hour_from:
+            table = table.append_column('hour', pc.strftime(table.column(hour_from), format='%H'))
+
+        base_dir = Path(f"{self._base_prefix(bq_table_addres)}_dataset")
+        write_options = {}
+        if max_rows_per_file:
+            write_options = {'max_rows_per_file': max_rows_per_file, 'max_rows_per_group': max_rows_per_file}
+        pds.write_dataset(
+            table,
+            str(base_dir),
+            format='parquet',
+            partitioning=pds.partitioning(
+                pa.schema([table.schema.field(c) for c in partition_by]),
+                flavor='hive',
+            ),
+            file_options=pds.ParquetFileFormat().make_write_options(
+                compression=compression,
+                use_compliant_nested_type=use_compliant_nested_type,
+            ),
+            basename_template='part-{i}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            use_threads=True,
+            **write_options,
+        )
+
+        parquet_paths = sorted(base_dir.rglob('*.parquet'))
+        with ThreadPoolExecutor() as pool:
+            gz_paths = list(pool.map(self.gzip_file, parquet_paths))
+        for parquet_path, gz_path in zip(parquet_paths, gz_paths):
+            self.part_sub_paths[gz_path] = parquet_path.parent.relative_to(base_dir).as_posix()
+
+        self.logger.info(f"Partitioned export wrote {len(gz_paths)} part(s) into {len(set(self.part_sub_paths.values()))} partition(s)")
+        return gz_paths
+
     def export_to_json(self, query: str, bq_table_addres: str) -> str:
         """
         Execute BigQuery query and save results to temporary JSON file.
@@ -368,8 +1160,7 @@ class BigQueryExporter():
         try:
             self.logger.info(f"Starting JSON export for table: {bq_table_addres}")
             # Execute query
-            query_job = self.client.query(query)
-            results = list(query_job.result())
+            results = list(self.run_query(query))
             self.logger.info(f'Query result - {len(results)} rows')
             # Convert to list of dictionaries
             data = [dict(row) for row in results]
@@ -0,0 +1,163 @@
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import pyarrow as pa
+
+from scr.BigqueryToJson import BigQueryExporter
+from scr.ExportSinks import ExportSink
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once another stage has failed."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Blocking get that returns _DONE once another stage has failed."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_export_pipeline(
+    exporter: BigQueryExporter,
+    query: str,
+    sinks: List[ExportSink],
+    dt_partition: datetime,
+    dt_now: Optional[datetime] = None,
+    bq_table_addres: Optional[str] = None,
+    schema: Optional[pa.Schema] = None,
+    compression: str = 'snappy',
+    use_compliant_nested_type: bool = True,
+    max_parquet_size_bytes: Optional[int] = None,
+    queue_size: int = 2,
+    upload_workers: int = 2,
+) -> bool:
+    """
+    Export, compress and upload parts in overlapping stages.
+
+    Part N is uploaded while part N+1 is gzipped and part N+2 is still read from
+    BigQuery. Queues between the stages hold at most queue_size parts, so a slow
+    stage blocks the one before it and disk/memory use stays bounded.
+
+    Args:
+        exporter: Entered BigQueryExporter (its temp_dir holds the parts)
+        query: SQL text
+        sinks: Destinations for every part; prepared (e.g. cleared) once when the first part
+            is ready to upload, so a failing query leaves them untouched, and finished once
+            after the last one
+        dt_partition: Partition date (UTC)
+        dt_now: Upload time used in object names; defaults to now (UTC)
+        bq_table_addres: Optional basename for the local files
+        schema: Optional pyarrow.Schema to align/cast before write
+        compression: Parquet compression, default 'snappy'
+        use_compliant_nested_type: Nested list format, see BigQueryExporter.export_to_parquet
+        max_parquet_size_bytes: Part size (in-memory batch bytes)
+        queue_size: Parts buffered between two stages
+        upload_workers: Parts uploaded at the same time
+    Returns:
+        bool: True if every part reached every sink
+
+    Raises:
+        Exception: The first error raised by any stage
+    """
+    dt_now = dt_now or datetime.now(timezone.utc)
+    parts_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    gz_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    results: List[bool] = []
+    results_lock = threading.Lock()
+    prepare_lock = threading.Lock()
+    prepared: List[ExportSink] = []
+
+    def prepare_sinks() -> None:
+        with prepare_lock:
+            if not prepared:
+                for sink in sinks:
+                    sink.prepare(dt_partition, dt_now)
+                prepared.extend(sinks)
+
+    def compress_stage() -> None:
+        try:
+            while True:
+                parquet_path = _get(parts_q, stop)
+                if parquet_path is _DONE:
+                    break
+                gz_path = exporter.gzip_file(parquet_path)
+                os.remove(parquet_path)
+                if not _put(gz_q, gz_path, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(upload_workers):
+                _put(gz_q, _DONE, stop)
+
+    def upload_stage() -> None:
+        try:
+            while True:
+                gz_path = _get(gz_q, stop)
+                if gz_path is _DONE:
+                    break
+                prepare_sinks()
+                ok = all([sink.write(gz_path, dt_partition, dt_now) for sink in sinks])
+                with results_lock:
+                    results.append(ok)
+                logger.info(f"Pipeline part {gz_path} upload {'succeeded' if ok else 'failed'}")
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=compress_stage, name='export-compress')]
+    threads += [threading.Thread(target=upload_stage, name=f'export-upload-{i}') for i in range(upload_workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for parquet_path in exporter.iter_parquet_parts(
+            query,
+            exporter._base_prefix(bq_table_addres),
+            schema=schema,
+            compression=compression,
+            use_compliant_nested_type=use_compliant_nested_type,
+            max_parquet_size_bytes=max_parquet_size_bytes,
+        ):
+            if not _put(parts_q, parquet_path, stop):
+                break
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(parts_q, _DONE, stop)
+        for thread in threads:
+            thread.join()
+
+    success = not errors and bool(results) and all(results)
+    for sink in prepared:
+        sink.finish(dt_partition, dt_now, success)
+
+    if errors:
+        logger.error(f"Export pipeline failed: {errors[0]}")
+        raise errors[0]
+    logger.info(f"Export pipeline finished: {sum(results)}/{len(results)} part(s) uploaded")
+    return success
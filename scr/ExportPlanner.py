@@ -0,0 +1,125 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from scr.BigqueryToJson import BigQueryExporter
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExportSpec:
+    """One daily export to plan: a table filtered to one day of day_column."""
+    name: str
+    bq_table_addres: str
+    day_column: str
+    extra_condition: Optional[str] = None  # e.g. the amplitude JSON filter
+
+
+@dataclass
+class DayPlan:
+    """Dry-run result of one export for one day."""
+    name: str
+    dt: str
+    bytes_processed: Optional[int]
+    partition_bytes: Optional[int]
+    prunes: Optional[bool]
+    suggested_condition: Optional[str] = None
+    suggested_bytes: Optional[int] = None
+    note: str = ''
+
+
+def trunc_condition(column: str) -> str:
+    """The day predicate the uploaders use today."""
+    return f"timestamp_trunc({column}, day) = TIMESTAMP(@dt)"
+
+
+def range_condition(column: str) -> str:
+    """Equivalent half-open range on the raw column, which the partition filter can always use."""
+    return f"{column} >= TIMESTAMP(@dt) AND {column} < TIMESTAMP_ADD(TIMESTAMP(@dt), INTERVAL 1 DAY)"
+
+
+def _with_extra(condition: str, extra_condition: Optional[str]) -> str:
+    return f"{extra_condition} AND {condition}" if extra_condition else condition
+
+
+def plan_exports(
+    exporter: BigQueryExporter,
+    specs: List[ExportSpec],
+    dates: List[str],
+    tolerance: float = 1.2,
+) -> List[DayPlan]:
+    """
+    Dry-run every export for every day and check that it reads only its own partition.
+
+    A query is flagged as not pruning when it would process more than tolerance times
+    the logical size of the day's partition. For flagged queries the range predicate
+    from range_condition is dry-run as well and reported as a suggestion.
+
+    Args:
+        exporter: Entered BigQueryExporter
+        specs: Exports to plan
+        dates: Days as YYYYMMDD
+        tolerance: Allowed ratio of processed bytes to partition bytes
+    Returns:
+        List of DayPlan, one per (spec, day)
+    """
+    plans: List[DayPlan] = []
+    for spec in specs:
+        partition_bytes = exporter.get_partition_bytes(spec.bq_table_addres)
+        partitioning = exporter.client.get_table(spec.bq_table_addres).time_partitioning
+        partition_field = partitioning.field if partitioning else None
+        for raw_dt in dates:
+            dt = datetime.strptime(raw_dt, '%Y%m%d').strftime('%Y-%m-%d')
+            params = {'dt': dt}
+            condition = _with_extra(trunc_condition(spec.day_column), spec.extra_condition)
+            query = exporter.build_query(spec.bq_table_addres, where_condition=condition, params=params)
+            bytes_processed = exporter.estimate_query_bytes(query)
+            day_bytes = partition_bytes.get(raw_dt)
+            plan = DayPlan(
+                name=spec.name,
+                dt=dt,
+                bytes_processed=bytes_processed,
+                partition_bytes=day_bytes,
+                prunes=None,
+            )
+            if partitioning is None:
+                plan.note = 'table is not partitioned'
+            elif partition_field and partition_field != spec.day_column:
+                plan.note = f'table is partitioned by {partition_field}, filter is on {spec.day_column}'
+            if bytes_processed is not None and day_bytes is not None:
+                plan.prunes = bytes_processed <= day_bytes * tolerance
+            if plan.prunes is False:
+                suggested = _with_extra(range_condition(spec.day_column), spec.extra_condition)
+                suggested_query = exporter.build_query(spec.bq_table_addres, where_condition=suggested, params=params)
+                plan.suggested_condition = suggested
+                plan.suggested_bytes = exporter.estimate_query_bytes(suggested_query)
+            plans.append(plan)
+            logger.info(
+                f"{spec.name} {dt}: {bytes_processed or 0:,} bytes processed, partition {day_bytes or 0:,} bytes"
+                f"{'' if plan.prunes is not False else ' - NOT PRUNED'}"
+            )
+    return plans
+
+
+def suggest_concurrency(plans: List[DayPlan], bytes_budget: int, max_concurrency: int = 8) -> Dict[str, int]:
+    """
+    Exports of one spec that can run at the same time within a processed-bytes budget.
+
+    Args:
+        plans: Result of plan_exports
+        bytes_budget: Bytes that may be processed concurrently
+        max_concurrency: Upper limit per spec
+    Returns:
+        Dict of spec name -> number of days to run concurrently
+    """
+    largest: Dict[str, int] = {}
+    for plan in plans:
+        day_bytes = plan.suggested_bytes if plan.suggested_bytes is not None else plan.bytes_processed
+        largest[plan.name] = max(largest.get(plan.name, 0), day_bytes or 0)
+    return {
+        name: max(1, min(max_concurrency, bytes_budget // day_bytes if day_bytes else max_concurrency))
+        for name, day_bytes in largest.items()
+    }
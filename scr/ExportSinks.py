@@ -0,0 +1,233 @@
+import logging
+import shutil
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+
+from scr.AWSS3Loader import S3Uploader, s3_object_key, s3_partition_prefix
+from scr.SidecarIndex import build_sidecar_index, delete_sidecar_index, upload_sidecar_index
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExportSink(ABC):
+    """Destination for the compressed parts of one exported partition."""
+
+    name = 'sink'
+
+    def prepare(self, dt_partition: datetime, dt_now: datetime) -> None:
+        """Called once per partition before any part is written (e.g. to clear old files)."""
+        pass
+
+    @abstractmethod
+    def write(self, gz_path: str, dt_partition: datetime, dt_now: datetime) -> bool:
+        """Store one .parquet.gz part. Returns True on success."""
+
+    def finish(self, dt_partition: datetime, dt_now: datetime, success: bool) -> None:
+        """Called once per partition after the last part (success: every part was written)."""
+        pass
+
+
+class S3Sink(ExportSink):
+    """
+    Upload parts with S3Uploader, optionally to a bucket other than the configured one.
+
+    part_metadata maps a local part path to its S3 object metadata (BigQueryExporter.part_metadata),
+    part_sub_paths to its Hive sub-directory (BigQueryExporter.part_sub_paths),
+    part_checksums to its SHA256 (BigQueryExporter.part_checksums).
+    With sync_path (the default) the partition is listed in prepare and its old objects are
+    deleted in finish, after all parts were written, instead of clearing it first
+    (S3Uploader.sync_s3_path); a failed export then leaves the old objects in place.
+
+    The sidecar index of the partition (scr.SidecarIndex) always describes its current parts:
+    a successful finish deletes the old one and, with index_keys, uploads one built from the
+    local .parquet files of the parts. Appending parts (clear_path_before_upload=False)
+    only deletes it, since the parts of earlier runs are not known here.
+    """
+
+    def __init__(
+        self,
+        entity_path: str,
+        bucket_name: Optional[str] = None,
+        clear_path_before_upload: bool = True,
+        part_metadata: Optional[Dict[str, Dict[str, str]]] = None,
+        part_sub_paths: Optional[Dict[str, str]] = None,
+        sync_path: bool = True,
+        part_checksums: Optional[Dict[str, str]] = None,
+        index_keys: Optional[List[str]] = None,
+    ):
+        self.entity_path = entity_path
+        self.bucket_name = bucket_name
+        self.clear_path_before_upload = clear_path_before_upload
+        self.part_metadata = part_metadata if part_metadata is not None else {}
+        self.part_sub_paths = part_sub_paths if part_sub_paths is not None else {}
+        self.sync_path = sync_path
+        self.part_checksums = part_checksums if part_checksums is not None else {}
+        self.index_keys = index_keys
+        self.stale_keys: Optional[List[str]] = None  # listed by prepare in sync mode
+        self.uploaded_keys: Dict[str, str] = {}  # local gz path -> S3 key
+        self.name = f"s3://{bucket_name or '<default>'}/{entity_path}"
+
+    def _uploader(self, gz_path: Optional[str], dt_partition: datetime, dt_now: datetime) -> S3Uploader:
+        return S3Uploader(
+            entity_path=self.entity_path,
+            dt_partition=dt_partition,
+            gzip_path=gz_path,
+            dt_now=dt_now,
+            clear_path_before_upload=False,
+            bucket_name=self.bucket_name,
+            metadata=self.part_metadata.get(gz_path),
+            sub_path=self.part_sub_paths.get(gz_path),
+            checksum_sha256=self.part_checksums.get(gz_path),
+        )
+
+    def prepare(self, dt_partition: datetime, dt_now: datetime) -> None:
+        if self.clear_path_before_upload:
+            uploader = self._uploader(None, dt_partition, dt_now)
+            if self.sync_path:
+                self.stale_keys = uploader.list_s3_path(uploader.s3_parent_path_file_key)
+            else:
+                uploader.clear_s3_path(uploader.s3_parent_path_file_key)
+                delete_sidecar_index(uploader.bucket, uploader.s3_parent_path_file_key)
+
+    def write(self, gz_path: str, dt_partition: datetime, dt_now: datetime) -> bool:
+        uploader = self._uploader(gz_path, dt_partition, dt_now)
+        success = uploader.run()
+        if success:
+            # Only parts that are in S3; the sidecar index and sync are built from these keys
+            self.uploaded_keys[gz_path] = uploader.s3_full_file_key
+        return success
+
+    def finish(self, dt_partition: datetime, dt_now: datetime, success: bool) -> None:
+        uploader = self._uploader(None, dt_partition, dt_now)
+        s3_prefix = uploader.s3_parent_path_file_key
+        if not success:
+            if self.stale_keys is not None:
+                logger.warning(f"Kept {len(self.stale_keys)} old object(s) in {s3_prefix}: not every part was uploaded")
+            self.stale_keys = None
+            return
+        # The old index points at the parts about to be deleted; a failed rebuild then leaves no index
+        delete_sidecar_index(uploader.bucket, s3_prefix)
+        if self.stale_keys is not None:
+            uploader.sync_s3_path(s3_prefix, self.stale_keys, list(self.uploaded_keys.values()))
+            self.stale_keys = None
+        if self.index_keys and self.clear_path_before_upload and self.uploaded_keys:
+            parquet_paths = [gz_path[:-len('.gz')] if gz_path.endswith('.gz') else gz_path for gz_path in self.uploaded_keys]
+            self.upload_sidecar_index(build_sidecar_index(parquet_paths, self.index_keys), dt_partition, dt_now)
+
+    def upload_sidecar_index(self, index: pa.Table, dt_partition: datetime, dt_now: datetime) -> str:
+        """Upload a sidecar index (scr.SidecarIndex) for the parts written by this sink."""
+        uploader = self._uploader(None, dt_partition, dt_now)
+        return upload_sidecar_index(index, self.uploaded_keys, uploader.bucket, uploader.s3_parent_path_file_key)
+
+
+class LocalDirectorySink(ExportSink):
+    """Copy parts into a local archive using the S3 key layout below root_dir."""
+
+    def __init__(
+        self,
+        root_dir: str,
+        entity_path: str,
+        clear_path_before_upload: bool = True,
+        part_sub_paths: Optional[Dict[str, str]] = None,
+    ):
+        self.root_dir = Path(root_dir)
+        self.entity_path = entity_path
+        self.clear_path_before_upload = clear_path_before_upload
+        self.part_sub_paths = part_sub_paths if part_sub_paths is not None else {}
+        self.name = f"file://{self.root_dir / entity_path}"
+
+    def prepare(self, dt_partition: datetime, dt_now: datetime) -> None:
+        partition_dir = self.root_dir / s3_partition_prefix(self.entity_path, dt_partition)
+        if self.clear_path_before_upload and partition_dir.exists():
+            shutil.rmtree(partition_dir)
+        partition_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(self, gz_path: str, dt_partition: datetime, dt_now: datetime) -> bool:
+        sub_path = self.part_sub_paths.get(gz_path, '').strip('/')
+        prefix = s3_partition_prefix(self.entity_path, dt_partition) + (f'{sub_path}/' if sub_path else '')
+        target = self.root_dir / s3_object_key(prefix, dt_now)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(gz_path, target)
+        logger.info(f"Archived {gz_path} to {target}")
+        return True
+
+
+def tee_export(
+    gz_paths: str | List[str],
+    sinks: List[ExportSink],
+    dt_partition: datetime,
+    dt_now: Optional[datetime] = None,
+    max_workers: int = 4,
+) -> Dict[str, bool]:
+    """
+    Send the same compressed parts to several sinks concurrently.
+
+    The export and compression run once; every sink receives the same bytes.
+    A sink returning False only fails itself. A sink raising fails the whole tee:
+    every sink is finished with success=False and the first exception is re-raised.
+
+    Args:
+        gz_paths: Path or list of paths returned by export_to_parquet_gzip
+        sinks: Destinations, e.g. [S3Sink(...), LocalDirectorySink(...)]
+        dt_partition: Partition date (UTC)
+        dt_now: Upload time used in object names; defaults to now (UTC)
+        max_workers: Number of (sink, part) writes running at the same time
+    Returns:
+        Dict of sink name -> True if every part reached that sink
+
+    Raises:
+        ValueError: If two sinks have the same name
+        Exception: The first exception raised by a sink's prepare, write or finish
+    """
+    if isinstance(gz_paths, str):
+        gz_paths = [gz_paths]
+    dt_now = dt_now or datetime.now(timezone.utc)
+    names = [sink.name for sink in sinks]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise ValueError(f"Sink names must be unique, got duplicates: {duplicates}")
+
+    errors: List[Exception] = []
+    results: Dict[str, bool] = {sink.name: False for sink in sinks}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        prepared = {sink.name: pool.submit(sink.prepare, dt_partition, dt_now) for sink in sinks}
+        for sink_name, future in prepared.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Sink {sink_name}: prepare failed: {e}")
+                errors.append(e)
+
+        if not errors:
+            futures = {sink.name: [] for sink in sinks}
+            for sink in sinks:
+                for gz_path in gz_paths:
+                    futures[sink.name].append(pool.submit(sink.write, gz_path, dt_partition, dt_now))
+
+            for sink_name, sink_futures in futures.items():
+                try:
+                    results[sink_name] = all([f.result() for f in sink_futures])
+                except Exception as e:
+                    logger.error(f"Sink {sink_name}: write failed: {e}")
+                    errors.append(e)
+                logger.info(f"Sink {sink_name}: {'succeeded' if results[sink_name] else 'failed'} ({len(sink_futures)} part(s))")
+
+        if errors:
+            # Every sink keeps its old files when any sink raised
+            results = {sink.name: False for sink in sinks}
+        finished = {sink.name: pool.submit(sink.finish, dt_partition, dt_now, results[sink.name]) for sink in sinks}
+        for sink_name, future in finished.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Sink {sink_name}: finish failed: {e}")
+                errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,195 @@
+import calendar
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from scr.BigqueryToJson import BigQueryExporter
+
+
+logger = logging.getLogger(__name__)
+
+# Mergeable per-day, per-platform state of mart_orders (same filter as the monthly aggregate).
+# Sums and counts add up across days; distinct ids are kept as exact sets and unioned.
+DAILY_STATE_QUERY = """
+SELECT
+  mart_orders.platform AS platform,
+  COUNT(mart_orders.original_price) AS price_count,
+  SUM(mart_orders.original_price) AS price_sum,
+  SUM(mart_orders.delivery_fee_price) AS delivery_fee_sum,
+  SUM(mart_orders.service_fee_price) AS service_fee_sum,
+  ARRAY_AGG(DISTINCT mart_orders.warehouse_id IGNORE NULLS) AS warehouse_ids,
+  ARRAY_AGG(DISTINCT mart_orders.user_id IGNORE NULLS) AS user_ids,
+  ARRAY_AGG(DISTINCT mart_orders.order_id IGNORE NULLS) AS order_ids,
+FROM
+  `@bq_table_addres@` AS mart_orders
+WHERE TIMESTAMP_TRUNC(mart_orders.created_at, day) = TIMESTAMP(@dt)
+  AND mart_orders.status <> 8
+GROUP BY mart_orders.platform
+"""
+
+SUM_COLUMNS = ['price_count', 'price_sum', 'delivery_fee_sum', 'service_fee_sum']
+DISTINCT_COLUMNS = {'warehouse_ids': 'active_darkstores', 'user_ids': 'unique_users', 'order_ids': 'orders'}
+
+# group_by/join drop null keys, so a null platform travels as this placeholder
+_NULL_PLATFORM = '\x00null'
+
+
+class RollupStore():
+    """Daily partial states as Arrow IPC files: <state_dir>/YYYY-MM-DD.arrow."""
+
+    def __init__(self, state_dir: str = 'state/financial_rollup'):
+        self.state_dir = Path(state_dir)
+
+    def _path(self, dt: str) -> Path:
+        return self.state_dir / f"{dt}.arrow"
+
+    def source_state(self, dt: str) -> Optional[Dict[str, str]]:
+        """Source partition state (see BigQueryExporter.partition_state) the day was built from."""
+        path = self._path(dt)
+        if not path.exists():
+            return None
+        with ipc.open_file(str(path)) as reader:
+            metadata = reader.schema.metadata or {}
+        return {k.decode(): v.decode() for k, v in metadata.items() if k.startswith(b'source-')}
+
+    def is_fresh(self, dt: str, source_state: Optional[Dict[str, str]] = None) -> bool:
+        """
+        True if the day is stored and was built from source_state.
+
+        An unknown source state (None) is stale: without it a late update of the
+        source partition could not be told apart from an unchanged one.
+        """
+        if source_state is None or not self._path(dt).exists():
+            return False
+        return self.source_state(dt) == source_state
+
+    def save(self, dt: str, table: pa.Table, source_state: Optional[Dict[str, str]] = None) -> None:
+        """Write one day atomically."""
+        table = table.replace_schema_metadata(source_state or {})
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(dt)
+        tmp_path = path.with_suffix('.tmp')
+        with ipc.new_file(str(tmp_path), table.schema) as writer:
+            writer.write_table(table)
+        tmp_path.replace(path)
+
+    def load(self, dates: List[str]) -> pa.Table:
+        """Concatenate the stored days."""
+        tables = []
+        for dt in dates:
+            with ipc.open_file(str(self._path(dt))) as reader:
+                tables.append(reader.read_all().replace_schema_metadata(None))
+        return pa.concat_tables(tables)
+
+
+def build_daily_state(exporter: BigQueryExporter, bq_table_addres: str, dt: str) -> pa.Table:
+    """Query the partial state of one day (YYYY-MM-DD)."""
+    query = exporter.render_query(DAILY_STATE_QUERY, params={'dt': dt}, identifiers={'bq_table_addres': bq_table_addres})
+    return exporter.to_arrow(query)
+
+
+def month_days(month_dt: datetime, until: Optional[datetime] = None) -> List[str]:
+    """Days (YYYY-MM-DD) of the month of month_dt, up to and including until."""
+    last_day = calendar.monthrange(month_dt.year, month_dt.month)[1]
+    days = [datetime(month_dt.year, month_dt.month, day) for day in range(1, last_day + 1)]
+    return [f"{day:%Y-%m-%d}" for day in days if until is None or day <= until]
+
+
+def rollup_month(states: pa.Table, month_label: str) -> pa.Table:
+    """
+    Merge daily partial states into the monthly aggregate with vectorized group-bys.
+
+    Produces the columns of the monthly query: platform, month, active_darkstores,
+    unique_users, orders, aov, gmv, delivery_fee_revenue, service_fee_revenue, gtv.
+    """
+    platform = pc.fill_null(states.column('platform').combine_chunks(), _NULL_PLATFORM)
+    sums = pa.table({'platform': platform, **{c: states.column(c) for c in SUM_COLUMNS}})
+    result = sums.group_by('platform').aggregate([(c, 'sum') for c in SUM_COLUMNS])
+
+    for list_column, output_column in DISTINCT_COLUMNS.items():
+        ids = states.column(list_column).combine_chunks()
+        exploded = pa.table({
+            'platform': pc.take(platform, pc.list_parent_indices(ids)),
+            'value': pc.list_flatten(ids),
+        })
+        counts = exploded.group_by('platform').aggregate([('value', 'count_distinct')])
+        counts = counts.rename_columns(['platform', output_column])
+        result = result.join(counts, keys='platform', join_type='left outer')
+        result = result.set_column(
+            result.schema.get_field_index(output_column),
+            output_column,
+            pc.fill_null(result.column(output_column), 0),
+        )
+
+    gmv = result.column('price_sum_sum').cast(pa.float64())
+    delivery = result.column('delivery_fee_sum_sum').cast(pa.float64())
+    service = result.column('service_fee_sum_sum').cast(pa.float64())
+    aov = pc.round(pc.divide(gmv, result.column('price_count_sum').cast(pa.float64())), 2, round_mode='half_towards_infinity')
+    platform = result.column('platform')
+    platform = pc.if_else(pc.equal(platform, _NULL_PLATFORM), pa.scalar(None, pa.string()), platform)
+
+    return pa.table({
+        'platform': platform,
+        'month': pa.array([month_label] * result.num_rows, pa.string()),
+        'active_darkstores': result.column('active_darkstores').cast(pa.int64()),
+        'unique_users': result.column('unique_users').cast(pa.int64()),
+        'orders': result.column('orders').cast(pa.int64()),
+        'aov': aov,
+        'gmv': gmv,
+        'delivery_fee_revenue': delivery,
+        'service_fee_revenue': service,
+        'gtv': pc.add(pc.add(gmv, delivery), service),
+    })
+
+
+def rollup_month_from_daily(
+    exporter: BigQueryExporter,
+    bq_table_addres: str,
+    month_dt: datetime,
+    store: RollupStore,
+    partitions: Optional[Dict[str, Dict[str, str]]] = None,
+    until: Optional[datetime] = None,
+) -> Optional[pa.Table]:
+    """
+    Monthly aggregate from stored daily states; only missing or changed days are queried.
+
+    Days from today (UTC) on are still filling up, so they are queried on every run
+    and never stored. Days without a known source state (no partitions, or no
+    partition for the day) are queried on every run as well.
+
+    Args:
+        exporter: Entered BigQueryExporter
+        bq_table_addres: Source table (mart_orders)
+        month_dt: Any datetime in the month
+        store: RollupStore holding the daily states
+        partitions: BigQueryExporter.get_partitions result; days whose source partition
+            changed since their state was built are rebuilt, None rebuilds every day
+        until: Last day to include (e.g. today for the running month)
+    Returns:
+        pyarrow.Table with the monthly columns, or None if the month has no data
+    """
+    today = f"{datetime.now(timezone.utc):%Y-%m-%d}"
+    days = month_days(month_dt, until)
+    states = []
+    queried = 0
+    for dt in days:
+        source_state = BigQueryExporter.partition_state(partitions, dt.replace('-', '')) if partitions is not None else None
+        if dt < today and store.is_fresh(dt, source_state):
+            states.append(store.load([dt]))
+            continue
+        state = build_daily_state(exporter, bq_table_addres, dt)
+        queried += 1
+        if dt < today and source_state is not None:
+            store.save(dt, state, source_state)
+        states.append(state.replace_schema_metadata(None))
+    logger.info(f"Rollup {month_dt:%Y-%m}: {queried} day(s) queried, {len(days) - queried} reused from {store.state_dir}")
+
+    states = pa.concat_tables(states) if states else None
+    if states is None or states.num_rows == 0:
+        return None
+    return rollup_month(states, f"{month_dt:%Y.%m}.01")
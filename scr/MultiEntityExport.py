@@ -0,0 +1,99 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scr.BigqueryToJson import BigQueryExporter, align_table_to_schema, sanitize_schema
+from scr.QueryTemplates import RenderedQuery, bound_parameters, normalize_sql
+
+
+logger = logging.getLogger(__name__)
+
+ENTITY_COLUMN = '_entity'
+
+
+@dataclass
+class EntityOutput:
+    """One entity produced by a shared-scan export."""
+    name: str                      # discriminator value and struct column name, e.g. 'delivered'
+    query: str                     # SELECT returning exactly the columns of this entity
+    s3_entity_path: str
+    schema: Optional[pa.Schema] = None
+    numeric_mode: str = 'decimal'
+    numeric_scale: int = 2
+
+
+def build_shared_query(outputs: List[EntityOutput]) -> str:
+    """
+    Combine the entity queries into one job returning (_entity, <name> STRUCT, ...).
+
+    Every entity row is packed into its own STRUCT column, so entities with different
+    columns and types share one result without a hand-written column union. The
+    branches are joined FULL OUTER on the discriminator, which never matches, so each
+    result row belongs to exactly one entity.
+    """
+    branches = [
+        f"(SELECT '{o.name}' AS {ENTITY_COLUMN}, src AS `{o.name}` FROM ({o.query}) AS src) AS e{i}"
+        for i, o in enumerate(outputs)
+    ]
+    discriminators = [f"e{i}.{ENTITY_COLUMN}" for i in range(len(outputs))]
+    from_clause = branches[0]
+    for i in range(1, len(outputs)):
+        left = discriminators[0] if i == 1 else f"COALESCE({', '.join(discriminators[:i])})"
+        from_clause += f"\nFULL OUTER JOIN {branches[i]}\nON {discriminators[i]} = {left}"
+    entity = discriminators[0] if len(outputs) == 1 else f"COALESCE({', '.join(discriminators)})"
+    columns = ", ".join(f"e{i}.`{o.name}`" for i, o in enumerate(outputs))
+    return f"SELECT {entity} AS {ENTITY_COLUMN}, {columns}\nFROM {from_clause}"
+
+
+def split_entities(table: pa.Table, outputs: List[EntityOutput]) -> Dict[str, pa.Table]:
+    """Split a shared result into one flat table per entity with a vectorized filter."""
+    tables = {}
+    for o in outputs:
+        rows = table.filter(pc.equal(table.column(ENTITY_COLUMN), o.name)).column(o.name).combine_chunks()
+        tables[o.name] = pa.Table.from_arrays(rows.flatten(), names=[f.name for f in rows.type])
+    return tables
+
+
+def export_entities(
+    exporter: BigQueryExporter,
+    outputs: List[EntityOutput],
+    compression: str = 'snappy',
+    use_compliant_nested_type: bool = True,
+) -> Dict[str, Optional[str]]:
+    """
+    Run one query for several entities and write one .parquet.gz per entity.
+
+    Args:
+        exporter: Entered BigQueryExporter
+        outputs: Entity definitions, each with its own schema and S3 path
+        compression: Parquet compression, default 'snappy'
+        use_compliant_nested_type: Nested list format, see BigQueryExporter.export_to_parquet
+    Returns:
+        Dict of entity name -> path to the .parquet.gz file (None if the entity has no rows)
+    """
+    # Parameters of the entity queries (e.g. a shared @dt) are bound once for the combined job
+    query_parameters = {}
+    for o in outputs:
+        for parameter in bound_parameters(o.query):
+            bound = query_parameters.setdefault(parameter.name, parameter)
+            if bound.value != parameter.value or bound.type_ != parameter.type_:
+                raise ValueError(f"Entity queries bind @{parameter.name} to different values")
+    query = RenderedQuery(normalize_sql(build_shared_query(outputs)), list(query_parameters.values()))
+    logger.info(f"Shared-scan query for {[o.name for o in outputs]}:\n{query}")
+    tables = split_entities(exporter.to_arrow(query), outputs)
+
+    gz_paths: Dict[str, Optional[str]] = {}
+    for o in outputs:
+        table = tables[o.name]
+        logger.info(f"Entity {o.name}: {table.num_rows} rows")
+        if table.num_rows == 0:
+            gz_paths[o.name] = None
+            continue
+        table, schema = exporter._apply_numeric_mode(table, o.schema, o.numeric_mode, o.numeric_scale)
+        if schema is not None:
+            table = align_table_to_schema(table, sanitize_schema(schema), strict=exporter.strict_schema)
+        gz_paths[o.name] = exporter.table_to_parquet_gzip(table, o.name, compression, use_compliant_nested_type)
+    return gz_paths
@@ -0,0 +1,128 @@
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+
+# @name@ placeholders are identifiers (tables, columns), substituted into the text;
+# @name references are values, bound as query parameters
+_IDENTIFIER_PLACEHOLDER = re.compile(r'@(\w+)@')
+_IDENTIFIER_VALUE = re.compile(r'^[\w.\-]+$')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical query text: '--' comments dropped, whitespace runs collapsed to one space.
+
+    Quoted strings and `identifiers` are kept verbatim. The same logical query always
+    has the same text, which BigQuery's result cache requires.
+    """
+    out: List[str] = []
+    i, n = 0, len(sql)
+    pending_space = False
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', '`'):
+            end = i + 1
+            while end < n and sql[end] != ch:
+                end += 2 if sql[end] == '\\' else 1
+            if pending_space and out:
+                out.append(' ')
+            pending_space = False
+            out.append(sql[i:end + 1])
+            i = end + 1
+        elif sql.startswith('--', i):
+            newline = sql.find('\n', i)
+            i = n if newline == -1 else newline
+            pending_space = True
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+        else:
+            if pending_space and out:
+                out.append(' ')
+            pending_space = False
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+
+class RenderedQuery(str):
+    """
+    Query text that carries the parameters bound to it.
+
+    It is a str, so it can be passed anywhere a query is expected; the parameters
+    travel with the text instead of being looked up by it, so two renders of the same
+    text with different values never mix up their parameters.
+    """
+
+    def __new__(cls, text: str, parameters: Optional[List[bigquery.ScalarQueryParameter]] = None):
+        query = super().__new__(cls, text)
+        query.parameters = list(parameters or [])
+        return query
+
+
+def bound_parameters(query: str) -> List[bigquery.ScalarQueryParameter]:
+    """Parameters bound to a query by render / RenderedQuery; none for plain text."""
+    return list(getattr(query, 'parameters', []))
+
+
+def parameters_key(query_parameters: List[bigquery.ScalarQueryParameter]) -> Tuple:
+    """Hashable form of query parameters, e.g. to key cached jobs on (text, parameters)."""
+    return tuple((p.name, p.type_, p.value) for p in query_parameters)
+
+
+def to_query_parameter(name: str, value: Any) -> bigquery.ScalarQueryParameter:
+    """Bind a Python value as a typed BigQuery scalar parameter."""
+    if isinstance(value, bool):
+        type_ = 'BOOL'
+    elif isinstance(value, int):
+        type_ = 'INT64'
+    elif isinstance(value, float):
+        type_ = 'FLOAT64'
+    elif isinstance(value, Decimal):
+        type_ = 'NUMERIC'
+    elif isinstance(value, datetime):
+        type_ = 'TIMESTAMP' if value.tzinfo is not None else 'DATETIME'
+    elif isinstance(value, date):
+        type_ = 'DATE'
+    else:
+        type_ = 'STRING'
+        value = None if value is None else str(value)
+    return bigquery.ScalarQueryParameter(name, type_, value)
+
+
+def render(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    identifiers: Optional[Dict[str, str]] = None,
+) -> Tuple[RenderedQuery, List[bigquery.ScalarQueryParameter]]:
+    """
+    Fill a query template.
+
+    Args:
+        sql: Template text, e.g. "SELECT ... FROM `@bq_table_addres@` WHERE TIMESTAMP_TRUNC(created_at, DAY) = TIMESTAMP(@dt)"
+        params: Values for @name references, bound as query parameters
+        identifiers: Values for @name@ placeholders, substituted into the text
+    Returns:
+        (normalized query text carrying its parameters, query parameters)
+
+    Raises:
+        ValueError: Unknown placeholder or an identifier that is not a plain name
+    """
+    identifiers = identifiers or {}
+
+    def substitute(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in identifiers:
+            raise ValueError(f"No value for identifier placeholder @{name}@")
+        value = str(identifiers[name])
+        if not _IDENTIFIER_VALUE.match(value):
+            raise ValueError(f"Identifier {name}={value!r} is not a plain table/column name")
+        return value
+
+    text = normalize_sql(_IDENTIFIER_PLACEHOLDER.sub(substitute, sql))
+    query_parameters = [to_query_parameter(name, value) for name, value in (params or {}).items()]
+    return RenderedQuery(text, query_parameters), query_parameters
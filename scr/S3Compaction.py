@@ -0,0 +1,301 @@
+import gzip
+import json
+import logging
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+from scr.AWSS3Loader import (
+    COMPACTION_MANIFEST_NAME,
+    CONTENT_HASH_METADATA,
+    file_sha256_b64,
+    key_range_value,
+    s3_bucket,
+    s3_object_key,
+)
+from scr.S3ListingIndex import get_listing_index
+from scr.SidecarIndex import sidecar_index_key
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class CompactionResult:
+    """Outcome of compacting one directory of parts."""
+    prefix: str
+    source_parts: List[str] = field(default_factory=list)
+    compacted_parts: List[str] = field(default_factory=list)
+    deleted_parts: List[str] = field(default_factory=list)
+    skipped: bool = False
+    conflict: bool = False
+
+
+class CompactionError(Exception):
+    """S3 refused to delete parts of a compaction."""
+    pass
+
+
+def _read_manifest(bucket, prefix: str) -> Optional[Dict]:
+    try:
+        body = bucket.Object(f"{prefix}{COMPACTION_MANIFEST_NAME}").get()['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(body)
+
+
+def _delete_keys(bucket, keys: List[str]) -> None:
+    """
+    Batch delete (up to 1000 keys per request).
+
+    Raises:
+        CompactionError: If S3 reports keys it could not delete
+    """
+    index = get_listing_index()
+    errors = []
+    for i in range(0, len(keys), 1000):
+        response = bucket.delete_objects(Delete={'Objects': [{'Key': k} for k in keys[i:i + 1000]]})
+        if index is not None:
+            index.record_delete(bucket.name, [deleted['Key'] for deleted in response.get('Deleted', [])])
+        errors.extend(response.get('Errors', []))
+    if errors:
+        raise CompactionError(
+            f"Failed to delete {len(errors)} object(s): "
+            + ', '.join(f"{error['Key']} ({error.get('Code')}: {error.get('Message')})" for error in errors[:5])
+        )
+
+
+def _list_parts(bucket, prefix: str) -> Dict[str, object]:
+    """Parts directly in one directory (not in sub-directories), key -> ObjectSummary."""
+    return {
+        obj.key: obj for obj in bucket.objects.filter(Prefix=prefix)
+        if obj.key.endswith('.parquet.gz') and '/' not in obj.key[len(prefix):]
+    }
+
+
+def _merged_metadata(client, bucket_name: str, source_keys: List[str]) -> Dict[str, str]:
+    """
+    Metadata of a compacted part from the metadata of its sources (in upload order).
+
+    The key range covers every source if all of them were split on the same key;
+    the source partition state is the one of the newest source that has it.
+    """
+    sources = [client.head_object(Bucket=bucket_name, Key=key)['Metadata'] for key in source_keys]
+    metadata = {'compacted-from': str(len(source_keys))}
+
+    split_keys = {source.get('split-key') for source in sources}
+    if len(split_keys) == 1 and None not in split_keys and all('key-min' in s and 'key-max' in s for s in sources):
+        ranged = [source for source in sources if source['key-min'] != '']
+        metadata['split-key'] = split_keys.pop()
+        metadata['key-min'] = min((s['key-min'] for s in ranged), key=key_range_value, default='')
+        metadata['key-max'] = max((s['key-max'] for s in ranged), key=key_range_value, default='')
+
+    for source in reversed(sources):
+        if 'source-last-modified' in source:
+            metadata.update({k: source[k] for k in ('source-rows', 'source-last-modified') if k in source})
+            break
+    return metadata
+
+
+def _put_manifest(bucket, prefix: str, manifest: Dict) -> None:
+    key = f"{prefix}{COMPACTION_MANIFEST_NAME}"
+    body = json.dumps(manifest, indent=2).encode('utf-8')
+    bucket.put_object(Key=key, Body=body)
+    index = get_listing_index()
+    if index is not None:
+        index.record_upload(bucket.name, key, len(body))
+
+
+def _write_compacted_parts(
+    source_paths: List[Path],
+    out_dir: Path,
+    schema: pa.Schema,
+    target_bytes: int,
+    compression: str,
+) -> List[Path]:
+    """Stream record batches of the source parts into new parts of about target_bytes (in-memory size)."""
+    out_paths: List[Path] = []
+    writer = None
+    written = 0
+    for source_path in source_paths:
+        parquet_file = pq.ParquetFile(str(source_path))
+        for batch in parquet_file.iter_batches():
+            table = pa.Table.from_batches([batch])
+            for f in schema:
+                if f.name not in table.column_names:
+                    table = table.append_column(f.name, pa.nulls(table.num_rows, f.type))
+            table = table.select(schema.names).cast(schema, safe=False)
+            if writer is not None and written + table.nbytes > target_bytes:
+                writer.close()
+                writer = None
+            if writer is None:
+                out_paths.append(out_dir / f"compacted_part{len(out_paths):02d}.parquet")
+                writer = pq.ParquetWriter(str(out_paths[-1]), schema, compression=compression)
+                written = 0
+            writer.write_table(table)
+            written += table.nbytes
+    if writer is not None:
+        writer.close()
+    return out_paths
+
+
+def compact_prefix(
+    bucket,
+    prefix: str,
+    schema: Optional[pa.Schema] = None,
+    target_bytes: int = DEFAULT_TARGET_BYTES,
+    compression: str = 'snappy',
+    retire_grace: timedelta = timedelta(0),
+    dt_now: Optional[datetime] = None,
+) -> CompactionResult:
+    """
+    Merge the small .parquet.gz parts of one directory into parts of about target_bytes.
+
+    The compacted parts are uploaded first and carry the merged metadata of their
+    sources (key range, source partition state, content checksum). The directory is
+    then listed again: if any part was added, replaced or removed meanwhile (a
+    concurrent upload or sync), the compacted parts are deleted and the sources kept.
+    Otherwise a manifest (COMPACTION_MANIFEST_NAME) lists the current parts and the
+    retired ones, and the retired ones are deleted at once.
+
+    With retire_grace > 0 the retired parts stay for that long and are deleted by the
+    first run afterwards. Readers that list the directory skip them by the manifest
+    (scr.AWSS3Loader.retired_part_keys); readers that do not would see both copies.
+    The sidecar index (if any) refers to the old parts and is deleted together with them.
+
+    Args:
+        bucket: boto3 Bucket resource
+        prefix: Directory holding the parts, e.g. 'partner_metrics/amplitude/2025-12-09/'
+        schema: Schema of the compacted parts; defaults to the schema of the newest part
+        target_bytes: Part size (in-memory batch bytes)
+        compression: Parquet compression of the compacted parts
+        retire_grace: How long retired parts stay in S3; timedelta(0) (default) deletes them at once
+        dt_now: Compaction time used in object names; defaults to now (UTC)
+    Returns:
+        CompactionResult; conflict=True if a concurrent change made it back off
+
+    Raises:
+        CompactionError: If retired or rolled-back parts cannot be deleted
+    """
+    dt_now = dt_now or datetime.now(timezone.utc)
+    result = CompactionResult(prefix=prefix)
+    client = bucket.meta.client
+
+    manifest = _read_manifest(bucket, prefix)
+    retired = set(manifest.get('retired', [])) if manifest else set()
+    if manifest and retired and datetime.fromisoformat(manifest['delete_after']) <= dt_now:
+        _delete_keys(bucket, sorted(retired))
+        result.deleted_parts = sorted(retired)
+        manifest['retired'] = []
+        _put_manifest(bucket, prefix, manifest)
+        logger.info(f"{prefix}: deleted {len(retired)} retired part(s)")
+        retired = set()
+
+    listed = _list_parts(bucket, prefix)
+    objects = [obj for key, obj in listed.items() if key not in retired]
+    small = [obj for obj in objects if obj.size < target_bytes]
+    if len(small) < 2 or retired:
+        # Nothing to merge, or the previous compaction of this prefix is still in its grace period
+        result.skipped = True
+        return result
+    small.sort(key=lambda obj: obj.last_modified)
+    result.source_parts = [obj.key for obj in small]
+    metadata = _merged_metadata(client, bucket.name, result.source_parts)
+
+    with tempfile.TemporaryDirectory(prefix='s3_compaction_') as tmpdir:
+        tmp = Path(tmpdir)
+        source_paths = []
+        for i, obj in enumerate(small):
+            gz_path = tmp / f"source_{i:04d}.parquet.gz"
+            parquet_path = gz_path.with_suffix('')
+            bucket.download_file(obj.key, str(gz_path))
+            with gzip.open(gz_path, 'rb') as src, open(parquet_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            gz_path.unlink()
+            source_paths.append(parquet_path)
+
+        if schema is None:
+            schema = pq.read_schema(str(source_paths[-1]))
+        out_dir = tmp / 'out'
+        out_dir.mkdir()
+        for parquet_path in _write_compacted_parts(source_paths, out_dir, schema, target_bytes, compression):
+            gz_path = f"{parquet_path}.gz"
+            # No name and mtime in the gzip header, like BigQueryExporter.gzip_file
+            with open(parquet_path, 'rb') as src, open(gz_path, 'wb') as raw:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as dst:
+                    shutil.copyfileobj(src, dst)
+            key = s3_object_key(prefix, dt_now)
+            part_metadata = {**metadata, CONTENT_HASH_METADATA: file_sha256_b64(gz_path)}
+            bucket.upload_file(gz_path, key, ExtraArgs={'Metadata': part_metadata, 'ChecksumAlgorithm': 'SHA256'})
+            if get_listing_index() is not None:
+                get_listing_index().record_upload(bucket.name, key, Path(gz_path).stat().st_size)
+            result.compacted_parts.append(key)
+
+    # Back off if the directory changed while the sources were merged
+    before = {key: obj.e_tag for key, obj in listed.items()}
+    after = {key: obj.e_tag for key, obj in _list_parts(bucket, prefix).items() if key not in result.compacted_parts}
+    if before != after:
+        logger.warning(f"{prefix}: parts changed during compaction, dropped the compacted parts and kept the sources")
+        _delete_keys(bucket, result.compacted_parts)
+        result.compacted_parts = []
+        result.skipped = True
+        result.conflict = True
+        return result
+
+    to_retire = result.source_parts + [sidecar_index_key(prefix)]
+    current = sorted(set(obj.key for obj in objects) - set(result.source_parts)) + result.compacted_parts
+    manifest = {
+        'compacted_at': dt_now.isoformat(),
+        'parts': current,
+        'retired': to_retire,
+        'delete_after': (dt_now + retire_grace).isoformat(),
+    }
+    _put_manifest(bucket, prefix, manifest)
+    if retire_grace <= timedelta(0):
+        _delete_keys(bucket, to_retire)
+        result.deleted_parts = to_retire
+        manifest['retired'] = []
+        _put_manifest(bucket, prefix, manifest)
+
+    logger.info(f"{prefix}: compacted {len(result.source_parts)} part(s) into {len(result.compacted_parts)}")
+    return result
+
+
+def compact_prefixes(
+    prefixes: List[str],
+    schema: Optional[pa.Schema] = None,
+    target_bytes: int = DEFAULT_TARGET_BYTES,
+    compression: str = 'snappy',
+    retire_grace: timedelta = timedelta(0),
+    bucket_name: Optional[str] = None,
+    max_workers: int = 4,
+) -> List[CompactionResult]:
+    """
+    Compact many prefixes in parallel; each worker uses its own boto3 resource.
+
+    Prefixes may be partition prefixes ('entity/YYYY-MM-DD/') or Hive sub-directories
+    ('entity/YYYY-MM-DD/hour=05/'); parts in deeper directories are not merged with them.
+    """
+    dt_now = datetime.now(timezone.utc)
+
+    def _compact(prefix: str) -> CompactionResult:
+        prefix = prefix if prefix.endswith('/') else f"{prefix}/"
+        return compact_prefix(s3_bucket(bucket_name), prefix, schema, target_bytes, compression, retire_grace, dt_now)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_compact, prefixes))
+    compacted = [r for r in results if not r.skipped]
+    logger.info(f"Compaction finished: {len(compacted)}/{len(prefixes)} prefix(es) compacted")
+    return results
@@ -0,0 +1,143 @@
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (bucket, key)
+);
+"""
+
+
+@dataclass
+class IndexedObject:
+    """One object of the listing index."""
+    key: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class S3ListingIndex():
+    """
+    In-memory SQLite copy of S3 listings (key, size, ETag), keyed by bucket and prefix.
+
+    The index only lives for one run (nothing is persisted): the first listing of a prefix by this index
+    pages through it in full, later listings of that prefix (or of a prefix below it)
+    are answered locally, and uploads and deletes made by this process are recorded
+    directly. Changes by other writers are seen by the next full listing (refresh),
+    at the latest in the next run. S3 keys are random, so there is no key order in
+    which new objects could be fetched incrementally.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listed: Set[Tuple[str, str]] = set()  # (bucket, prefix) listed in full by this run
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def is_listed(self, bucket_name: str, prefix: str) -> bool:
+        """True if this run has listed the prefix, or a prefix above it, in full."""
+        with self._lock:
+            return any(b == bucket_name and prefix.startswith(p) for b, p in self._listed)
+
+    def refresh(self, bucket, prefix: str) -> int:
+        """
+        List a prefix in full (one paginated listing) and replace its rows in the index.
+
+        Args:
+            bucket: boto3 Bucket resource
+            prefix: Key prefix
+        Returns:
+            Number of keys returned by S3
+        """
+        rows = []
+        for page in bucket.meta.client.get_paginator('list_objects_v2').paginate(Bucket=bucket.name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                rows.append((bucket.name, obj['Key'], obj['Size'], obj.get('ETag'), obj['LastModified'].isoformat()))
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM objects WHERE bucket = ? AND substr(key, 1, ?) = ?",
+                (bucket.name, len(prefix), prefix),
+            )
+            self._conn.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)", rows)
+            self._listed.add((bucket.name, prefix))
+        logger.info(f"Listing index s3://{bucket.name}/{prefix}: {len(rows)} key(s) listed in full")
+        return len(rows)
+
+    def list_objects(self, bucket, prefix: str, refresh: Optional[bool] = None) -> List[IndexedObject]:
+        """
+        Objects under a prefix, in key order.
+
+        Args:
+            bucket: boto3 Bucket resource
+            prefix: Key prefix
+            refresh: True lists the prefix from S3 first, False only reads the index,
+                None (default) lists it from S3 unless this run already has
+        """
+        if refresh or (refresh is None and not self.is_listed(bucket.name, prefix)):
+            self.refresh(bucket, prefix)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size, etag, last_modified FROM objects "
+                "WHERE bucket = ? AND substr(key, 1, ?) = ? ORDER BY key",
+                (bucket.name, len(prefix), prefix),
+            ).fetchall()
+        return [IndexedObject(*row) for row in rows]
+
+    def record_upload(
+        self,
+        bucket_name: str,
+        key: str,
+        size: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[datetime] = None,
+    ) -> None:
+        """Add an object this process has written."""
+        last_modified = (last_modified or datetime.now(timezone.utc)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+                (bucket_name, key, size, etag, last_modified),
+            )
+
+    def record_delete(self, bucket_name: str, keys: List[str]) -> None:
+        """Drop objects this process has deleted."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key = ?",
+                [(bucket_name, key) for key in keys],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_listing_index: Optional[S3ListingIndex] = None
+
+
+def use_listing_index() -> S3ListingIndex:
+    """Turn on the process-wide listing index used by S3Uploader, S3LogsToBigQueryLoader and the scripts."""
+    global _listing_index
+    if _listing_index is None:
+        _listing_index = S3ListingIndex()
+    return _listing_index
+
+
+def get_listing_index() -> Optional[S3ListingIndex]:
+    """The process-wide listing index, or None if use_listing_index was not called."""
+    return _listing_index
@@ -0,0 +1,301 @@
+import gzip
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from scr.AWSS3Loader import (
+    S3Uploader,
+    S3UploadError,
+    checksums_match,
+    composite_sha256_b64,
+    get_s3_client,
+    s3_object_key,
+    s3_partition_prefix,
+    sha256_b64,
+)
+from scr.BigqueryToJson import BigQueryExporter, align_table_to_schema, sanitize_schema
+
+
+logger = logging.getLogger(__name__)
+
+# Part size and upload threads of streamed objects; objects below multipart_threshold go up with one PUT
+DEFAULT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+)
+
+
+class S3MultipartWriter():
+    """
+    Write-only file object that uploads one S3 object while it is being written.
+
+    Written bytes are cut into transfer_config.multipart_chunksize parts, which
+    max_concurrency threads send as a multipart upload. At most twice that many parts
+    are held in memory; write blocks while they are in flight. Closing sends the rest
+    and completes the upload, so the object appears as soon as the last byte is written.
+    On error the multipart upload is aborted and no object is created.
+
+    Every part carries its SHA256, which S3 checks on arrival; the checksum of the
+    completed object is compared with the one expected from the parts.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        key: str,
+        metadata: Optional[Dict[str, str]] = None,
+        transfer_config: Optional[TransferConfig] = None,
+        client=None,
+    ):
+        self.bucket_name = bucket_name
+        self.key = key
+        self.metadata = metadata or {}
+        self.transfer_config = transfer_config or DEFAULT_TRANSFER_CONFIG
+        self.client = client or get_s3_client()
+        self.closed = False
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id: Optional[str] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._futures: List[Future] = []
+        self._slots = threading.BoundedSemaphore(self.transfer_config.max_concurrency * 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed S3MultipartWriter")
+        self._buffer += data
+        self._position += len(data)
+        chunksize = self.transfer_config.multipart_chunksize
+        if self._upload_id is None and len(self._buffer) < max(chunksize, self.transfer_config.multipart_threshold):
+            return len(data)
+        while len(self._buffer) >= chunksize:
+            self._send_part(self._buffer[:chunksize])
+            del self._buffer[:chunksize]
+        return len(data)
+
+    def _start(self) -> None:
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            Metadata=self.metadata,
+            ChecksumAlgorithm='SHA256',
+        )
+        self._upload_id = response['UploadId']
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.transfer_config.max_concurrency,
+            thread_name_prefix='s3-multipart',
+        )
+        logger.info(f"Started multipart upload of s3://{self.bucket_name}/{self.key}")
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict:
+        try:
+            checksum = sha256_b64(body)
+            response = self.client.upload_part(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=body,
+                ChecksumSHA256=checksum,
+            )
+            return {'PartNumber': part_number, 'ETag': response['ETag'], 'ChecksumSHA256': checksum}
+        finally:
+            self._slots.release()
+
+    def _send_part(self, body: bytearray) -> None:
+        if self._upload_id is None:
+            self._start()
+        # Fail fast instead of streaming the rest of the export into a broken upload
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        self._slots.acquire()
+        self._futures.append(self._pool.submit(self._upload_part, len(self._futures) + 1, bytes(body)))
+
+    def close(self) -> None:
+        """Send the remaining bytes and complete the upload (one PUT for small objects)."""
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                expected = sha256_b64(bytes(self._buffer))
+                response = self.client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    Body=bytes(self._buffer),
+                    Metadata=self.metadata,
+                    ChecksumAlgorithm='SHA256',
+                    ChecksumSHA256=expected,
+                )
+            else:
+                if self._buffer:
+                    self._send_part(self._buffer)
+                    self._buffer = bytearray()
+                parts = [future.result() for future in self._futures]
+                expected = composite_sha256_b64([part['ChecksumSHA256'] for part in parts])
+                response = self.client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': parts},
+                )
+                self._pool.shutdown()
+            if not checksums_match(expected, response.get('ChecksumSHA256', expected)):
+                self.client.delete_object(Bucket=self.bucket_name, Key=self.key)
+                raise S3UploadError(
+                    f"Checksum mismatch for {self.key}: expected {expected}, S3 has {response['ChecksumSHA256']}"
+                )
+        except ClientError as e:
+            self.abort()
+            raise S3UploadError(f"Failed to upload to S3: {str(e)}")
+        except BaseException:
+            self.abort()
+            raise
+        self.closed = True
+        logger.info(f"Uploaded {self._position:,} bytes to s3://{self.bucket_name}/{self.key}")
+
+    def abort(self) -> None:
+        """Drop the upload; parts already sent are discarded by S3."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._pool is not None:
+            for future in self._futures:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+        if self._upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id)
+            except ClientError as e:
+                logger.error(f"Failed to abort multipart upload of {self.key}: {e}")
+        logger.warning(f"Aborted upload of s3://{self.bucket_name}/{self.key}")
+
+
+def stream_export_to_s3(
+    exporter: BigQueryExporter,
+    query: str,
+    entity_path: str,
+    dt_partition: datetime,
+    dt_now: Optional[datetime] = None,
+    schema: Optional[pa.Schema] = None,
+    compression: str = 'snappy',
+    use_compliant_nested_type: bool = True,
+    clear_path_before_upload: bool = True,
+    bucket_name: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    transfer_config: Optional[TransferConfig] = None,
+    sync_path: bool = True,
+) -> str:
+    """
+    Export a query straight into one .parquet.gz object in S3, without a local file.
+
+    Record batches are written to Parquet, gzipped and handed to an S3MultipartWriter
+    as they arrive, so upload runs alongside the BigQuery read and the object is
+    complete right after the last batch.
+
+    The partition is only touched once the query has succeeded. By default its old
+    objects are deleted after the new one is complete (S3Uploader.sync_s3_path), so a
+    failed export leaves the partition as it was.
+
+    Args:
+        exporter: Entered BigQueryExporter
+        query: SQL text
+        entity_path: S3 entity path, as for S3Uploader
+        dt_partition: Partition date (UTC)
+        dt_now: Upload time used in the object name; defaults to now (UTC)
+        schema: Optional pyarrow.Schema to align/cast before write
+        compression: Parquet compression, default 'snappy'
+        use_compliant_nested_type: Nested list format, see BigQueryExporter.export_to_parquet
+        clear_path_before_upload: Replace the partition's old objects
+        bucket_name: Upload to this bucket instead of the configured one
+        metadata: S3 user metadata stored with the object
+        transfer_config: Part size and concurrency, defaults to DEFAULT_TRANSFER_CONFIG
+        sync_path: Delete the old objects after the upload; False clears the partition
+            after the query succeeded but before the upload starts
+    Returns:
+        str: Key of the uploaded object
+
+    Raises:
+        S3UploaderError: If clearing the prefix or the upload fails
+    """
+    uploader = S3Uploader(entity_path=entity_path, dt_partition=dt_partition, bucket_name=bucket_name)
+    s3_prefix = s3_partition_prefix(entity_path, dt_partition)
+    s3_key = s3_object_key(s3_prefix, dt_now or datetime.now(timezone.utc))
+
+    result = exporter.run_query(query)
+    if schema is not None:
+        schema = sanitize_schema(schema)
+
+    stale_keys = None
+    if clear_path_before_upload and sync_path:
+        stale_keys = uploader.list_s3_path(s3_prefix)
+    elif clear_path_before_upload:
+        uploader.clear_s3_path(s3_prefix)
+
+    total_rows = 0
+    with S3MultipartWriter(
+        uploader.config.bucket_name,
+        s3_key,
+        metadata=metadata,
+        transfer_config=transfer_config,
+        client=get_s3_client(uploader.config),
+    ) as s3_file:
+        with gzip.GzipFile(fileobj=s3_file, mode='wb') as gz:
+            writer = None
+            try:
+                for batch in result.to_arrow_iterable():
+                    chunk = pa.Table.from_batches([batch])
+                    if schema is not None:
+                        chunk = align_table_to_schema(chunk, schema, strict=exporter.strict_schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(
+                            gz,
+                            chunk.schema,
+                            compression=compression,
+                            use_compliant_nested_type=use_compliant_nested_type,
+                        )
+                    writer.write_table(chunk)
+                    total_rows += chunk.num_rows
+                if writer is None:
+                    # Empty result: still produce one (empty) file like the other export paths
+                    writer = pq.ParquetWriter(
+                        gz,
+                        schema or pa.schema([]),
+                        compression=compression,
+                        use_compliant_nested_type=use_compliant_nested_type,
+                    )
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    uploader.record_upload(s3_key, s3_file.tell())
+    logger.info(f"Streamed {total_rows} rows to s3://{uploader.config.bucket_name}/{s3_key}")
+    if stale_keys is not None:
+        uploader.sync_s3_path(s3_prefix, stale_keys, [s3_key])
+    return s3_key
@@ -0,0 +1,182 @@
+import gzip
+import io
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+from scr.S3ListingIndex import get_listing_index
+
+
+logger = logging.getLogger(__name__)
+
+# Indexes live under their own top-level prefix, outside the partner-facing partitions:
+# partition listings, sync and compaction only ever see the parts
+SIDECAR_INDEX_PREFIX = '_sidecar_index/'
+
+INDEX_SCHEMA = pa.schema([
+    pa.field('key', pa.string()),
+    pa.field('value', pa.string()),
+    pa.field('part', pa.string()),
+    pa.field('row_group', pa.int32()),
+])
+
+
+class SidecarIndexNotFound(LookupError):
+    """The partition has no sidecar index."""
+    pass
+
+
+def sidecar_index_key(s3_prefix: str) -> str:
+    """S3 key of the sidecar index of one partition prefix."""
+    return f"{SIDECAR_INDEX_PREFIX}{s3_prefix}index.arrow"
+
+
+def build_sidecar_index(parquet_paths: List[str], key_columns: List[str]) -> pa.Table:
+    """
+    Map every distinct key value to the part and row group holding it.
+
+    Args:
+        parquet_paths: Local parquet parts of one partition
+        key_columns: Columns to index, e.g. ['order_id'] or ['device_id', 'uuid']
+    Returns:
+        pyarrow.Table with INDEX_SCHEMA, sorted by (key, value); 'part' is the local path
+    """
+    pieces: List[pa.Table] = []
+    for path in parquet_paths:
+        parquet_file = pq.ParquetFile(str(path))
+        columns = [c for c in key_columns if c in parquet_file.schema_arrow.names]
+        for row_group in range(parquet_file.num_row_groups):
+            group = parquet_file.read_row_group(row_group, columns=columns)
+            for key in columns:
+                values = pc.unique(pc.drop_null(group.column(key))).cast(pa.string())
+                pieces.append(pa.table({
+                    'key': pa.array([key] * len(values), pa.string()),
+                    'value': values,
+                    'part': pa.array([str(path)] * len(values), pa.string()),
+                    'row_group': pa.array([row_group] * len(values), pa.int32()),
+                }, schema=INDEX_SCHEMA))
+
+    if not pieces:
+        return INDEX_SCHEMA.empty_table()
+    index = pa.concat_tables(pieces).sort_by([('key', 'ascending'), ('value', 'ascending')])
+    logger.info(f"Built sidecar index with {index.num_rows} entries for {len(parquet_paths)} part(s)")
+    return index
+
+
+def upload_sidecar_index(index: pa.Table, part_keys: Dict[str, str], bucket, s3_prefix: str) -> str:
+    """
+    Replace local part paths with S3 keys and upload the index as an Arrow IPC file.
+
+    Args:
+        index: Table from build_sidecar_index
+        part_keys: Local part path (.parquet or .parquet.gz) -> uploaded S3 key
+        bucket: boto3 Bucket resource
+        s3_prefix: Partition prefix the parts were uploaded to; the index replaces the previous one
+    Returns:
+        str: S3 key of the sidecar index
+    """
+    local_parts = index.column('part').unique().to_pylist()
+    s3_keys = [part_keys.get(p, part_keys.get(f"{p}.gz", p)) for p in local_parts]
+    positions = pc.index_in(index.column('part'), value_set=pa.array(local_parts, pa.string()))
+    index = index.set_column(
+        index.schema.get_field_index('part'),
+        'part',
+        pc.take(pa.array(s3_keys, pa.string()), positions),
+    )
+
+    sink = io.BytesIO()
+    with ipc.new_file(sink, index.schema) as writer:
+        writer.write_table(index)
+    key = sidecar_index_key(s3_prefix)
+    bucket.put_object(Key=key, Body=sink.getvalue())
+    listing_index = get_listing_index()
+    if listing_index is not None:
+        listing_index.record_upload(bucket.name, key, len(sink.getvalue()))
+    logger.info(f"Uploaded sidecar index ({index.num_rows} entries) to {key}")
+    return key
+
+
+def delete_sidecar_index(bucket, s3_prefix: str) -> str:
+    """
+    Delete the sidecar index of one partition prefix (a no-op if there is none).
+
+    Returns:
+        str: S3 key of the deleted index
+    """
+    key = sidecar_index_key(s3_prefix)
+    bucket.Object(key).delete()
+    listing_index = get_listing_index()
+    if listing_index is not None:
+        listing_index.record_delete(bucket.name, [key])
+    logger.info(f"Deleted sidecar index {key}")
+    return key
+
+
+def lookup(bucket, s3_prefix: str, key: str, value: str) -> List[Tuple[str, int]]:
+    """
+    Find the parts and row groups of a partition that contain key == value.
+
+    Returns:
+        List of (S3 key of the part, row group number)
+
+    Raises:
+        SidecarIndexNotFound: If the partition was uploaded without a sidecar index
+    """
+    index_key = sidecar_index_key(s3_prefix)
+    try:
+        body = bucket.Object(index_key).get()['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            raise SidecarIndexNotFound(
+                f"No sidecar index for s3://{bucket.name}/{s3_prefix} (expected {index_key}); "
+                f"upload the partition with index keys or scan its parts instead"
+            )
+        raise
+    index = ipc.open_file(pa.py_buffer(body)).read_all()
+    mask = pc.and_(pc.equal(index.column('key'), key), pc.equal(index.column('value'), str(value)))
+    matches = index.filter(mask)
+    return list(zip(matches.column('part').to_pylist(), matches.column('row_group').to_pylist()))
+
+
+def _download_part(bucket, s3_key: str, tmpdir: Path) -> Path:
+    """Download one .parquet.gz part and unpack it to a local .parquet file."""
+    gz_path = tmpdir / Path(s3_key).name
+    parquet_path = gz_path.with_suffix('')
+    bucket.download_file(s3_key, str(gz_path))
+    with gzip.open(gz_path, 'rb') as src, open(parquet_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    return parquet_path
+
+
+def fetch_rows(bucket, s3_key: str, row_group: int, key: str, value: str) -> pa.Table:
+    """
+    Download one part and read only the matching rows of one row group.
+
+    Download-then-filter: parts are whole-file gzip, which has no byte offsets per
+    row group, so the object is downloaded in full; only the requested row group is decoded.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        group = pq.ParquetFile(str(_download_part(bucket, s3_key, Path(tmpdir)))).read_row_group(row_group)
+    return group.filter(pc.equal(group.column(key).cast(pa.string()), str(value)))
+
+
+def fetch_rows_in_range(bucket, s3_key: str, key: str, key_min: str, key_max: str) -> pa.Table:
+    """
+    Download one part and read the rows with key_min <= key <= key_max.
+
+    The bounds are cast to the column type, so timestamps and numbers compare by value.
+    Use scr.AWSS3Loader.list_parts_in_key_range to find the parts worth downloading.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        table = pq.read_table(str(_download_part(bucket, s3_key, Path(tmpdir))))
+    column = table.column(key)
+    low, high = pc.cast(pa.array([key_min, key_max]), column.type).to_pylist()
+    return table.filter(pc.and_(pc.greater_equal(column, low), pc.less_equal(column, high)))
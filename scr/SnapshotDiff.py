@@ -0,0 +1,282 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pandas.util import hash_array
+
+from scr.AWSS3Loader import S3Uploader
+from scr.BigqueryToJson import BigQueryExporter
+
+
+CHANGE_TYPE_COLUMN = '_change_type'
+
+# Stored with the hash state; state written with another row encoding forces a full snapshot
+ROW_HASH_VERSION = '3'
+
+# A value is encoded as b'<length>:<bytes>', so b'N' can only stand for null
+_NULL_TOKEN = pa.scalar(b'N', pa.large_binary())
+_EMPTY = pa.scalar(b'', pa.large_binary())
+
+
+def _length_prefixed(encoded: pa.Array) -> pa.Array:
+    """Prefix every value with its length, so concatenated values cannot run into each other."""
+    lengths = pc.cast(pc.cast(pc.binary_length(encoded), pa.string()), pa.large_binary())
+    return pc.binary_join_element_wise(lengths, pa.scalar(b':', pa.large_binary()), encoded, _EMPTY)
+
+
+def _encode_array(array: pa.Array) -> pa.Array:
+    """
+    Canonical large_binary encoding of every value of an array, computed column-wise.
+
+    Scalars use their Arrow string form (floats in the shortest round-trip form, so
+    NaN and -0.0 stay distinct), lists and structs are the concatenation of their
+    encoded items, nulls become b'N'. Equal values encode equal whatever the chunking.
+    """
+    array_type = array.type
+    if pa.types.is_null(array_type):
+        return pa.array([b'N'] * len(array), pa.large_binary())
+    if pa.types.is_dictionary(array_type):
+        return _encode_array(array.dictionary_decode())
+    if pa.types.is_list(array_type) or pa.types.is_large_list(array_type) or pa.types.is_map(array_type):
+        list_class = pa.LargeListArray if pa.types.is_large_list(array_type) else pa.ListArray
+        items = list_class.from_arrays(array.offsets, _encode_array(array.values))
+        encoded = pc.binary_join(items, _EMPTY)
+    elif pa.types.is_struct(array_type):
+        children = [_encode_array(child) for child in array.flatten()]
+        encoded = pc.binary_join_element_wise(*children, _EMPTY) if children else pa.array([b''] * len(array), pa.large_binary())
+    elif pa.types.is_binary(array_type) or pa.types.is_large_binary(array_type) or pa.types.is_string(array_type) or pa.types.is_large_string(array_type):
+        encoded = pc.cast(array, pa.large_binary())
+    else:
+        try:
+            encoded = pc.cast(pc.cast(array, pa.string()), pa.large_binary())
+        except pa.ArrowNotImplementedError:
+            # Types without an Arrow string cast (e.g. fixed size lists) go through Python
+            encoded = pa.array([None if value is None else str(value).encode('utf-8') for value in array.to_pylist()], pa.large_binary())
+    return pc.if_else(pc.is_valid(array), _length_prefixed(encoded), _NULL_TOKEN)
+
+
+def row_hashes(table: pa.Table, key_column: str) -> pa.Table:
+    """
+    Hash every row of a table from a canonical encoding of its values.
+
+    Every column is encoded column-wise (see _encode_array), the columns of a row are
+    joined with binary_join_element_wise and the result is hashed with
+    pandas.util.hash_array (SipHash with a fixed key). Equal rows hash equal whatever
+    their position, chunking or nesting (struct/list).
+
+    Returns:
+        pyarrow.Table with columns key_column and 'row_hash' (uint64)
+    """
+    columns = [
+        pa.chunked_array([_encode_array(chunk) for chunk in column.chunks], pa.large_binary())
+        for column in table.columns
+    ]
+    if columns:
+        rows = pc.binary_join_element_wise(*columns, _EMPTY)
+    else:
+        rows = pa.chunked_array([pa.array([b''] * table.num_rows, pa.large_binary())])
+    hashes = hash_array(rows.to_numpy(zero_copy_only=False)) if table.num_rows else []
+    return pa.table({
+        key_column: table.column(key_column),
+        'row_hash': pa.array(hashes, pa.uint64()),
+    })
+
+
+class SnapshotDiff():
+    """
+    Change-data-capture for entities exported as full snapshots (e.g. catalogs).
+
+    Per-row hashes of the last published snapshot are kept in a local state file.
+    Each run is diffed against them to produce inserted / updated / deleted rows;
+    a full snapshot is still published every full_snapshot_every.
+    """
+
+    def __init__(
+        self,
+        entity_path: str,
+        key_column: str = 'id',
+        state_dir: str = 'state/snapshot_hashes',
+        full_snapshot_every: timedelta = timedelta(days=7),
+    ):
+        """
+        Initialize the diff.
+
+        Args:
+            entity_path: S3 entity path; also names the state file
+            key_column: Primary key of the entity
+            state_dir: Directory holding the hash state files
+            full_snapshot_every: Maximum age of the last full snapshot before a new one is published
+        """
+        self.logger = logging.getLogger(__name__)
+        self.entity_path = entity_path
+        self.key_column = key_column
+        self.full_snapshot_every = full_snapshot_every
+        self.state_path = Path(state_dir) / f"{entity_path.strip('/').replace('/', '__')}.parquet"
+        self._current_hashes: Optional[pa.Table] = None
+
+    def _load_state(self) -> Optional[pa.Table]:
+        """Hashes of the last published snapshot, or None on the first run."""
+        if not self.state_path.exists():
+            return None
+        return pq.read_table(self.state_path)
+
+    def last_full_snapshot_at(self) -> Optional[datetime]:
+        """Time of the last full snapshot, from the state file metadata."""
+        if not self.state_path.exists():
+            return None
+        metadata = pq.read_schema(self.state_path).metadata or {}
+        value = metadata.get(b'last_full_snapshot_at')
+        return datetime.fromisoformat(value.decode()) if value else None
+
+    def needs_full_snapshot(self, dt_now: Optional[datetime] = None) -> bool:
+        """True if there is no state yet, it was hashed differently or the last full snapshot is too old."""
+        last_full = self.last_full_snapshot_at()
+        if last_full is None:
+            return True
+        metadata = pq.read_schema(self.state_path).metadata or {}
+        if metadata.get(b'row_hash_version', b'').decode() != ROW_HASH_VERSION:
+            return True
+        dt_now = dt_now or datetime.now(timezone.utc)
+        return dt_now - last_full >= self.full_snapshot_every
+
+    def diff(self, table: pa.Table) -> pa.Table:
+        """
+        Rows inserted, updated or deleted since the last published snapshot.
+
+        Inserted and updated rows are returned in full; deleted rows only carry the key.
+        A '_change_type' column ('insert' / 'update' / 'delete') is appended.
+        """
+        self._current_hashes = row_hashes(table, self.key_column)
+        previous = self._load_state()
+        if previous is None:
+            previous = self._current_hashes.schema.empty_table()
+
+        joined = self._current_hashes.join(
+            previous,
+            keys=self.key_column,
+            join_type='full outer',
+            left_suffix='_current',
+            right_suffix='_previous',
+        )
+        current_hash = joined.column('row_hash_current')
+        previous_hash = joined.column('row_hash_previous')
+        keys = joined.column(self.key_column)
+
+        inserted = keys.filter(pc.and_(pc.is_valid(current_hash), pc.is_null(previous_hash)))
+        updated = keys.filter(pc.and_(
+            pc.and_(pc.is_valid(current_hash), pc.is_valid(previous_hash)),
+            pc.not_equal(current_hash, previous_hash),
+        ))
+        deleted = keys.filter(pc.and_(pc.is_null(current_hash), pc.is_valid(previous_hash)))
+
+        parts = []
+        for change_type, change_keys in (('insert', inserted), ('update', updated)):
+            rows = table.filter(pc.is_in(table.column(self.key_column), value_set=change_keys.combine_chunks()))
+            parts.append(rows.append_column(CHANGE_TYPE_COLUMN, pa.array([change_type] * rows.num_rows, pa.string())))
+        deleted_rows = pa.table({
+            field.name: deleted.cast(field.type) if field.name == self.key_column else pa.nulls(len(deleted), field.type)
+            for field in table.schema
+        })
+        parts.append(deleted_rows.append_column(CHANGE_TYPE_COLUMN, pa.array(['delete'] * len(deleted), pa.string())))
+
+        delta = pa.concat_tables(parts)
+        self.logger.info(
+            f"Snapshot diff for {self.entity_path}: {len(inserted)} inserted, "
+            f"{len(updated)} updated, {len(deleted)} deleted of {table.num_rows} rows"
+        )
+        return delta
+
+    def commit(self, full_snapshot: bool, dt_now: Optional[datetime] = None) -> None:
+        """
+        Persist the hashes of the snapshot diffed last. Call only after a successful upload.
+
+        Args:
+            full_snapshot: True if this run published a full snapshot
+            dt_now: Publication time; defaults to now (UTC)
+        """
+        if self._current_hashes is None:
+            raise RuntimeError("diff() must be called before commit()")
+        last_full = datetime.now(timezone.utc) if dt_now is None else dt_now
+        if not full_snapshot:
+            last_full = self.last_full_snapshot_at() or last_full
+        hashes = self._current_hashes.replace_schema_metadata({
+            'last_full_snapshot_at': last_full.isoformat(),
+            'row_hash_version': ROW_HASH_VERSION,
+        })
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        pq.write_table(hashes, tmp_path)
+        tmp_path.replace(self.state_path)
+        self.logger.info(f"Saved {hashes.num_rows} row hashes to {self.state_path}")
+
+
+def publish_snapshot(
+    exporter: BigQueryExporter,
+    table: pa.Table,
+    bq_table_addres: str,
+    entity_path: str,
+    dt_partition: datetime,
+    dt_now: Optional[datetime] = None,
+    key_column: str = 'id',
+    delta_entity_path: Optional[str] = None,
+    on_identical: str = 'upload',
+) -> bool:
+    """
+    Upload one day of an entity exported as a full snapshot (e.g. a catalog).
+
+    By default every run replaces the partition of entity_path with the full snapshot,
+    so its readers always find the whole entity. Consumers that read changes opt in with
+    delta_entity_path: between full snapshots (SnapshotDiff.full_snapshot_every) only the
+    inserted/updated/deleted rows are uploaded there and entity_path is left as it is.
+
+    Args:
+        exporter: Entered BigQueryExporter used to write the file
+        table: The snapshot
+        bq_table_addres: BigQuery table, names the local file
+        entity_path: S3 entity path of the full snapshots
+        dt_partition: Partition date (UTC)
+        dt_now: Upload time; defaults to now (UTC)
+        key_column: Primary key of the entity
+        delta_entity_path: S3 entity path of the deltas; None publishes full snapshots only
+        on_identical: See S3Uploader
+    Returns:
+        bool: True if the upload succeeded or there was nothing to upload
+    """
+    logger = logging.getLogger(__name__)
+    dt_now = dt_now or datetime.now(timezone.utc)
+
+    snapshot_diff = None
+    full_snapshot = True
+    if delta_entity_path:
+        # Row hashes of the last published snapshot live in a local state file
+        snapshot_diff = SnapshotDiff(entity_path=entity_path, key_column=key_column)
+        delta = snapshot_diff.diff(table)
+        full_snapshot = snapshot_diff.needs_full_snapshot(dt_now)
+
+    if full_snapshot:
+        parquet_gz_path = exporter.table_to_parquet_gzip(table, bq_table_addres=bq_table_addres)
+        upload_entity_path = entity_path
+    elif delta.num_rows:
+        parquet_gz_path = exporter.table_to_parquet_gzip(delta, bq_table_addres=f'{bq_table_addres}_delta')
+        upload_entity_path = delta_entity_path
+    else:
+        logger.info(f"No changes in {entity_path} since the last snapshot, nothing to upload")
+        return True
+
+    uploader = S3Uploader(
+        entity_path=upload_entity_path,
+        dt_now=dt_now,
+        dt_partition=dt_partition,
+        gzip_path=parquet_gz_path,
+        clear_path_before_upload=full_snapshot,  # deltas of a day accumulate
+        checksum_sha256=exporter.part_checksums.get(parquet_gz_path),
+        on_identical=on_identical,
+    )
+    success = uploader.run()
+    if success and snapshot_diff is not None:
+        snapshot_diff.commit(full_snapshot=full_snapshot, dt_now=dt_now)
+    return success
@@ -0,0 +1,135 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from config.cred.enviroment import Environment
+from scr.AWSS3Loader import s3_bucket
+
+
+class WatermarkStore():
+    """
+    Persistent export watermarks, one state file per entity, optionally split by partition day.
+
+    Values are stored as strings exactly as BigQuery returns them
+    (CAST(MAX(col) AS STRING)), so they can be put back into a query literal.
+    Every write replaces the state file atomically.
+
+    Exports select col > previous watermark AND col <= new watermark, where the new
+    watermark is MAX(col) taken before the export. The lower bound is strict, so the
+    column must grow monotonically as rows land (an ingestion or server upload time):
+    a row that arrives later with a value <= the stored watermark is never exported.
+
+    The local state file is per host; jobs that may run on more than one host use
+    shared_watermark_store instead, or both hosts export the same rows.
+    """
+
+    def __init__(self, state_dir: str = 'state/watermarks'):
+        """
+        Initialize the store.
+
+        Args:
+            state_dir: Directory holding one JSON state file per entity
+        """
+        self.logger = logging.getLogger(__name__)
+        self.state_dir = Path(state_dir)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _state_name(entity: str) -> str:
+        return f"{entity.strip('/').replace('/', '__')}.json"
+
+    def _read(self, entity: str) -> Dict[str, str]:
+        path = self.state_dir / self._state_name(entity)
+        if not path.exists():
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, entity: str, state: Dict[str, str]) -> None:
+        path = self.state_dir / self._state_name(entity)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        tmp_path.replace(path)
+
+    def get(self, entity: str, partition: Optional[str] = None) -> Optional[str]:
+        """Last successful watermark, or None if the entity/partition was never exported."""
+        with self._lock:
+            return self._read(entity).get(partition or '')
+
+    def set(self, entity: str, value: str, partition: Optional[str] = None) -> None:
+        """Advance the watermark. Call only after the upload succeeded."""
+        with self._lock:
+            state = self._read(entity)
+            state[partition or ''] = value
+            self._write(entity, state)
+        self.logger.info(f"Watermark for {entity} {partition or ''} set to {value}")
+
+    def reset(self, entity: str, partition: Optional[str] = None) -> None:
+        """Forget a watermark, so the next run exports the whole entity/partition again."""
+        with self._lock:
+            state = self._read(entity)
+            state.pop(partition or '', None)
+            self._write(entity, state)
+
+
+class S3WatermarkStore(WatermarkStore):
+    """
+    WatermarkStore kept as one S3 object per entity, so runs on different hosts share it.
+
+    A PUT replaces the object atomically; concurrent runs of the same entity are not supported.
+    The bucket must be one of ours, never the partner-facing export bucket.
+    """
+
+    def __init__(self, bucket, prefix: str = 'watermarks/'):
+        """
+        Initialize the store.
+
+        Args:
+            bucket: boto3 Bucket resource of the state bucket (see shared_watermark_store)
+            prefix: Key prefix of the state objects
+        """
+        super().__init__()
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _read(self, entity: str) -> Dict[str, str]:
+        try:
+            body = self.bucket.Object(f"{self.prefix}{self._state_name(entity)}").get()['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return {}
+            raise
+        return json.loads(body)
+
+    def _write(self, entity: str, state: Dict[str, str]) -> None:
+        self.bucket.put_object(
+            Key=f"{self.prefix}{self._state_name(entity)}",
+            Body=json.dumps(state, indent=2, sort_keys=True).encode('utf-8'),
+            ContentType='application/json',
+        )
+
+
+def shared_watermark_store(bucket_name: Optional[str] = None, prefix: str = 'watermarks/') -> S3WatermarkStore:
+    """
+    S3WatermarkStore in our own state bucket, shared by every host that runs a job.
+
+    Args:
+        bucket_name: State bucket; defaults to Environment.aws_s3_state_bucket_name
+        prefix: Key prefix of the state objects
+
+    Raises:
+        ValueError: If no state bucket is configured, or it is the partner-facing export bucket
+    """
+    env = Environment()
+    bucket_name = bucket_name or getattr(env, 'aws_s3_state_bucket_name', None)
+    if not bucket_name:
+        raise ValueError("No watermark state bucket: set aws_s3_state_bucket_name in Environment or pass bucket_name")
+    if bucket_name == getattr(env, 'aws_s3_bucket_name', None):
+        raise ValueError(f"Watermark state must not be kept in the partner-facing bucket {bucket_name}")
+    return S3WatermarkStore(s3_bucket(bucket_name), prefix)
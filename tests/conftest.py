@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeEnvironment():
+    """Environment without credentials: S3 settings for a local stand-in, no BigQuery client."""
+    aws_s3_access_key = 'testing'
+    aws_s3_secret_key = 'testing'
+    aws_s3_bucket_name = 'test-partner-bucket'
+    aws_s3_region_name = 'us-east-1'
+    bq_client = None
+
+
+class FakeRow(dict):
+    """Result row readable by key and by attribute, like google.cloud.bigquery.Row."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeRowIterator():
+    """Query result of FakeBigQueryClient, read the ways BigQueryExporter reads a RowIterator."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def to_arrow(self):
+        return self.table
+
+    def to_arrow_iterable(self):
+        return iter(self.table.to_batches(max_chunksize=2))
+
+    def __iter__(self):
+        return iter(FakeRow(row) for row in self.table.to_pylist())
+
+
+class FakeQueryJob():
+    def __init__(self, client, query, job_config):
+        self.client = client
+        self.query = query
+        self.job_config = job_config
+        self.job_id = f"job_{len(client.queries)}"
+        self.cache_hit = False
+        self.total_bytes_billed = client.bytes_processed
+        self.total_bytes_processed = client.bytes_processed
+        self.slot_millis = 1
+        self.destination = None if job_config and job_config.dry_run else f"{client.project}._anon.{self.job_id}"
+
+    def result(self):
+        return FakeRowIterator(self.client.result_for(self.query))
+
+
+class FakeBigQueryClient():
+    """
+    In-process BigQuery stand-in: every query returns `results[query]` (or `table`),
+    every result table has `result_bytes` bytes and every query scans `bytes_processed`.
+    Tables are time-partitioned on `partition_field` (None: not partitioned).
+    """
+
+    project = 'test-project'
+
+    def __init__(self, table=None, result_bytes=None, bytes_processed=0, results=None, partition_field=None):
+        self.table = table
+        self.result_bytes = result_bytes
+        self.bytes_processed = bytes_processed
+        self.results = results or {}
+        self.partition_field = partition_field
+        self.queries = []
+        self.jobs = []
+
+    def result_for(self, query):
+        return self.results.get(query, self.table)
+
+    def query(self, query, job_config=None):
+        self.queries.append(query)
+        self.jobs.append(FakeQueryJob(self, query, job_config))
+        return self.jobs[-1]
+
+    def get_table(self, table_id):
+        time_partitioning = SimpleNamespace(field=self.partition_field) if self.partition_field else None
+        return SimpleNamespace(table_id=table_id, num_bytes=self.result_bytes, time_partitioning=time_partitioning)
+
+
+@pytest.fixture
+def exporter(monkeypatch, tmp_path):
+    """BigQueryExporter writing into tmp_path; tests set exporter.client when they need BigQuery."""
+    pytest.importorskip('pyarrow')
+    pytest.importorskip('config.cred.enviroment')
+    import scr.BigqueryToJson as bigquery_to_json
+
+    monkeypatch.setattr(bigquery_to_json, 'Environment', FakeEnvironment)
+    exporter = bigquery_to_json.BigQueryExporter()
+    exporter.temp_dir = str(tmp_path)
+    return exporter
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    """Bucket of FakeEnvironment in an in-process S3 stand-in (moto), behind the shared client of scr.AWSS3Loader."""
+    moto = pytest.importorskip('moto')
+    pytest.importorskip('config.cred.enviroment')
+    import scr.AWSS3Loader as aws_s3_loader
+    import scr.S3ListingIndex as s3_listing_index
+
+    monkeypatch.setattr(aws_s3_loader, 'Environment', FakeEnvironment)
+    monkeypatch.setattr(aws_s3_loader, '_s3_resources', {})
+    monkeypatch.setattr(s3_listing_index, '_listing_index', None)
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN', 'AWS_PROFILE'):
+        monkeypatch.delenv(name, raising=False)
+    with moto.mock_aws():
+        bucket = aws_s3_loader.s3_bucket()
+        bucket.create()
+        yield bucket
@@ -0,0 +1,108 @@
+import gzip
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+pytest.importorskip('google.cloud.storage')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient, FakeEnvironment
+import scr.BigqueryExportData as export_data
+from scr.BigqueryExportData import BigQueryExportDataEngine, GCSConfig
+
+
+class FakeBlob():
+    def __init__(self, store, name, data):
+        self.store = store
+        self.name = name
+        self.data = data
+
+    def open(self, mode='rb'):
+        return io.BytesIO(self.data)
+
+    def delete(self):
+        del self.store.blobs[self.name]
+
+
+class FakeGCSClient():
+    """Intermediate bucket held in memory."""
+
+    def __init__(self):
+        self.blobs = {}
+
+    def add(self, name, table):
+        sink = io.BytesIO()
+        pq.write_table(table, sink)
+        self.blobs[name] = FakeBlob(self, name, sink.getvalue())
+
+    def bucket(self, name):
+        return name
+
+    def list_blobs(self, bucket_name, prefix=''):
+        return [blob for name, blob in sorted(self.blobs.items()) if name.startswith(prefix)]
+
+
+DT_PARTITION = datetime(2025, 11, 20)
+PREFIX = 'partner_metrics/amplitude/2025-11-20/'
+
+
+@pytest.fixture
+def engine(monkeypatch, s3_bucket, tmp_path):
+    class Environment(FakeEnvironment):
+        bq_client = FakeBigQueryClient()
+
+    monkeypatch.setattr(export_data, 'Environment', Environment)
+    gcs = FakeGCSClient()
+    engine = BigQueryExportDataEngine(gcs_config=GCSConfig(bucket_name='intermediate'), gcs_client=gcs)
+    engine.temp_dir = str(tmp_path)
+    return engine
+
+
+def read_part(bucket, key):
+    body = bucket.Object(key).get()['Body'].read()
+    return pq.read_table(io.BytesIO(gzip.decompress(body)))
+
+
+def test_export_statement_targets_intermediate_bucket(engine):
+    statement = engine.build_export_statement('SELECT 1', 'bq_export_data/run/')
+    assert "uri='gs://intermediate/bq_export_data/run/*.parquet'" in statement
+    assert "format='PARQUET'" in statement
+
+
+def test_transfer_casts_parts_to_the_entity_schema(engine, s3_bucket):
+    # BigQuery writes INT64 and its own nullability; the entity publishes float64
+    engine.gcs.add('run/000.parquet', pa.table({'user_id': pa.array([1, 2], pa.int64()), 'city': ['a', 'b']}))
+    engine.gcs.add('run/001.parquet', pa.table({'user_id': pa.array([3], pa.int64()), 'city': ['c']}))
+    schema = pa.schema([pa.field('city', pa.string()), pa.field('user_id', pa.float64()), pa.field('uuid', pa.string())])
+
+    assert engine.transfer_to_s3('run/', 'partner_metrics/amplitude', DT_PARTITION, schema=schema)
+
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX))
+    assert len(keys) == 2
+    tables = [read_part(s3_bucket, key) for key in keys]
+    assert all(t.schema == schema for t in tables)
+    assert sorted(v for t in tables for v in t.column('user_id').to_pylist()) == [1.0, 2.0, 3.0]
+    assert engine.gcs.blobs == {}  # intermediate objects deleted after the transfer
+
+
+def test_transfer_replaces_old_objects_after_upload(engine, s3_bucket):
+    s3_bucket.put_object(Key=f'{PREFIX}old_00:00:00.parquet.gz', Body=b'old')
+    engine.gcs.add('run/000.parquet', pa.table({'a': [1]}))
+
+    assert engine.transfer_to_s3('run/', 'partner_metrics/amplitude', DT_PARTITION, dt_now=datetime.now(timezone.utc))
+
+    keys = [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)]
+    assert len(keys) == 1 and not keys[0].startswith(f'{PREFIX}old_')
+
+
+def test_failed_download_keeps_the_partition(engine, s3_bucket):
+    s3_bucket.put_object(Key=f'{PREFIX}old_00:00:00.parquet.gz', Body=b'old')
+    engine.gcs.blobs['run/000.parquet'] = FakeBlob(engine.gcs, 'run/000.parquet', b'not parquet')
+
+    with pytest.raises(pa.ArrowInvalid):
+        engine.transfer_to_s3('run/', 'partner_metrics/amplitude', DT_PARTITION, schema=pa.schema([pa.field('a', pa.int64())]))
+
+    assert [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)] == [f'{PREFIX}old_00:00:00.parquet.gz']
@@ -0,0 +1,100 @@
+import gzip
+import io
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+from scr.AWSS3Loader import s3_partition_prefix
+from scr.ExportPipeline import run_export_pipeline
+from scr.ExportSinks import ExportSink, LocalDirectorySink
+
+
+DT_PARTITION = datetime(2025, 11, 20)
+DT_NOW = datetime(2025, 11, 21, 3, 0)
+
+
+class RecordingSink(ExportSink):
+    name = 'recording'
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.written = []
+        self.prepared = False
+        self.finished = None
+
+    def prepare(self, dt_partition, dt_now):
+        self.prepared = True
+
+    def write(self, gz_path, dt_partition, dt_now):
+        if self.fail_on is not None and len(self.written) == self.fail_on:
+            raise RuntimeError('sink is down')
+        with gzip.open(gz_path, 'rb') as f:
+            self.written.append(pq.read_table(io.BytesIO(f.read())))
+        return True
+
+    def finish(self, dt_partition, dt_now, success):
+        self.finished = success
+
+
+def test_every_part_reaches_every_sink(exporter, tmp_path):
+    exporter.client = FakeBigQueryClient(pa.table({'id': list(range(10)), 'name': [f'n{i}' for i in range(10)]}))
+    recording = RecordingSink()
+    local = LocalDirectorySink(str(tmp_path / 'archive'), 'entity')
+
+    # FakeRowIterator yields batches of 2 rows; a 1-byte part size gives one part per batch
+    assert run_export_pipeline(
+        exporter, 'SELECT * FROM t', [recording, local], DT_PARTITION, DT_NOW,
+        max_parquet_size_bytes=1, upload_workers=2,
+    )
+
+    assert len(recording.written) == 5
+    assert sorted(v for t in recording.written for v in t.column('id').to_pylist()) == list(range(10))
+    assert recording.finished is True
+    assert len(list((tmp_path / 'archive' / s3_partition_prefix('entity', DT_PARTITION)).iterdir())) == 5
+
+
+def test_parts_follow_the_schema(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'id': [1, 2]}))
+    schema = pa.schema([pa.field('id', pa.float64()), pa.field('extra', pa.string())])
+    sink = RecordingSink()
+    run_export_pipeline(exporter, 'SELECT * FROM t', [sink], DT_PARTITION, DT_NOW, schema=schema)
+    assert all(t.schema == schema for t in sink.written)
+
+
+def test_sink_error_stops_the_pipeline(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'id': list(range(10))}))
+    sink = RecordingSink(fail_on=1)
+    with pytest.raises(RuntimeError, match='sink is down'):
+        run_export_pipeline(exporter, 'SELECT * FROM t', [sink], DT_PARTITION, DT_NOW, max_parquet_size_bytes=1, upload_workers=1)
+    assert sink.finished is False
+
+
+def test_sinks_are_not_prepared_when_the_query_fails(exporter):
+    class FailingClient(FakeBigQueryClient):
+        def query(self, query, job_config=None):
+            raise RuntimeError('query failed')
+
+    exporter.client = FailingClient()
+    sink = RecordingSink()
+    with pytest.raises(RuntimeError, match='query failed'):
+        run_export_pipeline(exporter, 'SELECT * FROM t', [sink], DT_PARTITION, DT_NOW)
+    assert sink.prepared is False
+    assert sink.finished is None
+
+
+def test_s3_sink_replaces_the_partition_after_the_export_by_default(s3_bucket, exporter):
+    from scr.ExportSinks import S3Sink
+
+    prefix = s3_partition_prefix('entity', DT_PARTITION)
+    s3_bucket.put_object(Key=f'{prefix}old_01:00:00.parquet.gz', Body=b'old')
+    exporter.client = FakeBigQueryClient(pa.table({'id': list(range(10))}))
+    sink = S3Sink('entity')
+
+    assert run_export_pipeline(exporter, 'SELECT * FROM t', [sink], DT_PARTITION, DT_NOW, max_parquet_size_bytes=1)
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=prefix))
+    assert keys == sorted(sink.uploaded_keys.values())
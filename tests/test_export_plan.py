@@ -0,0 +1,71 @@
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+from scr.BigqueryToJson import SchemaAlignmentError
+
+
+MB = 1024 * 1024
+
+
+def test_plan_uses_result_size_not_scanned_bytes(exporter):
+    # A filter that scans 50 GB but returns 1 MB belongs in memory
+    exporter.client = FakeBigQueryClient(pa.table({'a': [1]}), result_bytes=1 * MB, bytes_processed=50 * 1024 * MB)
+    plan = exporter.plan_export('SELECT a FROM t')
+    assert plan.mode == 'in_memory'
+    assert plan.estimated_bytes == 1 * MB
+    assert plan.max_parquet_size_bytes is None
+    assert plan.max_workers == 1
+
+
+def test_plan_streams_and_splits_large_results(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'a': [1]}), result_bytes=1024 * MB)
+    plan = exporter.plan_export('SELECT a FROM t')
+    assert plan.mode == 'streaming'
+    assert plan.max_parquet_size_bytes == exporter.LARGE_EXPORT_PART_BYTES
+    assert plan.max_workers == 4
+
+
+def test_plan_keeps_requested_part_size(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'a': [1]}), result_bytes=20 * MB)
+    plan = exporter.plan_export('SELECT a FROM t', max_parquet_size_bytes=5 * MB)
+    assert plan.max_parquet_size_bytes == 5 * MB
+    assert plan.max_workers == 4
+
+
+def test_unknown_size_streams(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'a': [1]}), result_bytes=None)
+    assert exporter.plan_export('SELECT a FROM t').mode == 'streaming'
+
+
+def test_export_reads_the_planned_job(exporter):
+    exporter.client = FakeBigQueryClient(pa.table({'a': [1, 2, 3]}), result_bytes=MB)
+    exporter.plan_export('SELECT a\n  FROM t')
+    assert exporter.to_arrow('SELECT a FROM t').num_rows == 3
+    assert len(exporter.client.queries) == 1
+    # The kept job is used once; a later export runs the query again
+    exporter.to_arrow('SELECT a FROM t')
+    assert len(exporter.client.queries) == 2
+
+
+def test_align_adds_missing_columns_and_reorders(exporter):
+    table = pa.table({'b': ['x'], 'a': [1]})
+    schema = pa.schema([pa.field('a', pa.float64()), pa.field('b', pa.string()), pa.field('c', pa.int64())])
+    aligned = exporter._align_table_to_schema(table, schema)
+    assert aligned.schema == schema
+    assert aligned.to_pylist() == [{'a': 1.0, 'b': 'x', 'c': None}]
+
+
+def test_align_warns_on_impossible_cast(exporter):
+    table = pa.table({'a': ['not a number']})
+    aligned = exporter._align_table_to_schema(table, pa.schema([pa.field('a', pa.int64())]))
+    assert aligned.to_pylist() == [{'a': 'not a number'}]
+
+
+def test_strict_align_raises_on_impossible_cast(exporter):
+    exporter.strict_schema = True
+    table = pa.table({'a': ['not a number']})
+    with pytest.raises(SchemaAlignmentError, match='a: string -> int64'):
+        exporter._align_table_to_schema(table, pa.schema([pa.field('a', pa.int64())]))
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+
+
+DAY_BYTES = 1000
+
+
+@pytest.fixture
+def planned(exporter, monkeypatch):
+    """Exporter whose dry runs scan the whole table for timestamp_trunc filters and one day for ranges."""
+    monkeypatch.setattr(exporter, 'get_table_schema', lambda bq_table_addres: ['id', 'created_at'])
+    monkeypatch.setattr(exporter, 'get_partition_bytes', lambda bq_table_addres: {'20251117': DAY_BYTES, '20251118': 2 * DAY_BYTES})
+    monkeypatch.setattr(exporter, 'estimate_query_bytes', lambda query: 30 * DAY_BYTES if 'timestamp_trunc' in query else DAY_BYTES)
+    return exporter
+
+
+def test_plan_flags_unpruned_days_and_suggests_a_range(planned):
+    from scr.ExportPlanner import ExportSpec, plan_exports, range_condition
+
+    planned.client = FakeBigQueryClient(partition_field='created_at')
+
+    plans = plan_exports(planned, [ExportSpec('orders', 'p.d.orders', 'created_at', extra_condition='x = 1')], ['20251117', '20251118'])
+
+    assert [(p.dt, p.prunes, p.bytes_processed, p.partition_bytes) for p in plans] == [
+        ('2025-11-17', False, 30 * DAY_BYTES, DAY_BYTES),
+        ('2025-11-18', False, 30 * DAY_BYTES, 2 * DAY_BYTES),
+    ]
+    assert plans[0].suggested_condition == f"x = 1 AND {range_condition('created_at')}"
+    assert plans[0].suggested_bytes == DAY_BYTES
+    assert plans[0].note == ''
+
+
+def test_plan_notes_partitioning_on_another_column(planned, monkeypatch):
+    from scr.ExportPlanner import ExportSpec, plan_exports
+
+    monkeypatch.setattr(planned, 'estimate_query_bytes', lambda query: DAY_BYTES)
+    planned.client = FakeBigQueryClient(partition_field='updated_at')
+
+    plan, = plan_exports(planned, [ExportSpec('orders', 'p.d.orders', 'created_at')], ['20251117'])
+
+    assert plan.prunes is True and plan.suggested_condition is None
+    assert plan.note == 'table is partitioned by updated_at, filter is on created_at'
+
+
+def test_plan_notes_unpartitioned_tables(planned):
+    from scr.ExportPlanner import ExportSpec, plan_exports
+
+    planned.client = FakeBigQueryClient()
+
+    plan, = plan_exports(planned, [ExportSpec('orders', 'p.d.orders', 'created_at')], ['20251119'])
+
+    assert plan.note == 'table is not partitioned'
+    assert plan.partition_bytes is None and plan.prunes is None
+
+
+def test_suggest_concurrency_uses_the_largest_day():
+    from scr.ExportPlanner import DayPlan, suggest_concurrency
+
+    plans = [
+        DayPlan('orders', '2025-11-17', bytes_processed=300, partition_bytes=100, prunes=False, suggested_bytes=100),
+        DayPlan('orders', '2025-11-18', bytes_processed=250, partition_bytes=250, prunes=True),
+        DayPlan('events', '2025-11-17', bytes_processed=0, partition_bytes=0, prunes=True),
+        DayPlan('huge', '2025-11-17', bytes_processed=10_000, partition_bytes=10_000, prunes=True),
+    ]
+
+    assert suggest_concurrency(plans, bytes_budget=1000, max_concurrency=8) == {'orders': 4, 'events': 8, 'huge': 1}
@@ -0,0 +1,95 @@
+import gzip
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from scr.AWSS3Loader import S3Uploader
+from scr.ExportSinks import ExportSink, LocalDirectorySink, S3Sink, tee_export
+
+
+DT_PARTITION = datetime(2025, 11, 17)
+DT_NOW = datetime(2025, 11, 18, 5, 30)
+PREFIX = 'partner_metrics/backend/orders/2025-11-17/'
+
+
+@pytest.fixture
+def parts(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'part{i}.parquet.gz'
+        path.write_bytes(gzip.compress(f'part {i}'.encode(), mtime=0))
+        paths.append(str(path))
+    return paths
+
+
+def test_parts_reach_every_sink(s3_bucket, parts, tmp_path):
+    s3_sink = S3Sink('partner_metrics/backend/orders')
+    local_sink = LocalDirectorySink(str(tmp_path / 'archive'), 'partner_metrics/backend/orders')
+
+    results = tee_export(parts, [s3_sink, local_sink], DT_PARTITION, DT_NOW)
+
+    assert results == {s3_sink.name: True, local_sink.name: True}
+    assert len(list(s3_bucket.objects.filter(Prefix=PREFIX))) == 3
+    assert len(list((tmp_path / 'archive' / PREFIX).iterdir())) == 3
+    assert sorted(s3_sink.uploaded_keys) == sorted(parts)
+
+
+def test_duplicate_sink_names_are_rejected(parts, tmp_path):
+    sinks = [LocalDirectorySink(str(tmp_path / 'a'), 'entity'), LocalDirectorySink(str(tmp_path / 'a'), 'entity')]
+    with pytest.raises(ValueError, match='unique'):
+        tee_export(parts, sinks, DT_PARTITION, DT_NOW)
+
+
+def test_failed_part_is_not_recorded_and_old_objects_stay(s3_bucket, parts, monkeypatch):
+    s3_bucket.put_object(Key=f'{PREFIX}old_01:00:00.parquet.gz', Body=b'old')
+    run = S3Uploader.run
+    monkeypatch.setattr(S3Uploader, 'run', lambda self: False if self.gzip_path.name == 'part1.parquet.gz' else run(self))
+    sink = S3Sink('partner_metrics/backend/orders', sync_path=True)
+
+    results = tee_export(parts, [sink], DT_PARTITION, DT_NOW)
+
+    assert results == {sink.name: False}
+    assert parts[1] not in sink.uploaded_keys
+    keys = [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)]
+    assert f'{PREFIX}old_01:00:00.parquet.gz' in keys
+    assert sorted(keys) == sorted([f'{PREFIX}old_01:00:00.parquet.gz'] + list(sink.uploaded_keys.values()))
+
+
+def test_sync_replaces_old_objects_after_all_parts(s3_bucket, parts):
+    s3_bucket.put_object(Key=f'{PREFIX}old_01:00:00.parquet.gz', Body=b'old')
+    sink = S3Sink('partner_metrics/backend/orders', sync_path=True)
+
+    assert tee_export(parts, [sink], DT_PARTITION, DT_NOW) == {sink.name: True}
+
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX))
+    assert keys == sorted(sink.uploaded_keys.values())
+
+
+class FailingSink(ExportSink):
+    name = 'failing'
+
+    def write(self, gz_path, dt_partition, dt_now):
+        raise RuntimeError('sink is down')
+
+
+def test_raising_sink_fails_every_sink_and_is_reraised(s3_bucket, parts):
+    s3_bucket.put_object(Key=f'{PREFIX}old_01:00:00.parquet.gz', Body=b'old')
+    sink = S3Sink('partner_metrics/backend/orders', sync_path=True)
+
+    with pytest.raises(RuntimeError, match='sink is down'):
+        tee_export(parts, [sink, FailingSink()], DT_PARTITION, DT_NOW)
+
+    keys = [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)]
+    assert f'{PREFIX}old_01:00:00.parquet.gz' in keys
+    assert sink.stale_keys is None
+
+
+def test_sink_without_write_cannot_be_created():
+    class NoWriteSink(ExportSink):
+        pass
+
+    with pytest.raises(TypeError):
+        NoWriteSink()
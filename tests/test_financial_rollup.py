@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+
+
+STATE_TYPE = pa.schema([
+    pa.field('platform', pa.string()),
+    pa.field('price_count', pa.int64()),
+    pa.field('price_sum', pa.int64()),
+    pa.field('delivery_fee_sum', pa.int64()),
+    pa.field('service_fee_sum', pa.int64()),
+    pa.field('warehouse_ids', pa.list_(pa.int64())),
+    pa.field('user_ids', pa.list_(pa.int64())),
+    pa.field('order_ids', pa.list_(pa.int64())),
+])
+
+
+def _state(rows):
+    return pa.Table.from_pylist([
+        dict(zip(STATE_TYPE.names, row)) for row in rows
+    ], schema=STATE_TYPE)
+
+
+def test_month_days():
+    from scr.FinancialRollup import month_days
+
+    assert len(month_days(datetime(2024, 2, 10))) == 29
+    assert month_days(datetime(2025, 11, 20), until=datetime(2025, 11, 3)) == ['2025-11-01', '2025-11-02', '2025-11-03']
+
+
+def test_rollup_month_merges_daily_states():
+    from scr.FinancialRollup import rollup_month
+
+    states = pa.concat_tables([
+        _state([('ios', 2, 300, 20, 10, [1], [7, 8], [100, 101]), (None, 1, 50, 0, 5, [2], [9], [102])]),
+        _state([('ios', 1, 101, 10, 0, [1, 3], [8], [103]), ('android', 1, 10, 1, 1, [], [], [104])]),
+    ])
+
+    result = {row['platform']: row for row in rollup_month(states, '2025.11.01').to_pylist()}
+
+    assert result['ios'] == {
+        'platform': 'ios', 'month': '2025.11.01',
+        'active_darkstores': 2, 'unique_users': 2, 'orders': 3,
+        'aov': 133.67, 'gmv': 401.0, 'delivery_fee_revenue': 30.0, 'service_fee_revenue': 10.0, 'gtv': 441.0,
+    }
+    assert result[None]['orders'] == 1 and result[None]['gmv'] == 50.0
+    assert result['android']['active_darkstores'] == 0 and result['android']['unique_users'] == 0
+
+
+def test_rollup_store_round_trip(tmp_path):
+    from scr.FinancialRollup import RollupStore
+
+    store = RollupStore(str(tmp_path))
+    state = _state([('ios', 1, 10, 1, 1, [1], [2], [3])])
+    source_state = {'source-rows': '5', 'source-last-modified': '2025-11-02 01:00:00+00'}
+
+    assert not store.is_fresh('2025-11-01')
+    store.save('2025-11-01', state, source_state)
+
+    assert store.source_state('2025-11-01') == source_state
+    assert store.is_fresh('2025-11-01', source_state)
+    assert not store.is_fresh('2025-11-01', {**source_state, 'source-rows': '6'})
+    assert not store.is_fresh('2025-11-01', None)
+    assert store.load(['2025-11-01']).equals(state)
+
+
+def test_rollup_month_from_daily_queries_only_changed_days(exporter, tmp_path):
+    from scr.FinancialRollup import RollupStore, rollup_month_from_daily
+
+    store = RollupStore(str(tmp_path / 'rollup'))
+    exporter.client = FakeBigQueryClient(table=_state([('ios', 1, 10, 1, 1, [1], [2], [3])]))
+    month = datetime(2025, 2, 1)
+    partitions = {f"202502{day:02d}": {'source-rows': '1', 'source-last-modified': 'a'} for day in range(1, 29)}
+
+    first = rollup_month_from_daily(exporter, 'p.d.mart_orders', month, store, partitions=partitions)
+    assert len(exporter.client.queries) == 28
+    assert first.column('orders').to_pylist() == [1]
+
+    partitions['20250203'] = {'source-rows': '2', 'source-last-modified': 'b'}
+    second = rollup_month_from_daily(exporter, 'p.d.mart_orders', month, store, partitions=partitions)
+
+    assert len(exporter.client.queries) == 29
+    assert second.equals(first)
+
+
+def test_rollup_month_without_partitions_queries_every_day(exporter, tmp_path):
+    from scr.FinancialRollup import RollupStore, rollup_month_from_daily
+
+    store = RollupStore(str(tmp_path / 'rollup'))
+    exporter.client = FakeBigQueryClient(table=_state([('ios', 1, 10, 1, 1, [1], [2], [3])]))
+    month = datetime(2025, 2, 1)
+
+    rollup_month_from_daily(exporter, 'p.d.mart_orders', month, store)
+    rollup_month_from_daily(exporter, 'p.d.mart_orders', month, store)
+
+    assert len(exporter.client.queries) == 56
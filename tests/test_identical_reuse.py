@@ -0,0 +1,73 @@
+import gzip
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+CONTENT = gzip.compress(b'same rows', mtime=0)
+
+
+def _keys(bucket):
+    return sorted(obj.key for obj in bucket.objects.filter(Prefix=PREFIX))
+
+
+@pytest.fixture
+def identical_parts(s3_bucket, tmp_path):
+    """Two local parts with the same content, and one object in S3 that has it too."""
+    from scr.AWSS3Loader import CONTENT_HASH_METADATA, sha256_b64
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=CONTENT, Metadata={CONTENT_HASH_METADATA: sha256_b64(CONTENT)})
+    paths = []
+    for i in range(2):
+        path = tmp_path / f'part_{i}.parquet.gz'
+        path.write_bytes(CONTENT)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('on_identical', ['keep', 'rename'])
+def test_identical_parts_do_not_reuse_the_same_object(s3_bucket, identical_parts, on_identical):
+    from scr.AWSS3Loader import S3Uploader
+
+    results = S3Uploader.upload_many(identical_parts, ENTITY, DT_PARTITION, on_identical=on_identical, max_workers=2)
+
+    assert all(r.success for r in results)
+    assert len({r.s3_key for r in results}) == 2
+    assert _keys(s3_bucket) == sorted(r.s3_key for r in results)
+    for r in results:
+        assert s3_bucket.Object(r.s3_key).get()['Body'].read() == CONTENT
+    if on_identical == 'keep':
+        assert PREFIX + 'old.parquet.gz' in _keys(s3_bucket)
+
+
+def test_rename_uploads_when_the_identical_object_is_gone(s3_bucket, identical_parts, monkeypatch):
+    from scr.AWSS3Loader import S3Uploader
+
+    find_identical = S3Uploader._find_identical
+
+    def find_then_lose(self, existing_objects):
+        key = find_identical(self, existing_objects)
+        s3_bucket.Object(key).delete()  # another run renamed it in the meantime
+        return key
+
+    monkeypatch.setattr(S3Uploader, '_find_identical', find_then_lose)
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=identical_parts[0], clear_path_before_upload=False, on_identical='rename')
+
+    assert uploader.run()
+    assert _keys(s3_bucket) == [uploader.s3_full_file_key]
+    assert s3_bucket.Object(uploader.s3_full_file_key).get()['Body'].read() == CONTENT
+
+
+def test_objects_removed_since_the_listing_are_skipped(s3_bucket, identical_parts):
+    from scr.AWSS3Loader import S3Uploader
+
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=identical_parts[0], on_identical='keep')
+    existing = uploader.list_s3_objects(PREFIX)
+    s3_bucket.Object(PREFIX + 'old.parquet.gz').delete()
+
+    assert uploader._find_identical(existing) is None
@@ -0,0 +1,94 @@
+import gzip
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+
+
+PREFIX = 'partner_metrics/backend/orders/2025-11-17/'
+START = datetime(2025, 11, 17, tzinfo=timezone.utc)
+
+
+def _orders(hours):
+    return pa.table({
+        'order_id': pa.array(range(len(hours)), pa.int64()),
+        'created_at': pa.array([START + timedelta(hours=h) for h in hours], pa.timestamp('us', tz='UTC')),
+    })
+
+
+def _put_part(bucket, name, table, metadata):
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    bucket.put_object(Key=PREFIX + name, Body=gzip.compress(buffer.getvalue()), Metadata=metadata)
+
+
+def test_split_table_by_key_gives_disjoint_ranges(exporter):
+    table = pa.table({'k': pa.array([5, 1, 3, 3, 3, 2, 4, None, 1, 5], pa.int64())})
+
+    parts = exporter._split_table_by_key(table, 'k', max_bytes=table.nbytes // 4)
+
+    assert sum(part.num_rows for part in parts) == table.num_rows
+    ranges = [exporter._key_range_metadata(part, 'k') for part in parts]
+    bounds = [(int(r['key-min']), int(r['key-max'])) for r in ranges if r['key-min']]
+    for (_, previous_max), (next_min, _) in zip(bounds, bounds[1:]):
+        assert previous_max < next_min
+    assert parts[-1].column('k')[-1].as_py() is None
+
+
+def test_key_range_metadata_uses_iso_timestamps(exporter):
+    metadata = exporter._key_range_metadata(_orders([3, 1, 2]), 'created_at')
+
+    assert metadata == {
+        'split-key': 'created_at',
+        'key-min': '2025-11-17T01:00:00+00:00',
+        'key-max': '2025-11-17T03:00:00+00:00',
+    }
+
+
+def test_list_parts_in_key_range_compares_timestamps_by_value(s3_bucket, exporter):
+    from scr.AWSS3Loader import list_parts_in_key_range
+
+    for name, hours in (('a.parquet.gz', [0, 1]), ('b.parquet.gz', [5, 6]), ('c.parquet.gz', [10, 11])):
+        table = _orders(hours)
+        _put_part(s3_bucket, name, table, exporter._key_range_metadata(table, 'created_at'))
+    s3_bucket.put_object(Key=PREFIX + '_sidecar_index.arrow', Body=b'index')
+
+    # Different ISO spellings of the same instants
+    parts = list_parts_in_key_range(s3_bucket, PREFIX, 'created_at', '2025-11-17 05:30:00', '2025-11-17T09:00:00Z')
+
+    assert parts == [PREFIX + 'b.parquet.gz']
+
+
+def test_list_parts_in_key_range_compares_numbers_by_value(s3_bucket):
+    from scr.AWSS3Loader import list_parts_in_key_range
+
+    for name, low, high in (('a.parquet.gz', '2', '9'), ('b.parquet.gz', '10', '19')):
+        _put_part(s3_bucket, name, pa.table({'k': [int(low)]}), {'split-key': 'k', 'key-min': low, 'key-max': high})
+
+    assert list_parts_in_key_range(s3_bucket, PREFIX, 'k', '12', '15') == [PREFIX + 'b.parquet.gz']
+
+
+def test_list_parts_in_key_range_keeps_parts_it_cannot_prune(s3_bucket):
+    from scr.AWSS3Loader import list_parts_in_key_range
+
+    _put_part(s3_bucket, 'other.parquet.gz', pa.table({'k': [1]}), {'split-key': 'order_id', 'key-min': '1', 'key-max': '1'})
+    _put_part(s3_bucket, 'plain.parquet.gz', pa.table({'k': [1]}), {})
+    _put_part(s3_bucket, 'nulls.parquet.gz', pa.table({'k': [None]}), {'split-key': 'k', 'key-min': '', 'key-max': ''})
+
+    parts = list_parts_in_key_range(s3_bucket, PREFIX, 'k', '100', '200')
+
+    assert parts == [PREFIX + 'other.parquet.gz', PREFIX + 'plain.parquet.gz']
+
+
+def test_fetch_rows_in_range_filters_by_column_type(s3_bucket):
+    from scr.SidecarIndex import fetch_rows_in_range
+
+    _put_part(s3_bucket, 'a.parquet.gz', _orders([0, 1, 2, 3]), {})
+
+    rows = fetch_rows_in_range(s3_bucket, PREFIX + 'a.parquet.gz', 'created_at', '2025-11-17T01:00:00+00:00', '2025-11-17T02:00:00+00:00')
+
+    assert rows.column('order_id').to_pylist() == [1, 2]
@@ -0,0 +1,92 @@
+import gzip
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+
+from conftest import FakeBigQueryClient
+
+
+def _outputs():
+    from scr.MultiEntityExport import EntityOutput
+
+    return [
+        EntityOutput('delivered', 'SELECT order_id, amount FROM t WHERE kind = 1', 'partner_metrics/delivered'),
+        EntityOutput('cancelled', 'SELECT order_id, reason FROM t WHERE kind = 2', 'partner_metrics/cancelled'),
+    ]
+
+
+def _shared_result():
+    delivered = pa.struct([('order_id', pa.int64()), ('amount', pa.float64())])
+    cancelled = pa.struct([('order_id', pa.int64()), ('reason', pa.string())])
+    return pa.table({
+        '_entity': ['delivered', 'cancelled', 'delivered'],
+        'delivered': pa.array([{'order_id': 1, 'amount': 9.5}, None, {'order_id': 3, 'amount': 1.0}], delivered),
+        'cancelled': pa.array([None, {'order_id': 2, 'reason': 'late'}, None], cancelled),
+    })
+
+
+def test_build_shared_query_packs_each_entity_into_a_struct():
+    from scr.MultiEntityExport import build_shared_query
+
+    query = build_shared_query(_outputs())
+
+    assert query.startswith("SELECT COALESCE(e0._entity, e1._entity) AS _entity, e0.`delivered`, e1.`cancelled`")
+    assert "(SELECT 'delivered' AS _entity, src AS `delivered` FROM (SELECT order_id, amount FROM t WHERE kind = 1) AS src) AS e0" in query
+    assert "FULL OUTER JOIN (SELECT 'cancelled' AS _entity" in query
+    assert query.endswith("ON e1._entity = e0._entity")
+
+
+def test_build_shared_query_chains_three_entities():
+    from scr.MultiEntityExport import EntityOutput, build_shared_query
+
+    outputs = _outputs() + [EntityOutput('shared', 'SELECT order_id FROM t', 'partner_metrics/shared')]
+
+    query = build_shared_query(outputs)
+
+    assert "ON e2._entity = COALESCE(e0._entity, e1._entity)" in query
+    assert query.startswith("SELECT COALESCE(e0._entity, e1._entity, e2._entity) AS _entity")
+
+
+def test_split_entities_flattens_rows_of_each_entity():
+    from scr.MultiEntityExport import split_entities
+
+    tables = split_entities(_shared_result(), _outputs())
+
+    assert tables['delivered'].to_pylist() == [{'order_id': 1, 'amount': 9.5}, {'order_id': 3, 'amount': 1.0}]
+    assert tables['cancelled'].to_pylist() == [{'order_id': 2, 'reason': 'late'}]
+
+
+def test_export_entities_binds_shared_parameters_once(exporter):
+    from scr.MultiEntityExport import EntityOutput, export_entities
+
+    outputs = [
+        EntityOutput('delivered', exporter.render_query('SELECT order_id, amount FROM t WHERE dt = @dt', params={'dt': '2025-11-17'}), 'partner_metrics/delivered',
+                     schema=pa.schema([pa.field('order_id', pa.int64()), pa.field('amount', pa.float32())])),
+        EntityOutput('cancelled', exporter.render_query('SELECT order_id, reason FROM t WHERE dt = @dt', params={'dt': '2025-11-17'}), 'partner_metrics/cancelled'),
+    ]
+    exporter.client = FakeBigQueryClient(table=_shared_result())
+
+    gz_paths = export_entities(exporter, outputs)
+
+    parameters = exporter.client.jobs[0].job_config.query_parameters
+    assert [(p.name, p.value) for p in parameters] == [('dt', '2025-11-17')]
+    with gzip.open(gz_paths['delivered'], 'rb') as src:
+        delivered = pq.read_table(src)
+    assert delivered.schema.field('amount').type == pa.float32()
+    assert delivered.num_rows == 2
+
+
+def test_export_entities_rejects_conflicting_parameters(exporter):
+    from scr.MultiEntityExport import EntityOutput, export_entities
+
+    outputs = [
+        EntityOutput('delivered', exporter.render_query('SELECT order_id FROM t WHERE dt = @dt', params={'dt': '2025-11-17'}), 'partner_metrics/delivered'),
+        EntityOutput('cancelled', exporter.render_query('SELECT order_id FROM u WHERE dt = @dt', params={'dt': '2025-11-18'}), 'partner_metrics/cancelled'),
+    ]
+    exporter.client = FakeBigQueryClient(table=_shared_result())
+
+    with pytest.raises(ValueError, match='@dt'):
+        export_entities(exporter, outputs)
@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from scr.BigqueryShcemaToPyarrow import NumericPrecisionError, narrow_decimal_columns
+
+
+def numeric_table(*values, scale=9):
+    return pa.table({
+        'gmv': pa.array([Decimal(v) if v is not None else None for v in values], pa.decimal128(38, scale)),
+        'platform': pa.array(['ios'] * len(values)),
+    })
+
+
+def test_decimal_mode_keeps_table():
+    table = numeric_table('12.34')
+    narrowed, resolved = narrow_decimal_columns(table, numeric_mode='decimal')
+    assert narrowed.equals(table)
+    assert resolved == {}
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        narrow_decimal_columns(numeric_table('1'), numeric_mode='float32')
+
+
+def test_float64_gives_nearest_double():
+    narrowed, resolved = narrow_decimal_columns(numeric_table('12.34', '0.1', None), numeric_mode='float64')
+    assert resolved == {'gmv': pa.float64()}
+    assert narrowed.column('gmv').to_pylist() == [12.34, 0.1, None]
+    assert narrowed.column('platform').type == pa.string()
+
+
+def test_float64_raises_instead_of_rounding():
+    # 18 significant digits have no exact double
+    with pytest.raises(NumericPrecisionError, match='gmv'):
+        narrow_decimal_columns(numeric_table('12.34', '123456789.123456789'), numeric_mode='float64')
+
+
+def test_inexact_column_can_be_declared_decimal():
+    table = numeric_table('123456789.123456789')
+    narrowed, _ = narrow_decimal_columns(table, numeric_mode='float64', decimal_columns=['gmv'])
+    assert narrowed.equals(table)
+
+
+def test_decimal_columns_stay_decimal():
+    table = numeric_table('12.34')
+    narrowed, resolved = narrow_decimal_columns(table, numeric_mode='float64', decimal_columns=['gmv'])
+    assert narrowed.column('gmv').type == pa.decimal128(38, 9)
+    assert resolved == {'gmv': pa.decimal128(38, 9)}
+
+
+def test_scaled_int64_keeps_scale_in_metadata():
+    narrowed, resolved = narrow_decimal_columns(numeric_table('12.34', '-0.5'), numeric_mode='scaled_int64', numeric_scale=2)
+    assert resolved == {'gmv': pa.int64()}
+    assert narrowed.column('gmv').to_pylist() == [1234, -50]
+    assert narrowed.schema.field('gmv').metadata == {b'numeric_scale': b'2'}
+
+
+def test_scaled_int64_raises_instead_of_losing_digits():
+    with pytest.raises(NumericPrecisionError, match='gmv'):
+        narrow_decimal_columns(numeric_table('12.345'), numeric_mode='scaled_int64', numeric_scale=2)
+
+
+def test_declared_schema_stays_authoritative(exporter):
+    table = numeric_table('12.34')
+    schema = pa.schema([pa.field('gmv', pa.float64()), pa.field('platform', pa.string())])
+    narrowed, resolved_schema = exporter._apply_numeric_mode(table, schema, 'float64', 2)
+    assert resolved_schema == schema
+    assert narrowed.column('gmv').to_pylist() == [12.34]
+
+
+def test_schema_decimal_column_follows_the_mode(exporter):
+    # e.g. a schema from get_pyarrow_schema_from_bq declares every NUMERIC as decimal
+    schema = pa.schema([pa.field('gmv', pa.decimal128(38, 9)), pa.field('platform', pa.string())])
+    narrowed, resolved_schema = exporter._apply_numeric_mode(numeric_table('12.34'), schema, 'scaled_int64', 2)
+    assert narrowed.column('gmv').to_pylist() == [1234]
+    assert resolved_schema.field('gmv') == narrowed.schema.field('gmv')
+    assert resolved_schema.field('platform') == schema.field('platform')
+
+
+def test_schema_decimal_column_listed_in_decimal_columns_is_kept(exporter):
+    schema = pa.schema([pa.field('gmv', pa.decimal128(38, 9)), pa.field('platform', pa.string())])
+    narrowed, resolved_schema = exporter._apply_numeric_mode(numeric_table('12.34'), schema, 'float64', 2, decimal_columns=['gmv'])
+    assert narrowed.column('gmv').type == pa.decimal128(38, 9)
+    assert resolved_schema == schema
+
+
+def test_scaled_int64_against_float_schema_is_rejected(exporter):
+    schema = pa.schema([pa.field('gmv', pa.float64())])
+    with pytest.raises(ValueError):
+        exporter._apply_numeric_mode(numeric_table('12.34'), schema, 'scaled_int64', 2)
@@ -0,0 +1,61 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+
+from conftest import FakeBigQueryClient
+
+
+def _events():
+    return pa.table({
+        'event_time': pa.array([
+            datetime(2025, 12, 9, 5, 1, tzinfo=timezone.utc),
+            datetime(2025, 12, 9, 5, 30, tzinfo=timezone.utc),
+            datetime(2025, 12, 9, 7, 0, tzinfo=timezone.utc),
+        ], pa.timestamp('us', tz='UTC')),
+        'platform': ['ios', 'android', 'ios'],
+        'value': pa.array([1, 2, 3], pa.int64()),
+    })
+
+
+def _read_gz(path):
+    with gzip.open(path, 'rb') as src:
+        return pq.read_table(src)
+
+
+def test_partitioned_export_writes_hive_directories(exporter):
+    exporter.client = FakeBigQueryClient(table=_events())
+
+    gz_paths = exporter.export_to_partitioned_parquet_gzip('SELECT 1', ['hour', 'platform'], bq_table_addres='p.d.events', hour_from='event_time')
+
+    sub_paths = sorted(exporter.part_sub_paths[path] for path in gz_paths)
+    assert sub_paths == ['hour=05/platform=android', 'hour=05/platform=ios', 'hour=07/platform=ios']
+    rows = sorted(value for path in gz_paths for value in _read_gz(path).column('value').to_pylist())
+    assert rows == [1, 2, 3]
+    # Partition keys live in the path, not in the files
+    assert 'platform' not in _read_gz(gz_paths[0]).column_names
+
+
+def test_partitioned_export_respects_max_rows_per_file(exporter):
+    exporter.client = FakeBigQueryClient(table=_events())
+
+    gz_paths = exporter.export_to_partitioned_parquet_gzip('SELECT 1', ['platform'], bq_table_addres='p.d.events', max_rows_per_file=1)
+
+    assert sorted(exporter.part_sub_paths[path] for path in gz_paths) == ['platform=android', 'platform=ios', 'platform=ios']
+
+
+def test_partitioned_parts_upload_into_sub_directories(exporter, s3_bucket):
+    from scr.AWSS3Loader import S3Uploader
+
+    exporter.client = FakeBigQueryClient(table=_events())
+    gz_paths = exporter.export_to_partitioned_parquet_gzip('SELECT 1', ['hour'], bq_table_addres='p.d.events', hour_from='event_time')
+
+    results = S3Uploader.upload_many(gz_paths, 'partner_metrics/events', datetime(2025, 12, 9), part_sub_paths=exporter.part_sub_paths)
+
+    assert all(r.success for r in results)
+    directories = sorted(r.s3_key.rsplit('/', 1)[0] for r in results)
+    assert directories == ['partner_metrics/events/2025-12-09/hour=05', 'partner_metrics/events/2025-12-09/hour=07']
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('google.cloud.bigquery')
+
+from scr.QueryTemplates import normalize_sql, render, to_query_parameter
+
+
+def test_normalize_sql_drops_comments_and_collapses_whitespace():
+    sql = """
+    SELECT a,   b  -- the columns
+    FROM   t
+    WHERE  x = 1
+    """
+
+    assert normalize_sql(sql) == 'SELECT a, b FROM t WHERE x = 1'
+
+
+def test_normalize_sql_keeps_quoted_text_verbatim():
+    sql = "SELECT 'a  --  b', `my  col`, \"x\\\"  y\"  FROM t"
+
+    assert normalize_sql(sql) == "SELECT 'a  --  b', `my  col`, \"x\\\"  y\" FROM t"
+
+
+def test_normalize_sql_is_idempotent():
+    sql = "SELECT\n  a -- c\n,b FROM `p.d.t`\n"
+
+    assert normalize_sql(normalize_sql(sql)) == normalize_sql(sql)
+
+
+def test_render_substitutes_identifiers_and_binds_values():
+    query, parameters = render(
+        "SELECT * FROM `@table@`\nWHERE TIMESTAMP_TRUNC(created_at, DAY) = TIMESTAMP(@dt) AND n > @n",
+        params={'dt': '2025-11-17', 'n': 3},
+        identifiers={'table': 'project.dataset.orders'},
+    )
+
+    assert query == "SELECT * FROM `project.dataset.orders` WHERE TIMESTAMP_TRUNC(created_at, DAY) = TIMESTAMP(@dt) AND n > @n"
+    assert [(p.name, p.type_, p.value) for p in parameters] == [('dt', 'STRING', '2025-11-17'), ('n', 'INT64', 3)]
+
+
+@pytest.mark.parametrize('identifiers, message', [
+    ({}, 'No value'),
+    ({'table': 'orders; DROP TABLE x'}, 'not a plain'),
+])
+def test_render_rejects_bad_identifiers(identifiers, message):
+    with pytest.raises(ValueError, match=message):
+        render("SELECT * FROM `@table@`", identifiers=identifiers)
+
+
+@pytest.mark.parametrize('value, type_', [
+    (True, 'BOOL'),
+    (1, 'INT64'),
+    (1.5, 'FLOAT64'),
+    (Decimal('1.25'), 'NUMERIC'),
+    (datetime(2025, 11, 17, tzinfo=timezone.utc), 'TIMESTAMP'),
+    (datetime(2025, 11, 17), 'DATETIME'),
+    (date(2025, 11, 17), 'DATE'),
+    ('x', 'STRING'),
+])
+def test_to_query_parameter_types(value, type_):
+    assert to_query_parameter('v', value).type_ == type_
+
+
+def test_exporter_runs_rendered_queries_with_their_parameters(exporter):
+    pa = pytest.importorskip('pyarrow')
+    from conftest import FakeBigQueryClient
+
+    exporter.client = FakeBigQueryClient(table=pa.table({'x': [1]}), bytes_processed=100)
+    query = exporter.render_query("SELECT x\nFROM `@t@` -- one day\nWHERE dt = @dt", params={'dt': '2025-11-17'}, identifiers={'t': 'p.d.t'})
+
+    exporter.to_arrow(query)
+
+    job = exporter.client.jobs[0]
+    assert job.query == query == 'SELECT x FROM `p.d.t` WHERE dt = @dt'
+    assert [(p.name, p.value) for p in job.job_config.query_parameters] == [('dt', '2025-11-17')]
+    assert exporter.job_stats == [{
+        'job_id': job.job_id, 'cache_hit': False, 'total_bytes_billed': 100,
+        'total_bytes_processed': 100, 'slot_millis': 1,
+    }]
+
+
+def test_renders_of_the_same_text_keep_their_own_parameters(exporter):
+    pa = pytest.importorskip('pyarrow')
+    from conftest import FakeBigQueryClient
+
+    exporter.client = FakeBigQueryClient(table=pa.table({'x': [1]}))
+    sql = "SELECT x FROM t WHERE dt = @dt"
+    first = exporter.render_query(sql, params={'dt': '2025-11-17'})
+    second = exporter.render_query(sql, params={'dt': '2025-11-18'})
+
+    exporter.estimate_result_bytes(first)
+    exporter.run_query(second)
+    exporter.run_query(first)
+
+    assert first == second
+    assert [[p.value for p in job.job_config.query_parameters] for job in exporter.client.jobs] == [['2025-11-17'], ['2025-11-18']]
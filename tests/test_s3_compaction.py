@@ -0,0 +1,96 @@
+import gzip
+import io
+from datetime import timedelta
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+
+
+PREFIX = 'partner_metrics/backend/orders/2025-11-17/'
+
+
+def _put_part(bucket, name, values, metadata=None):
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'k': pa.array(values, pa.int64())}), buffer)
+    bucket.put_object(Key=PREFIX + name, Body=gzip.compress(buffer.getvalue()), Metadata=metadata or {})
+
+
+def _put_sources(bucket):
+    _put_part(bucket, 'a.parquet.gz', [1, 2], {'split-key': 'k', 'key-min': '1', 'key-max': '2',
+                                               'source-rows': '5', 'source-last-modified': '2025-11-18T01:00:00'})
+    _put_part(bucket, 'b.parquet.gz', [9, 10], {'split-key': 'k', 'key-min': '9', 'key-max': '10',
+                                                'source-rows': '5', 'source-last-modified': '2025-11-18T01:00:00'})
+    _put_part(bucket, 'c.parquet.gz', [], {'split-key': 'k', 'key-min': '', 'key-max': ''})
+
+
+def _rows(bucket, key):
+    body = bucket.Object(key).get()['Body'].read()
+    return sorted(pq.read_table(io.BytesIO(gzip.decompress(body))).column('k').to_pylist())
+
+
+def test_compaction_retires_sources_at_once_and_merges_metadata(s3_bucket):
+    from scr.AWSS3Loader import CONTENT_HASH_METADATA, partition_source_metadata, sha256_b64
+    from scr.S3Compaction import compact_prefix
+
+    _put_sources(s3_bucket)
+
+    result = compact_prefix(s3_bucket, PREFIX)
+
+    assert len(result.compacted_parts) == 1
+    parts = [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX) if obj.key.endswith('.parquet.gz')]
+    assert parts == result.compacted_parts
+    compacted = s3_bucket.Object(parts[0])
+    assert _rows(s3_bucket, parts[0]) == [1, 2, 9, 10]
+    metadata = compacted.metadata
+    assert (metadata['split-key'], metadata['key-min'], metadata['key-max']) == ('k', '1', '10')
+    assert metadata[CONTENT_HASH_METADATA] == sha256_b64(compacted.get()['Body'].read())
+    assert partition_source_metadata(s3_bucket, PREFIX) == {'source-rows': '5', 'source-last-modified': '2025-11-18T01:00:00'}
+
+
+def test_readers_skip_parts_retired_with_a_grace_period(s3_bucket):
+    from scr.AWSS3Loader import list_parts_in_key_range, retired_part_keys
+    from scr.S3Compaction import compact_prefix
+
+    _put_sources(s3_bucket)
+
+    result = compact_prefix(s3_bucket, PREFIX, retire_grace=timedelta(hours=1))
+
+    keys = [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)]
+    assert set(result.source_parts) <= set(keys)
+    assert set(result.source_parts) <= retired_part_keys(s3_bucket, keys)
+    assert list_parts_in_key_range(s3_bucket, PREFIX, 'k', '0', '100') == result.compacted_parts
+
+
+def test_compaction_backs_off_when_parts_change(s3_bucket, monkeypatch):
+    import scr.S3Compaction as s3_compaction
+
+    _put_sources(s3_bucket)
+    write_compacted_parts = s3_compaction._write_compacted_parts
+
+    def concurrent_upload(*args, **kwargs):
+        _put_part(s3_bucket, 'd.parquet.gz', [42])
+        return write_compacted_parts(*args, **kwargs)
+
+    monkeypatch.setattr(s3_compaction, '_write_compacted_parts', concurrent_upload)
+
+    result = s3_compaction.compact_prefix(s3_bucket, PREFIX)
+
+    assert result.conflict and result.compacted_parts == []
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX))
+    assert keys == [PREFIX + name for name in ('a.parquet.gz', 'b.parquet.gz', 'c.parquet.gz', 'd.parquet.gz')]
+
+
+def test_delete_errors_are_raised():
+    from scr.S3Compaction import CompactionError, _delete_keys
+
+    class RefusingBucket():
+        name = 'test-partner-bucket'
+
+        def delete_objects(self, Delete):
+            return {'Errors': [{'Key': obj['Key'], 'Code': 'AccessDenied', 'Message': 'Access Denied'} for obj in Delete['Objects']]}
+
+    with pytest.raises(CompactionError, match='AccessDenied'):
+        _delete_keys(RefusingBucket(), [PREFIX + 'a.parquet.gz'])
@@ -0,0 +1,66 @@
+import gzip
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+
+
+def _keys(objects):
+    return [obj.key for obj in objects]
+
+
+def test_first_listing_of_a_run_is_full(s3_bucket):
+    from scr.S3ListingIndex import S3ListingIndex
+
+    s3_bucket.put_object(Key=PREFIX + 'm_01:00:00.parquet.gz', Body=b'a')
+    s3_bucket.put_object(Key=PREFIX + 'z_01:00:00.parquet.gz', Body=b'b')
+    assert _keys(S3ListingIndex().list_objects(s3_bucket, PREFIX)) == [
+        PREFIX + 'm_01:00:00.parquet.gz', PREFIX + 'z_01:00:00.parquet.gz',
+    ]
+
+    # Another writer adds a key that sorts before the last one and deletes one
+    s3_bucket.put_object(Key=PREFIX + 'a_02:00:00.parquet.gz', Body=b'c')
+    s3_bucket.Object(PREFIX + 'm_01:00:00.parquet.gz').delete()
+
+    assert _keys(S3ListingIndex().list_objects(s3_bucket, PREFIX)) == [
+        PREFIX + 'a_02:00:00.parquet.gz', PREFIX + 'z_01:00:00.parquet.gz',
+    ]
+
+
+def test_later_listings_in_a_run_are_local_until_refreshed(s3_bucket):
+    from scr.S3ListingIndex import S3ListingIndex
+
+    index = S3ListingIndex()
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'a')
+    assert _keys(index.list_objects(s3_bucket, ENTITY + '/')) == [PREFIX + 'old.parquet.gz']
+    s3_bucket.put_object(Key=PREFIX + 'other_writer.parquet.gz', Body=b'b')
+
+    assert index.is_listed(s3_bucket.name, PREFIX)
+    assert _keys(index.list_objects(s3_bucket, PREFIX)) == [PREFIX + 'old.parquet.gz']
+    assert _keys(index.list_objects(s3_bucket, PREFIX, refresh=True)) == [
+        PREFIX + 'old.parquet.gz', PREFIX + 'other_writer.parquet.gz',
+    ]
+
+
+def test_uploads_and_deletes_write_through(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+    from scr.S3ListingIndex import use_listing_index
+
+    index = use_listing_index()
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    path = tmp_path / 'part.parquet.gz'
+    path.write_bytes(gzip.compress(b'new part', mtime=0))
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=str(path), sync_path=True)
+
+    assert uploader.run()
+    assert _keys(index.list_objects(s3_bucket, PREFIX, refresh=False)) == [uploader.s3_full_file_key]
+
+    uploader.clear_s3_path(PREFIX)
+    assert index.list_objects(s3_bucket, PREFIX, refresh=False) == []
+    assert list(s3_bucket.objects.filter(Prefix=PREFIX)) == []
@@ -0,0 +1,52 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('boto3')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeEnvironment
+
+
+class LocalS3Environment(FakeEnvironment):
+    aws_s3_endpoint_url = 'http://localhost:9000'
+    aws_s3_max_pool_connections = 4
+
+
+@pytest.fixture
+def aws_s3_loader(monkeypatch):
+    import scr.AWSS3Loader as aws_s3_loader
+
+    monkeypatch.setattr(aws_s3_loader, 'Environment', LocalS3Environment)
+    monkeypatch.setattr(aws_s3_loader, '_s3_resources', {})
+    return aws_s3_loader
+
+
+def test_threads_share_one_resource_and_client(aws_s3_loader):
+    resources = []
+    threads = [threading.Thread(target=lambda: resources.append(aws_s3_loader.get_s3_resource())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(resource) for resource in resources}) == 1
+    client = aws_s3_loader.get_s3_client()
+    assert client is resources[0].meta.client
+    assert client.meta.endpoint_url == 'http://localhost:9000'
+    assert client.meta.config.max_pool_connections == 4
+
+
+def test_uploader_honors_its_config(aws_s3_loader):
+    uploader = aws_s3_loader.S3Uploader('partner_metrics/orders', datetime(2025, 11, 17))
+
+    assert uploader.config.endpoint_url == 'http://localhost:9000'
+    assert uploader.s3.meta.client is aws_s3_loader.get_s3_client()
+
+    other = aws_s3_loader.S3Config('key', 'secret', 'bucket', 'eu-west-1', endpoint_url='http://localhost:9001')
+    client = aws_s3_loader.get_s3_client(other)
+    assert client is not uploader.s3.meta.client
+    assert client.meta.endpoint_url == 'http://localhost:9001'
+    assert client.meta.region_name == 'eu-west-1'
+    assert aws_s3_loader.get_s3_client(other) is client
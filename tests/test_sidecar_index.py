@@ -0,0 +1,114 @@
+import gzip
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+
+
+PREFIX = 'partner_metrics/backend/orders/2025-11-17/'
+
+
+def _write_parts(tmp_path):
+    paths = []
+    for i, ids in enumerate(([1, 2, 3], [4, 5])):
+        path = tmp_path / f"part_{i}.parquet"
+        pq.write_table(pa.table({'order_id': pa.array(ids, pa.int64())}), str(path), row_group_size=2)
+        paths.append(str(path))
+    return paths
+
+
+def _upload_parts(bucket, paths):
+    part_keys = {}
+    for i, path in enumerate(paths):
+        key = f"{PREFIX}part_{i}.parquet.gz"
+        with open(path, 'rb') as src:
+            bucket.put_object(Key=key, Body=gzip.compress(src.read()))
+        part_keys[f"{path}.gz"] = key
+    return part_keys
+
+
+def test_build_sidecar_index_maps_values_to_row_groups(tmp_path):
+    from scr.SidecarIndex import build_sidecar_index
+
+    paths = _write_parts(tmp_path)
+    index = build_sidecar_index(paths, ['order_id', 'missing'])
+
+    entries = {(row['value'], row['part'], row['row_group']) for row in index.to_pylist()}
+    assert entries == {
+        ('1', paths[0], 0), ('2', paths[0], 0), ('3', paths[0], 1),
+        ('4', paths[1], 0), ('5', paths[1], 0),
+    }
+
+
+def test_lookup_and_fetch_rows(s3_bucket, tmp_path):
+    from scr.SidecarIndex import build_sidecar_index, fetch_rows, lookup, upload_sidecar_index
+
+    paths = _write_parts(tmp_path)
+    upload_sidecar_index(build_sidecar_index(paths, ['order_id']), _upload_parts(s3_bucket, paths), s3_bucket, PREFIX)
+
+    matches = lookup(s3_bucket, PREFIX, 'order_id', 3)
+
+    assert matches == [(f"{PREFIX}part_0.parquet.gz", 1)]
+    rows = fetch_rows(s3_bucket, matches[0][0], matches[0][1], 'order_id', 3)
+    assert rows.column('order_id').to_pylist() == [3]
+
+
+def test_sidecar_index_stays_out_of_the_partition(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+    from scr.SidecarIndex import build_sidecar_index, sidecar_index_key, upload_sidecar_index
+
+    paths = _write_parts(tmp_path)
+    part_keys = _upload_parts(s3_bucket, paths)
+    index_key = upload_sidecar_index(build_sidecar_index(paths, ['order_id']), part_keys, s3_bucket, PREFIX)
+
+    assert index_key == sidecar_index_key(PREFIX)
+    assert not index_key.startswith(PREFIX)
+    uploader = S3Uploader('partner_metrics/backend/orders', datetime(2025, 11, 17), dt_now=datetime.now(timezone.utc))
+    assert sorted(uploader.list_s3_path(PREFIX)) == sorted(part_keys.values())
+
+
+def test_lookup_without_index_raises_clear_error(s3_bucket):
+    from scr.SidecarIndex import SidecarIndexNotFound, lookup
+
+    with pytest.raises(SidecarIndexNotFound, match=PREFIX):
+        lookup(s3_bucket, PREFIX, 'order_id', 1)
+
+
+def _gzip_parts(paths):
+    gz_paths = []
+    for path in paths:
+        with open(path, 'rb') as src:
+            gz_path = f"{path}.gz"
+            with open(gz_path, 'wb') as dst:
+                dst.write(gzip.compress(src.read(), mtime=0))
+        gz_paths.append(gz_path)
+    return gz_paths
+
+
+def test_sink_replaces_the_sidecar_index_with_the_partition(s3_bucket, tmp_path):
+    from scr.ExportSinks import S3Sink, tee_export
+    from scr.SidecarIndex import lookup, sidecar_index_key
+
+    s3_bucket.put_object(Key=sidecar_index_key(PREFIX), Body=b'index of old parts')
+    sink = S3Sink('partner_metrics/backend/orders', index_keys=['order_id'])
+
+    assert tee_export(_gzip_parts(_write_parts(tmp_path)), [sink], datetime(2025, 11, 17)) == {sink.name: True}
+
+    assert [part for part, _ in lookup(s3_bucket, PREFIX, 'order_id', '4')] == [sink.uploaded_keys[f"{tmp_path}/part_1.parquet.gz"]]
+
+
+def test_sink_without_index_keys_deletes_the_old_index(s3_bucket, tmp_path):
+    from scr.ExportSinks import S3Sink, tee_export
+    from scr.SidecarIndex import SidecarIndexNotFound, lookup, sidecar_index_key
+
+    s3_bucket.put_object(Key=sidecar_index_key(PREFIX), Body=b'index of old parts')
+    sink = S3Sink('partner_metrics/backend/orders')
+
+    assert tee_export(_gzip_parts(_write_parts(tmp_path)), [sink], datetime(2025, 11, 17)) == {sink.name: True}
+
+    with pytest.raises(SidecarIndexNotFound):
+        lookup(s3_bucket, PREFIX, 'order_id', '4')
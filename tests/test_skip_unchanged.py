@@ -0,0 +1,63 @@
+import gzip
+import time
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+
+
+PREFIX = 'partner_metrics/financial/daily/2025-11-17/'
+
+
+def _partitions_table():
+    return pa.table({
+        'partition_id': ['20251117', '20251118'],
+        'total_rows': [10, 0],
+        'last_modified': ['2025-11-18 01:00:00+00', '2025-11-18 02:00:00+00'],
+    })
+
+
+def test_get_partitions_needs_the_partition_column(exporter):
+    exporter.client = FakeBigQueryClient(table=_partitions_table(), partition_field='updated_at')
+
+    assert exporter.get_partitions('p.d.orders', partition_column='created_at') is None
+    assert exporter.client.queries == []
+
+
+def test_get_partitions_and_partition_state(exporter):
+    exporter.client = FakeBigQueryClient(table=_partitions_table(), partition_field='created_at')
+
+    partitions = exporter.get_partitions('p.d.orders', partition_column='created_at')
+
+    assert exporter.partition_state(partitions, '20251117') == {'source-rows': '10', 'source-last-modified': '2025-11-18 01:00:00+00'}
+    assert exporter.partition_state(partitions, '20251119') == {'source-rows': '0', 'source-last-modified': ''}
+    assert exporter.partition_state(partitions, '202511') == {'source-rows': '10', 'source-last-modified': '2025-11-18 02:00:00+00'}
+
+
+def test_partition_source_metadata_reads_only_the_newest_part(s3_bucket, monkeypatch):
+    from scr.AWSS3Loader import partition_source_metadata
+
+    old_state = {'source-rows': '9', 'source-last-modified': '2025-11-18 00:00:00+00'}
+    new_state = {'source-rows': '10', 'source-last-modified': '2025-11-18 01:00:00+00'}
+    s3_bucket.put_object(Key=PREFIX + 'a.parquet.gz', Body=gzip.compress(b'a'), Metadata=old_state)
+    time.sleep(1.1)
+    s3_bucket.put_object(Key=PREFIX + 'b.parquet.gz', Body=gzip.compress(b'b'), Metadata=new_state)
+
+    client = s3_bucket.meta.client
+    heads = []
+    head_object = client.head_object
+    monkeypatch.setattr(client, 'head_object', lambda **kwargs: heads.append(kwargs['Key']) or head_object(**kwargs))
+
+    assert partition_source_metadata(s3_bucket, PREFIX) == new_state
+    assert heads == [PREFIX + 'b.parquet.gz']
+
+
+def test_partition_source_metadata_without_state(s3_bucket):
+    from scr.AWSS3Loader import partition_source_metadata
+
+    assert partition_source_metadata(s3_bucket, PREFIX) is None
+    s3_bucket.put_object(Key=PREFIX + 'a.parquet.gz', Body=gzip.compress(b'a'))
+    assert partition_source_metadata(s3_bucket, PREFIX) is None
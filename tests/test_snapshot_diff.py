@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+
+DT_NOW = datetime(2026, 1, 5, 3, 0, tzinfo=timezone.utc)
+
+
+def _catalog(names=('a', 'b', 'c'), prices=(1.5, 2.0, 0.1)):
+    return pa.table({
+        'id': pa.array(range(1, len(names) + 1), pa.int64()),
+        'name': list(names),
+        'price': pa.array(prices, pa.float64()),
+        'tags': pa.array([[name] for name in names], pa.list_(pa.string())),
+    })
+
+
+def test_row_hashes_do_not_depend_on_position_or_chunking():
+    from scr.SnapshotDiff import row_hashes
+
+    table = _catalog()
+    reordered = pa.concat_tables([table.slice(2), table.slice(0, 2)])
+
+    hashes = dict(zip(*row_hashes(table, 'id').to_pydict().values()))
+    hashes_reordered = dict(zip(*row_hashes(reordered, 'id').to_pydict().values()))
+
+    assert hashes == hashes_reordered
+
+
+def test_row_hashes_see_float_and_nested_changes():
+    from scr.SnapshotDiff import row_hashes
+
+    before = row_hashes(_catalog(), 'id').column('row_hash').to_pylist()
+    float_change = row_hashes(_catalog(prices=(1.5, 2.0, 0.1 + 1e-12)), 'id').column('row_hash').to_pylist()
+    nested = _catalog().set_column(3, 'tags', pa.array([['a'], ['b'], ['c', 'x']], pa.list_(pa.string())))
+    nested_change = row_hashes(nested, 'id').column('row_hash').to_pylist()
+
+    assert before[:2] == float_change[:2] and before[2] != float_change[2]
+    assert before[:2] == nested_change[:2] and before[2] != nested_change[2]
+
+
+def test_row_hashes_keep_column_boundaries_and_nulls():
+    from scr.SnapshotDiff import row_hashes
+
+    table = pa.table({
+        'id': [1, 2, 3, 4, 5],
+        'a': ['x:', 'x', None, '', 'N'],
+        'b': ['y', ':y', '', None, None],
+        'attrs': pa.array([{'p': 1}, {'p': 1}, None, {'p': None}, {'p': None}]),
+    })
+
+    assert len(set(row_hashes(table, 'id').column('row_hash').to_pylist())) == 5
+
+
+def test_diff_and_commit(tmp_path):
+    from scr.SnapshotDiff import CHANGE_TYPE_COLUMN, SnapshotDiff
+
+    snapshot_diff = SnapshotDiff('partner_metrics/catalogs/products', state_dir=str(tmp_path))
+    assert snapshot_diff.needs_full_snapshot(DT_NOW)
+    snapshot_diff.diff(_catalog())
+    snapshot_diff.commit(full_snapshot=True, dt_now=DT_NOW)
+
+    snapshot_diff = SnapshotDiff('partner_metrics/catalogs/products', state_dir=str(tmp_path))
+    assert not snapshot_diff.needs_full_snapshot(DT_NOW + timedelta(days=1))
+    assert snapshot_diff.needs_full_snapshot(DT_NOW + timedelta(days=7))
+    delta = snapshot_diff.diff(_catalog(names=('a', 'B', 'c', 'd'), prices=(1.5, 2.0, 0.1, 4.0)).slice(1))
+
+    changes = dict(zip(delta.column('id').to_pylist(), delta.column(CHANGE_TYPE_COLUMN).to_pylist()))
+    assert changes == {2: 'update', 4: 'insert', 1: 'delete'}
+
+
+def test_publish_snapshot_uploads_full_snapshot_by_default(exporter, s3_bucket, monkeypatch, tmp_path):
+    from scr.SnapshotDiff import publish_snapshot
+
+    monkeypatch.chdir(tmp_path)
+    for day in (5, 6):
+        assert publish_snapshot(
+            exporter, _catalog(), 'p.d.products', 'partner_metrics/catalogs/products',
+            dt_partition=datetime(2026, 1, day), dt_now=DT_NOW + timedelta(days=day - 5),
+        )
+
+    keys = [obj.key for obj in s3_bucket.objects.all()]
+    assert [key.rsplit('/', 1)[0] for key in sorted(keys)] == [
+        'partner_metrics/catalogs/products/2026-01-05',
+        'partner_metrics/catalogs/products/2026-01-06',
+    ]
+    assert not (tmp_path / 'state').exists()
+
+
+def test_publish_snapshot_publishes_deltas_when_opted_in(exporter, s3_bucket, monkeypatch, tmp_path):
+    from scr.SnapshotDiff import publish_snapshot
+
+    monkeypatch.chdir(tmp_path)
+    options = dict(delta_entity_path='partner_metrics/catalogs/products_delta')
+    assert publish_snapshot(exporter, _catalog(), 'p.d.products', 'partner_metrics/catalogs/products', datetime(2026, 1, 5), DT_NOW, **options)
+    assert publish_snapshot(exporter, _catalog(), 'p.d.products', 'partner_metrics/catalogs/products', datetime(2026, 1, 6), DT_NOW + timedelta(days=1), **options)
+    assert publish_snapshot(exporter, _catalog(names=('a', 'B', 'c')), 'p.d.products', 'partner_metrics/catalogs/products', datetime(2026, 1, 7), DT_NOW + timedelta(days=2), **options)
+
+    directories = sorted(obj.key.rsplit('/', 1)[0] for obj in s3_bucket.objects.all())
+    assert directories == [
+        'partner_metrics/catalogs/products/2026-01-05',
+        'partner_metrics/catalogs/products_delta/2026-01-07',
+    ]
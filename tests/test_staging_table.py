@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeBigQueryClient
+
+
+def test_materialize_staging_table_runs_one_expiring_ctas(exporter):
+    exporter.client = FakeBigQueryClient()
+
+    result = exporter.materialize_staging_table(
+        bq_table_addres='p.amplitude.events',
+        staging_table_addres='p.tmp.events_indrive',
+        where_condition="platform = 'indrive' AND timestamp_trunc(event_time, day) BETWEEN '2025-12-01' AND '2025-12-07'",
+        partition_by='TIMESTAMP_TRUNC(event_time, DAY)',
+        expiration=timedelta(hours=36),
+    )
+
+    assert result == 'p.tmp.events_indrive'
+    assert len(exporter.client.queries) == 1
+    query = ' '.join(exporter.client.queries[0].split())
+    assert query.startswith('CREATE OR REPLACE TABLE `p.tmp.events_indrive` PARTITION BY TIMESTAMP_TRUNC(event_time, DAY)')
+    assert 'INTERVAL 36 HOUR' in query
+    assert "FROM `p.amplitude.events` WHERE platform = 'indrive' AND" in query
+
+
+def test_materialize_staging_table_keeps_at_least_one_hour(exporter):
+    exporter.client = FakeBigQueryClient()
+
+    exporter.materialize_staging_table('p.d.src', 'p.tmp.dst', 'TRUE', 'DATE(created_at)', expiration=timedelta(minutes=5))
+
+    assert 'INTERVAL 1 HOUR' in exporter.client.queries[0]
+
+
+def test_materialize_staging_table_binds_parameters(exporter):
+    exporter.client = FakeBigQueryClient()
+
+    exporter.materialize_staging_table(
+        'p.d.src', 'p.tmp.dst', 'timestamp_trunc(event_time, day) BETWEEN TIMESTAMP(@start_dt) AND TIMESTAMP(@end_dt)',
+        'TIMESTAMP_TRUNC(event_time, DAY)', params={'start_dt': '2025-12-01', 'end_dt': '2025-12-07'},
+    )
+
+    job = exporter.client.jobs[0]
+    assert '2025-12-01' not in job.query
+    assert [(p.name, p.value) for p in job.job_config.query_parameters] == [('start_dt', '2025-12-01'), ('end_dt', '2025-12-07')]
+
+
+def test_day_ranges_groups_consecutive_days():
+    from aws_uploader__for_date_range import day_ranges
+
+    assert day_ranges(['20251203', '20251201', '20251202', '20251205', '20251231', '20260101']) == [
+        ('2025-12-01', '2025-12-03'), ('2025-12-05', '2025-12-05'), ('2025-12-31', '2026-01-01'),
+    ]
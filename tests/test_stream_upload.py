@@ -0,0 +1,116 @@
+import base64
+import gzip
+import hashlib
+import io
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pytest.importorskip('config.cred.enviroment')
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+
+from conftest import FakeBigQueryClient
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+MB = 1024 * 1024
+# S3 requires every part but the last to be at least 5 MB
+SMALL_PARTS = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=2)
+
+
+def _sha256_b64(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def test_writer_puts_small_objects_with_their_checksum(s3_bucket):
+    from scr.S3StreamUpload import S3MultipartWriter
+
+    with S3MultipartWriter(s3_bucket.name, PREFIX + 'small.bin', metadata={'a': '1'}, transfer_config=SMALL_PARTS) as f:
+        f.write(b'hello ')
+        f.write(b'world')
+
+    head = s3_bucket.meta.client.head_object(Bucket=s3_bucket.name, Key=PREFIX + 'small.bin', ChecksumMode='ENABLED')
+    assert head['Metadata'] == {'a': '1'}
+    assert head['ChecksumSHA256'] == _sha256_b64(b'hello world')
+    assert s3_bucket.Object(PREFIX + 'small.bin').get()['Body'].read() == b'hello world'
+
+
+def test_writer_uploads_large_objects_in_parts_with_the_composite_checksum(s3_bucket):
+    from scr.S3StreamUpload import S3MultipartWriter
+
+    data = os.urandom(11 * MB)
+    with S3MultipartWriter(s3_bucket.name, PREFIX + 'large.bin', transfer_config=SMALL_PARTS) as f:
+        for i in range(0, len(data), MB):
+            f.write(data[i:i + MB])
+        assert f.tell() == len(data)
+
+    parts = [data[i:i + 5 * MB] for i in range(0, len(data), 5 * MB)]
+    expected = _sha256_b64(b''.join(hashlib.sha256(part).digest() for part in parts))
+    head = s3_bucket.meta.client.head_object(Bucket=s3_bucket.name, Key=PREFIX + 'large.bin', ChecksumMode='ENABLED')
+    # S3 reports it as <digest>-<parts>, the local stand-in without the suffix
+    assert head['ChecksumSHA256'] in (expected, f"{expected}-{len(parts)}")
+    assert s3_bucket.Object(PREFIX + 'large.bin').get()['Body'].read() == data
+
+
+def test_composite_checksum_is_the_digest_of_the_part_digests():
+    from scr.AWSS3Loader import checksums_match, composite_sha256_b64
+
+    parts = [b'a' * 10, b'b' * 3]
+    expected = _sha256_b64(hashlib.sha256(parts[0]).digest() + hashlib.sha256(parts[1]).digest())
+    assert composite_sha256_b64([_sha256_b64(part) for part in parts]) == f"{expected}-2"
+    assert checksums_match(f"{expected}-2", expected)
+    assert not checksums_match(f"{expected}-2", _sha256_b64(b'other'))
+
+
+def test_writer_aborts_the_upload_on_error(s3_bucket):
+    from scr.S3StreamUpload import S3MultipartWriter
+
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3_bucket.name, PREFIX + 'broken.bin', transfer_config=SMALL_PARTS) as f:
+            f.write(os.urandom(6 * MB))
+            raise RuntimeError('export failed')
+
+    assert list(s3_bucket.objects.filter(Prefix=PREFIX)) == []
+    assert s3_bucket.meta.client.list_multipart_uploads(Bucket=s3_bucket.name).get('Uploads', []) == []
+
+
+class FailingBigQueryClient(FakeBigQueryClient):
+    def query(self, query, job_config=None):
+        raise RuntimeError('query failed')
+
+
+@pytest.mark.parametrize('sync_path', [True, False])
+def test_stream_export_keeps_the_partition_when_the_query_fails(s3_bucket, exporter, sync_path):
+    from scr.S3StreamUpload import stream_export_to_s3
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    exporter.client = FailingBigQueryClient()
+
+    with pytest.raises(RuntimeError):
+        stream_export_to_s3(exporter, 'SELECT 1', ENTITY, DT_PARTITION, sync_path=sync_path)
+
+    assert [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)] == [PREFIX + 'old.parquet.gz']
+
+
+def test_stream_export_replaces_the_partition_after_the_upload(s3_bucket, exporter):
+    from scr.S3StreamUpload import stream_export_to_s3
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    table = pa.table({'id': [1, 2, 3], 'name': ['a', 'b', 'c']})
+    exporter.client = FakeBigQueryClient(table=table)
+
+    key = stream_export_to_s3(
+        exporter, 'SELECT * FROM orders', ENTITY, DT_PARTITION,
+        dt_now=datetime(2025, 11, 18, 1, 2, 3, tzinfo=timezone.utc),
+        schema=pa.schema([pa.field('id', pa.int64()), pa.field('name', pa.string())]),
+    )
+
+    assert key.startswith(PREFIX) and key.endswith('_01:02:03.parquet.gz')
+    assert [obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)] == [key]
+    body = gzip.decompress(s3_bucket.Object(key).get()['Body'].read())
+    assert pq.read_table(io.BytesIO(body)).to_pylist() == table.to_pylist()
@@ -0,0 +1,75 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+
+
+def _part(tmp_path, name='part.parquet.gz', content=b'new part'):
+    path = tmp_path / name
+    path.write_bytes(gzip.compress(content, mtime=0))
+    return str(path)
+
+
+def _keys(bucket):
+    return sorted(obj.key for obj in bucket.objects.filter(Prefix=PREFIX))
+
+
+def test_sync_uploads_before_deleting_the_old_objects(s3_bucket, tmp_path, monkeypatch):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old_1.parquet.gz', Body=b'old')
+    s3_bucket.put_object(Key=PREFIX + 'old_2.parquet.gz', Body=b'old')
+    seen_during_upload = []
+    put_with_checksum = S3Uploader._put_with_checksum
+
+    def put_and_look(self):
+        seen_during_upload.extend(_keys(s3_bucket))
+        return put_with_checksum(self)
+
+    monkeypatch.setattr(S3Uploader, '_put_with_checksum', put_and_look)
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=_part(tmp_path), sync_path=True)
+
+    assert uploader.run()
+    assert seen_during_upload == [PREFIX + 'old_1.parquet.gz', PREFIX + 'old_2.parquet.gz']
+    assert _keys(s3_bucket) == [uploader.s3_full_file_key]
+
+
+def test_sync_keeps_the_old_objects_when_the_upload_is_not_verified(s3_bucket, tmp_path, monkeypatch):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    monkeypatch.setattr(S3Uploader, '_put_with_checksum', lambda self: False)
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=_part(tmp_path), sync_path=True)
+
+    assert not uploader.run()
+    assert _keys(s3_bucket) == [PREFIX + 'old.parquet.gz']
+
+
+def test_sync_s3_path_deletes_only_stale_keys_in_batches(s3_bucket):
+    from scr.AWSS3Loader import S3Uploader
+
+    client = s3_bucket.meta.client
+    stale = [f'{PREFIX}old_{i:04d}.parquet.gz' for i in range(1001)]
+    for key in stale + [PREFIX + 'new.parquet.gz']:
+        client.put_object(Bucket=s3_bucket.name, Key=key, Body=b'')
+    batches = []
+    delete_objects = s3_bucket.delete_objects
+
+    def record_batch(**kwargs):
+        batches.append(len(kwargs['Delete']['Objects']))
+        return delete_objects(**kwargs)
+
+    uploader = S3Uploader(ENTITY, DT_PARTITION)
+    uploader.bucket.delete_objects = record_batch
+    deleted = uploader.sync_s3_path(PREFIX, stale + [PREFIX + 'new.parquet.gz'], [PREFIX + 'new.parquet.gz'])
+
+    assert sorted(deleted) == stale
+    assert batches == [1000, 1]
+    assert _keys(s3_bucket) == [PREFIX + 'new.parquet.gz']
@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+MB = 1024 * 1024
+
+
+def _keys(bucket):
+    return sorted(obj.key for obj in bucket.objects.filter(Prefix=PREFIX))
+
+
+@pytest.fixture
+def large_part(tmp_path, monkeypatch):
+    """An 11 MB part that is uploaded multipart in 5 MB parts."""
+    import scr.AWSS3Loader as aws_s3_loader
+
+    monkeypatch.setattr(aws_s3_loader, 'S3_SINGLE_PUT_MAX_BYTES', 1 * MB)
+    monkeypatch.setattr(aws_s3_loader, 'S3_MULTIPART_CHUNKSIZE', 5 * MB)
+    path = tmp_path / 'large.parquet.gz'
+    path.write_bytes(os.urandom(11 * MB))
+    return str(path)
+
+
+def test_file_composite_checksum_follows_the_part_size(tmp_path):
+    from scr.AWSS3Loader import composite_sha256_b64, file_composite_sha256_b64, sha256_b64
+
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'abcdefghij')
+
+    assert file_composite_sha256_b64(path, 4) == composite_sha256_b64([sha256_b64(b'abcd'), sha256_b64(b'efgh'), sha256_b64(b'ij')])
+    assert file_composite_sha256_b64(path, 4).endswith('-3')
+
+
+def test_small_part_is_put_with_its_checksum(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import CONTENT_HASH_METADATA, S3Uploader
+
+    path = tmp_path / 'small.parquet.gz'
+    path.write_bytes(b'small part')
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=str(path))
+
+    assert uploader.run()
+    head = s3_bucket.meta.client.head_object(Bucket=s3_bucket.name, Key=uploader.s3_full_file_key, ChecksumMode='ENABLED')
+    expected = base64.b64encode(hashlib.sha256(b'small part').digest()).decode()
+    assert head['ChecksumSHA256'] == expected
+    assert head['Metadata'][CONTENT_HASH_METADATA] == expected
+
+
+def test_large_part_is_checked_against_the_composite_checksum(s3_bucket, large_part):
+    from scr.AWSS3Loader import S3Uploader
+
+    uploader = S3Uploader(ENTITY, DT_PARTITION, gzip_path=large_part)
+
+    assert uploader.run()
+    assert _keys(s3_bucket) == [uploader.s3_full_file_key]
+    with open(large_part, 'rb') as f:
+        assert s3_bucket.Object(uploader.s3_full_file_key).get()['Body'].read() == f.read()
+
+
+def test_large_part_with_a_wrong_checksum_is_deleted(s3_bucket, large_part, monkeypatch):
+    import scr.AWSS3Loader as aws_s3_loader
+
+    monkeypatch.setattr(aws_s3_loader, 'file_composite_sha256_b64', lambda path, chunksize: 'bm90IHRoZSBjaGVja3N1bQ==-3')
+    uploader = aws_s3_loader.S3Uploader(ENTITY, DT_PARTITION, gzip_path=large_part)
+
+    assert not uploader.run()
+    assert _keys(s3_bucket) == []
@@ -0,0 +1,76 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+
+ENTITY = 'partner_metrics/backend/orders'
+PREFIX = f'{ENTITY}/2025-11-17/'
+DT_PARTITION = datetime(2025, 11, 17)
+
+
+def _parts(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f'part_{i}.parquet.gz'
+        path.write_bytes(gzip.compress(f'part {i}'.encode(), mtime=0))
+        paths.append(str(path))
+    return paths
+
+
+def test_upload_many_clears_once_and_uploads_every_part(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    paths = _parts(tmp_path, 3)
+
+    results = S3Uploader.upload_many(
+        paths, ENTITY, DT_PARTITION,
+        dt_now=datetime(2025, 11, 18, 1, 2, 3, tzinfo=timezone.utc),
+        part_metadata={paths[0]: {'key-min': '1'}},
+        max_workers=3,
+    )
+
+    assert [r.gzip_path for r in results] == paths
+    assert all(r.success for r in results)
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX))
+    assert keys == sorted(r.s3_key for r in results)
+    assert all(key.endswith('_01:02:03.parquet.gz') for key in keys)
+    assert s3_bucket.Object(results[0].s3_key).metadata['key-min'] == '1'
+
+
+def test_upload_many_with_sync_keeps_old_objects_when_a_part_fails(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+    paths = _parts(tmp_path, 2) + [str(tmp_path / 'missing.parquet.gz')]
+
+    results = S3Uploader.upload_many(paths, ENTITY, DT_PARTITION, sync_path=True)
+
+    assert [r.success for r in results] == [True, True, False]
+    keys = {obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX)}
+    assert PREFIX + 'old.parquet.gz' in keys
+    assert {r.s3_key for r in results[:2]} <= keys
+
+
+def test_upload_many_with_sync_replaces_old_objects(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+
+    results = S3Uploader.upload_many(_parts(tmp_path, 2), ENTITY, DT_PARTITION, sync_path=True)
+
+    keys = sorted(obj.key for obj in s3_bucket.objects.filter(Prefix=PREFIX))
+    assert keys == sorted(r.s3_key for r in results)
+
+
+def test_upload_many_appends_without_clearing(s3_bucket, tmp_path):
+    from scr.AWSS3Loader import S3Uploader
+
+    s3_bucket.put_object(Key=PREFIX + 'old.parquet.gz', Body=b'old')
+
+    S3Uploader.upload_many(_parts(tmp_path, 1), ENTITY, DT_PARTITION, clear_path_before_upload=False)
+
+    assert len(list(s3_bucket.objects.filter(Prefix=PREFIX))) == 2
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip('config.cred.enviroment')
+
+from conftest import FakeEnvironment
+
+
+class StateEnvironment(FakeEnvironment):
+    aws_s3_state_bucket_name = 'test-state-bucket'
+
+
+def test_local_store_round_trip(tmp_path):
+    from scr.WatermarkStore import WatermarkStore
+
+    store = WatermarkStore(state_dir=str(tmp_path))
+    assert store.get('partner_metrics/amplitude', partition='2025-12-09') is None
+
+    store.set('partner_metrics/amplitude', '2025-12-09 05:00:00+00', partition='2025-12-09')
+    store.set('partner_metrics/amplitude', '2025-12-10 01:00:00+00', partition='2025-12-10')
+    assert WatermarkStore(state_dir=str(tmp_path)).get('partner_metrics/amplitude', partition='2025-12-09') == '2025-12-09 05:00:00+00'
+
+    store.reset('partner_metrics/amplitude', partition='2025-12-09')
+    assert store.get('partner_metrics/amplitude', partition='2025-12-09') is None
+    assert store.get('partner_metrics/amplitude', partition='2025-12-10') == '2025-12-10 01:00:00+00'
+
+
+def test_shared_store_uses_the_state_bucket(s3_bucket, monkeypatch):
+    import scr.WatermarkStore as watermark_store
+
+    monkeypatch.setattr(watermark_store, 'Environment', StateEnvironment)
+    state_bucket = s3_bucket.meta.client.create_bucket(Bucket='test-state-bucket')
+
+    store = watermark_store.shared_watermark_store()
+    store.set('partner_metrics/backend/warehouse_products_hourly', '2025-11-01 10:00:00+00')
+
+    assert store.bucket.name == 'test-state-bucket'
+    assert watermark_store.shared_watermark_store().get('partner_metrics/backend/warehouse_products_hourly') == '2025-11-01 10:00:00+00'
+    assert list(s3_bucket.objects.all()) == []
+
+
+def test_shared_store_refuses_the_partner_bucket(monkeypatch):
+    import scr.WatermarkStore as watermark_store
+
+    monkeypatch.setattr(watermark_store, 'Environment', StateEnvironment)
+    with pytest.raises(ValueError, match='partner-facing'):
+        watermark_store.shared_watermark_store(FakeEnvironment.aws_s3_bucket_name)
+
+    monkeypatch.setattr(watermark_store, 'Environment', FakeEnvironment)
+    with pytest.raises(ValueError, match='aws_s3_state_bucket_name'):
+        watermark_store.shared_watermark_store()
+
+
+def test_query_max_rejects_null_watermark_values(exporter):
+    pa = pytest.importorskip('pyarrow')
+    from conftest import FakeBigQueryClient
+
+    exporter.client = FakeBigQueryClient(table=pa.table({'max_value': ['2025-11-01 05:00:00+00'], 'null_count': [2]}))
+
+    assert exporter.query_max('p.d.t', 'catalog_updated_at') == '2025-11-01 05:00:00+00'
+    with pytest.raises(ValueError, match='NULL catalog_updated_at'):
+        exporter.query_max('p.d.t', 'catalog_updated_at', require_not_null=True)